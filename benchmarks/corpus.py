@@ -0,0 +1,112 @@
+'''
+Synthetic documents for the benchmarks. Every generator takes an approximate size in characters and a seed,
+and returns the same text for the same arguments.
+
+Note that the rendered parse tree's indentation drifts right after every container that is an element
+of a list or the value of a pair, so documents with many sibling containers have trees that grow
+quadratically. The generators below keep containers out of long sibling runs for that reason.
+'''
+import random
+
+KINDS = ["wide", "deep", "strings", "numbers", "keys", "errors"]
+
+#one long list of mixed scalars
+def wide(size, seed=0):
+    rng = random.Random(seed)
+    scalars = ['"item"', "true", "false", "null", "12", "3.5", '"a b c"', "-7"]
+    parts = []
+    length = 2
+    while length < size:
+        part = rng.choice(scalars)
+        parts.append(part)
+        length += len(part) + 2
+    return "[" + ", ".join(parts or ["1"]) + "]"
+
+#a single chain of alternating dicts and lists, depth is capped since the tree is quadratic in depth
+def deep(size, seed=0, max_depth=1000):
+    depth = max(1, min(size // 10, max_depth))
+    opening = []
+    closing = []
+    for level in range(depth):
+        if level % 2:
+            opening.append("[")
+            closing.append("]")
+        else:
+            opening.append(f'{{"level {level}": ')
+            closing.append("}")
+    return "".join(opening) + "true" + "".join(reversed(closing))
+
+#a dict whose values are long string literals, like embedded blobs and descriptions
+def strings(size, seed=0, min_length=200, max_length=4000):
+    rng = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789 ,.:[]{}-"
+    pairs = []
+    length = 2
+    while length < size or not pairs:
+        value = "".join(rng.choice(alphabet) for _ in range(rng.randint(min_length, max_length)))
+        pair = f'"blob {len(pairs)}": "{value}"'
+        pairs.append(pair)
+        length += len(pair) + 2
+    return "{" + ", ".join(pairs) + "}"
+
+#a list of integers and floats
+def numbers(size, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    length = 2
+    while length < size or not parts:
+        if rng.random() < 0.5:
+            part = str(rng.randint(-10 ** 6, 10 ** 9))
+        else:
+            part = f"{rng.randint(0, 10 ** 4)}.{rng.randint(0, 10 ** 6)}"
+        parts.append(part)
+        length += len(part) + 2
+    return "[" + ", ".join(parts) + "]"
+
+#a flat dict with many short keys
+def keys(size, seed=0):
+    rng = random.Random(seed)
+    values = ['"x"', "1", "true", "null", "0.5"]
+    pairs = []
+    length = 2
+    while length < size or not pairs:
+        pair = f'"key_{len(pairs)}_{rng.randint(0, 999)}": {rng.choice(values)}'
+        pairs.append(pair)
+        length += len(pair) + 2
+    return "{" + ", ".join(pairs) + "}"
+
+def errors(size, seed=0, error_rate=0.05, fan_out=8):
+    '''
+    Small records grouped into nested lists of at most fan_out elements, with about error_rate of the
+    tokens inside records dropped, duplicated or replaced by stray punctuation. Panic mode skips to the
+    end of the enclosing container, so errors are kept inside small containers to get many of them.
+    Only whole tokens are touched, so the result still lexes and every error is a syntax error.
+    '''
+    rng = random.Random(seed)
+    records = []
+    length = 0
+    while length < size or not records:
+        tokens = ["{", f'"id"', ":", str(len(records)), ",", '"tags"', ":", "[", '"a"', ",", "null", "]", "}"]
+        corrupted = []
+        for token in tokens:
+            roll = rng.random()
+            if roll < error_rate / 3:
+                continue
+            corrupted.append(token)
+            if roll < 2 * error_rate / 3:
+                corrupted.append(token)
+            elif roll < error_rate:
+                corrupted.append(rng.choice(["]", ":", ",", "[", "}"]))
+        record = " ".join(corrupted)
+        records.append(record)
+        length += len(record) + 2
+    #group into nested lists so no container has more than fan_out siblings
+    level = records
+    while len(level) > 1:
+        level = ["[" + ", ".join(level[i:i + fan_out]) + "]" for i in range(0, len(level), fan_out)]
+    return level[0]
+
+GENERATORS = {"wide": wide, "deep": deep, "strings": strings, "numbers": numbers, "keys": keys, "errors": errors}
+
+def generate(kind, size, seed=0):
+    return GENERATORS[kind](size, seed)
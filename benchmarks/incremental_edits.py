@@ -0,0 +1,46 @@
+'''
+Compares Document.edit with lexing and parsing the whole text again, for keystrokes in the middle of
+documents of growing size: typing into a string, changing a number, and replacing a value with a list.
+The last one moves the indentation of the rest of the tree, so Document falls back to a full parse for it.
+Run from the repository root with: python -m benchmarks.incremental_edits
+'''
+import time
+from incremental import Document
+from parser import Parser
+from scanner import Lexer
+from benchmarks import corpus
+
+#(name, text to find in the middle of the document, offset into it, characters replaced, replacement)
+EDITS = [("string", '"x"', 1, 0, "y"),
+         ("number", "0.5", 2, 1, "7"),
+         ("list", "null", 0, 4, "[1, 2]")]
+
+def full_time(text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Parser(Lexer(text).tokenize_buffer()).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    print(f"{'edit':<8}{'MB':>8}{'full (ms)':>12}{'edit (ms)':>12}")
+    for size in [1 << 16, 1 << 18, 1 << 20]:
+        text = corpus.keys(size)
+        full = full_time(text)
+        for name, target, offset, removed, inserted in EDITS:
+            document = Document(text)
+            position = text.index(target, len(text) // 2) + offset
+            original = text[position:position + removed]
+            best = None
+            for _ in range(3):
+                start = time.perf_counter()
+                document.edit(position, position + removed, inserted)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+                document.edit(position, position + len(inserted), original) #undo
+            print(f"{name:<8}{len(text) / 1e6:>8.2f}{full * 1000:>12.1f}{best * 1000:>12.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+'''
+Compares building values (parser.loads) of an array of records with and without a StringTable, for time and
+for the memory held by the result (measured with tracemalloc, in a separate run from the timings).
+Run from the repository root with: python -m benchmarks.interning
+'''
+import random
+import time
+import tracemalloc
+from parser import loads
+from scanner import StringTable
+
+def records(count, seed=0):
+    #an array of log-like records: the same keys every time, and values from small sets
+    rng = random.Random(seed)
+    parts = []
+    for index in range(count):
+        parts.append(f'{{"id": {index}, "level": "{rng.choice(["info", "warning", "error"])}", '
+                     f'"service": "{rng.choice(["auth", "billing", "search", "storage"])}", '
+                     f'"status": {rng.choice([200, 201, 404, 500])}, "region": "{rng.choice(["eu-west", "us-east"])}", '
+                     f'"tags": ["{rng.choice(["a", "b", "c"])}", "{rng.choice(["x", "y"])}"]}}')
+    return "[" + ", ".join(parts) + "]"
+
+def measure(function, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = function(text)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return best, held
+
+def main():
+    text = records(10000)
+    print(f"{len(text) / 1e6:.1f} MB of records")
+    print(f"{'':<28}{'seconds':>9}{'held MB':>9}")
+    for name, function in [("loads", lambda text: loads(text)),
+                           ("loads, interned", lambda text: loads(text, StringTable())),
+                           ("loads, interned (1000)", lambda text: loads(text, StringTable(1000)))]:
+        elapsed, held = measure(function, text)
+        print(f"{name:<28}{elapsed:>9.3f}{held / 1e6:>9.1f}")
+
+if __name__ == "__main__":
+    main()
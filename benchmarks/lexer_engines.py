@@ -0,0 +1,67 @@
+'''
+Compares the lexer's table-driven CompiledDFA with the DFA.transition if-chain it replaced, in characters lexed
+per second: the old loop (DFA.transition for every character, lexemes built up one character at a time), and
+Lexer.tokenize and Lexer.tokenize_buffer. All three give the same tokens, checked here too.
+The goal for the compiled DFA was ten times the characters per second of the if-chain. Only string-heavy input
+gets there (strings are skipped with str.find); token-dense input is only about 2 to 3 times faster, since each
+token still costs a few Python-level steps however its characters are dispatched.
+Run from the repository root with: python -m benchmarks.lexer_engines
+'''
+import time
+from scanner import DFA, Lexer, Token, TokenType
+from benchmarks import corpus
+
+class TransitionLexer:
+    #the lexer as it was before CompiledDFA: DFA.transition is called for every character
+    def __init__(self, input_text):
+        self.input_text = input_text
+        self.dfa = DFA()
+
+    def tokenize(self):
+        text = self.input_text
+        tokens = []
+        position = 0
+        token_value = ""
+        while position < len(text):
+            char = text[position]
+            if char.isspace() and len(token_value) == 0:
+                position += 1
+                continue
+            token = self.dfa.transition(char, text[position + 1] if position + 1 < len(text) else None, token_value)
+            if self.dfa.state == "reject":
+                raise ValueError(f"lexical error at index {position}")
+            position += 1
+            token_value += char
+            if token is not None:
+                tokens.append(token)
+                token_value = ""
+        if token_value.isnumeric():
+            tokens.append(Token(TokenType.INTEGER, token_value))
+        tokens.append(Token(TokenType.EOF))
+        return tokens
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    print(f"{'input':<10}{'chars':>10}{'tokens':>9}{'if-chain (Mc/s)':>17}{'tokenize (Mc/s)':>17}{'buffer (Mc/s)':>15}"
+          f"{'speedup':>10}")
+    for kind in ["wide", "keys", "numbers", "deep", "strings"]:
+        text = corpus.generate(kind, 1 << 19)
+        tokens = Lexer(text).tokenize()
+        assert [repr(token) for token in TransitionLexer(text).tokenize()] == [repr(token) for token in tokens]
+        assert [repr(token) for token in Lexer(text).tokenize_buffer()] == [repr(token) for token in tokens]
+        rates = [len(text) / 1e6 / best_of(function, repeat) for function, repeat in
+                 [(TransitionLexer(text).tokenize, 1), (lambda: Lexer(text).tokenize(), 3),
+                  (lambda: Lexer(text).tokenize_buffer(), 3)]]
+        print(f"{kind:<10}{len(text):>10}{len(tokens):>9}{rates[0]:>17.2f}{rates[1]:>17.2f}{rates[2]:>15.2f}"
+              f"{rates[2] / rates[0]:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
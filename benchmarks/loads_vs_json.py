@@ -0,0 +1,40 @@
+'''
+Compares parser.loads with the stdlib json module on documents both of them accept.
+Run from the repository root with: python -m benchmarks.loads_vs_json
+'''
+import json
+import time
+from parser import loads
+
+def records_document(count):
+    return "[" + ", ".join(f'{{"id": {i}, "name": "user {i}", "score": {i}.5, "active": true, "tags": ["a", "b", null]}}'
+                           for i in range(count)) + "]"
+
+def numbers_document(count):
+    return "[" + ", ".join(str(i * 7) if i % 2 else f"{i}.25" for i in range(count)) + "]"
+
+def strings_document(count):
+    return "{" + ", ".join(f'"key {i}": "{"lorem ipsum " * (i % 20 + 1)}"' for i in range(count)) + "}"
+
+def best_time(function, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    cases = [("records", records_document(20000)),
+             ("numbers", numbers_document(200000)),
+             ("strings", strings_document(20000))]
+    print(f"{'input':<10}{'MB':>8}{'loads (s)':>12}{'json (s)':>12}{'ratio':>8}")
+    for name, text in cases:
+        assert loads(text) == json.loads(text)
+        ours = best_time(loads, text)
+        stdlib = best_time(json.loads, text)
+        print(f"{name:<10}{len(text) / 1e6:>8.2f}{ours:>12.4f}{stdlib:>12.4f}{ours / stdlib:>8.1f}")
+
+if __name__ == "__main__":
+    main()
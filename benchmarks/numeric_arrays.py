@@ -0,0 +1,51 @@
+'''
+Compares parser.loads with and without numeric_arrays on documents made of long lists of numbers (sensor
+series of floats, counters of integers, and the corpus' mixed numbers), for time and for the memory held by
+the result. numeric_arrays is timed with NumPy when it is installed, and with array.array in any case.
+Run from the repository root with: python -m benchmarks.numeric_arrays
+'''
+import random
+import time
+import tracemalloc
+import parser
+from parser import loads
+from benchmarks import corpus
+
+def series(size, seed=0):
+    #a dict of sensor series: readings with a few decimals, and integer counters
+    rng = random.Random(seed)
+    readings = ", ".join(f"{rng.uniform(-50, 50):.3f}" for _ in range(size // 16))
+    counters = ", ".join(str(rng.randint(0, 10 ** 6)) for _ in range(size // 16))
+    return f'{{"sensor": "s-17", "readings": [{readings}], "counters": [{counters}]}}'
+
+def measure(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    result = function()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return best, held
+
+def main():
+    numpy = parser.numpy
+    modes = [("lists", False, numpy), ("array.array", True, None)]
+    if numpy is not None:
+        modes.append(("numpy", True, numpy))
+    print(f"{'input':<10}{'MB':>6}" + "".join(f"{name + ' s':>16}{'MB held':>9}" for name, _, _ in modes))
+    for kind, text in [("series", series(1 << 23)), ("numbers", corpus.generate("numbers", 1 << 23))]:
+        row = f"{kind:<10}{len(text) / 1e6:>6.1f}"
+        for name, numeric_arrays, module in modes:
+            parser.numpy = module
+            elapsed, held = measure(lambda: loads(text, numeric_arrays=numeric_arrays))
+            row += f"{elapsed:>16.3f}{held / 1e6:>9.1f}"
+        parser.numpy = numpy
+        print(row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+'''
+Compares getting one value out of a document with ondemand.extract and with parser.loads (and with lexing
+the whole document alone, for scale). The value is taken from near the start, the middle and the end of a
+top-level dict or list, extract's time grows with how far into the document it has to look.
+Run from the repository root with: python -m benchmarks.ondemand_extract
+'''
+import time
+from ondemand import extract
+from parser import loads
+from scanner import Lexer
+from benchmarks import corpus
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    print(f"{'input':<10}{'MB':>7}{'lex':>9}{'loads':>9}{'first':>10}{'middle':>10}{'last':>10}")
+    for kind in ["keys", "wide", "strings", "numbers", "deep"]:
+        text = corpus.generate(kind, 1 << 22)
+        value = loads(text)
+        count = len(value)
+        keys = list(value) if isinstance(value, dict) else [str(index) for index in range(count)]
+        #path steps that are keys are quoted, in case they are all digits or have dots
+        paths = [f'"{keys[index]}"' if isinstance(value, dict) else keys[index] for index in [0, count // 2, count - 1]]
+        for path in paths:
+            assert path in extract(text, [path])
+        lex_time = best_of(lambda: Lexer(text).tokenize_buffer())
+        loads_time = best_of(lambda: loads(text))
+        times = [best_of(lambda: extract(text, [path])) for path in paths]
+        print(f"{kind:<10}{len(text) / 1e6:>7.2f}{lex_time:>9.3f}{loads_time:>9.3f}" +
+              "".join(f"{elapsed:>10.4f}" for elapsed in times))
+
+if __name__ == "__main__":
+    main()
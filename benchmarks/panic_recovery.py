@@ -0,0 +1,47 @@
+'''
+Compares panic mode recovery that jumps straight to the synchronizing token (Parser.find_synchronizing) with
+reading up to it one token at a time. The inputs are the corpus' long list of numbers and flat dict of keys
+with a stray token near the start, so recovery skips almost all of it, and the error corpus, where each
+recovery only skips a few tokens (the parser crashes on its tree, so it is only validated). Both ways give
+the same errors, checked here too.
+Run from the repository root with: python -m benchmarks.panic_recovery
+'''
+import time
+from parser import Parser
+from scanner import Lexer
+from benchmarks import corpus
+
+class ScanningParser(Parser):
+    #the parser as it recovered before, reading every skipped token
+    def find_synchronizing(self, synchronizing_tokens):
+        return None
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+#a list or dict of the corpus with a stray colon after its first element
+def broken(kind, size):
+    text = corpus.generate(kind, size)
+    comma = text.index(",")
+    return text[:comma + 1] + " :" + text[comma + 1:]
+
+def main():
+    print(f"{'input':<10}{'tokens':>10}{'errors':>8}{'mode':>10}{'scanning':>10}{'jumping':>10}")
+    for kind in ["numbers", "keys", "errors"]:
+        text = corpus.generate(kind, 1 << 22) if kind == "errors" else broken(kind, 1 << 22)
+        tokens = Lexer(text).tokenize_buffer()
+        errors = Parser(tokens).validate()
+        assert errors == ScanningParser(tokens).validate()
+        for mode in ["validate"] if kind == "errors" else ["validate", "parse"]:
+            scanning = best_of(lambda: getattr(ScanningParser(tokens), mode)())
+            jumping = best_of(lambda: getattr(Parser(tokens), mode)())
+            print(f"{kind:<10}{len(tokens):>10}{len(errors):>8}{mode:>10}{scanning:>10.3f}{jumping:>10.3f}")
+
+if __name__ == "__main__":
+    main()
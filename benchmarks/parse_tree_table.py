@@ -0,0 +1,92 @@
+'''
+Compares the parse tree as a ParseTree node table with the list of label strings the parser used to keep,
+for parse time (including rendering the lines), for the memory the tree holds once parsed (measured with
+tracemalloc, in a separate run from the timings, without the rendered lines), and for navigating it: the
+table's parent of every node, and a walk of the whole tree. Both give the same lines, checked here too.
+The label list gets the labels through Python-level methods, like the table, so its parse times are a
+little slower than they were.
+Run from the repository root with: python -m benchmarks.parse_tree_table
+'''
+import time
+import tracemalloc
+from parser import Parser, TreeRenderer
+from scanner import Lexer
+from benchmarks import corpus
+
+class LabelList(list):
+    #the labels of the rules the parser opens and the tokens it adds, without the tree's structure
+    def open(self, symbol):
+        self.append(symbol)
+
+    def add(self, symbol, value=None, index=None):
+        self.append(symbol if value is None else symbol + ": " + value)
+
+    def mark(self):
+        return 0
+
+    def close(self, mark):
+        pass
+
+class LabelListParser(Parser):
+    #the parser as it kept its tree before, a list of labels rendered with an indentation stack
+    def __init__(self, token_stream):
+        super().__init__(token_stream)
+        self.tokens_eaten = LabelList()
+
+    def output(self):
+        renderer = TreeRenderer()
+        for token in self.tokens_eaten:
+            line = renderer.render(token)
+            if line is not None:
+                self.parse_tree.append(line)
+        return self.parse_tree
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+#memory held by the parser's tree after parsing, the token buffer it reads labels back from not included
+def held(parser_class, tokens):
+    parser = parser_class(tokens)
+    tracemalloc.start()
+    parser.parse()
+    parser.parse_tree = None
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory
+
+def navigate(tree):
+    for node in range(len(tree.kinds)):
+        tree.parent(node)
+
+def walk(tree):
+    for _ in tree.walk():
+        pass
+
+def main():
+    print(f"{'input':<10}{'nodes':>10}{'tree':>7}{'parse (s)':>11}{'bytes/node':>12}{'parents (s)':>13}{'walk (s)':>10}")
+    for kind in ["wide", "keys", "strings", "deep"]:
+        tokens = Lexer(corpus.generate(kind, 1 << 20)).tokenize_buffer()
+        parser = Parser(tokens)
+        lines = parser.parse()[0]
+        assert lines == LabelListParser(tokens).parse()[0]
+        tree = parser.tokens_eaten
+        nodes = len(tree.kinds)
+        for name, parser_class in [("labels", LabelListParser), ("table", Parser)]:
+            elapsed = best_of(lambda: parser_class(tokens).parse())
+            memory = held(parser_class, tokens)
+            if parser_class is Parser:
+                parents = f"{best_of(lambda: navigate(tree)):>13.3f}"
+                walked = f"{best_of(lambda: walk(tree)):>10.3f}"
+            else:
+                parents = f"{'-':>13}"
+                walked = f"{'-':>10}"
+            print(f"{kind:<10}{nodes:>10}{name:>7}{elapsed:>11.3f}{memory / nodes:>12.1f}{parents}{walked}")
+
+if __name__ == "__main__":
+    main()
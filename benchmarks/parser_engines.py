@@ -0,0 +1,39 @@
+'''
+Compares Parser.parse (explicit stack) with Parser.parse_recursive on wide and deep inputs.
+Run from the repository root with: python -m benchmarks.parser_engines
+'''
+import sys
+import time
+from parser import Parser
+from scanner import Lexer
+from benchmarks import corpus
+
+def time_engine(tokens, engine, repeat=3):
+    best = None
+    for _ in range(repeat):
+        parser = Parser(tokens)
+        start = time.perf_counter()
+        try:
+            getattr(parser, engine)()
+        except RecursionError:
+            return None
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    cases = [("wide", "1MB", corpus.wide(1 << 20)),
+             ("deep", 300, corpus.deep(3000, max_depth=300)),
+             ("deep", 900, corpus.deep(9000, max_depth=900)),
+             ("deep", 3000, corpus.deep(30000, max_depth=3000))]
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    print(f"{'input':<12}{'tokens':>10}{'recursive (s)':>16}{'iterative (s)':>16}")
+    for name, size, text in cases:
+        tokens = Lexer(text).tokenize_buffer()
+        recursive = time_engine(tokens, "parse_recursive")
+        iterative = time_engine(tokens, "parse")
+        recursive = f"{recursive:.4f}" if recursive is not None else "RecursionError"
+        print(f"{name + ' ' + str(size):<12}{len(tokens):>10}{recursive:>16}{iterative:>16.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+'''
+Per-document latency of the compile service (service.py) against starting compiler.py for each document,
+for small documents one at a time, and the throughput of the service when a client pipelines many of them.
+Run from the repository root with: python -m benchmarks.service_latency
+'''
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from service import Client
+from benchmarks import corpus
+
+SEQUENTIAL = 2000
+PIPELINED = 20000
+SUBPROCESSES = 20
+
+def percentile(times, fraction):
+    ordered = sorted(times)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+
+def main():
+    directory = tempfile.mkdtemp()
+    socket_path = os.path.join(directory, "service.sock")
+    server = subprocess.Popen([sys.executable, "service.py", "--socket", socket_path], stdout=subprocess.PIPE, text=True)
+    server.stdout.readline() #Listening on ...
+    documents = [corpus.generate(kind, 512, seed) for seed in range(10) for kind in ["keys", "wide", "errors"]]
+    try:
+        client = Client(socket_path)
+        times = []
+        for index in range(SEQUENTIAL):
+            start = time.perf_counter()
+            client.compile(documents[index % len(documents)])
+            times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        client.compile_many([documents[index % len(documents)] for index in range(PIPELINED)], tree=False)
+        pipelined = time.perf_counter() - start
+        metrics = client.metrics()
+        client.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    input_name = os.path.join(directory, "document.txt")
+    subprocess_times = []
+    for index in range(SUBPROCESSES):
+        with open(input_name, "w") as file:
+            file.write(documents[index % len(documents)])
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "compiler.py", input_name, "-j", "1", "--no-token-stream"], stdout=subprocess.DEVNULL)
+        subprocess_times.append(time.perf_counter() - start)
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+    print(f"service, one at a time:  p50 {percentile(times, 0.5):.2f} ms  p99 {percentile(times, 0.99):.2f} ms")
+    print(f"service, pipelined:      {PIPELINED / pipelined:.0f} documents/s, mean batch {metrics['mean_batch']:.1f}")
+    print(f"compiler.py per file:    p50 {percentile(subprocess_times, 0.5):.2f} ms  p99 {percentile(subprocess_times, 0.99):.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+'''
+Measures throughput, latency percentiles and peak memory for each stage of the frontend on the synthetic
+corpus: Lexer.tokenize, Parser.parse, and compile_file (the flow behind compiler.main, file I/O included).
+Results are saved as JSON so runs can be compared.
+Run from the repository root with: python -m benchmarks.suite [--size BYTES] [--compare OLD_RESULTS.json]
+'''
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from compiler import compile_file
+from parser import Parser
+from scanner import Lexer
+from benchmarks import corpus
+
+STAGES = ["lex", "parse", "compile"]
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+#nearest-rank percentile of a list of timings
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+#returns a function that runs one stage on text, setup such as lexing for the parse stage is not timed
+def prepare_stage(stage, text, work_dir):
+    if stage == "lex":
+        return lambda: Lexer(text).tokenize()
+    if stage == "parse":
+        tokens = Lexer(text).tokenize_buffer()
+        return lambda: Parser(tokens).parse()
+    file_name = os.path.join(work_dir, "input.txt")
+    with open(file_name, "w") as file:
+        file.write(text)
+    return lambda: compile_file(file_name, echo=False)
+
+def run_stage(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timings, peak
+
+def run_suite(kinds, stages, size, repeat, seed):
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for kind in kinds:
+            text = corpus.generate(kind, size, seed)
+            for stage in stages:
+                run = prepare_stage(stage, text, work_dir)
+                timings, peak = run_stage(run, repeat)
+                median = percentile(timings, 0.5)
+                results.append({
+                    "kind": kind,
+                    "stage": stage,
+                    "chars": len(text),
+                    "mb_per_s": len(text) / 1e6 / median,
+                    "p50_ms": median * 1000,
+                    "p90_ms": percentile(timings, 0.9) * 1000,
+                    "p99_ms": percentile(timings, 0.99) * 1000,
+                    "peak_mb": peak / 1e6,
+                })
+                print_result(results[-1])
+    return results
+
+def print_result(result, previous=None):
+    line = (f"{result['kind']:<9}{result['stage']:<9}{result['chars'] / 1e6:>8.2f}{result['mb_per_s']:>10.2f}"
+            f"{result['p50_ms']:>10.1f}{result['p90_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['peak_mb']:>10.2f}")
+    if previous is not None:
+        line += f"{result['mb_per_s'] / previous['mb_per_s'] - 1:>+10.1%}{result['peak_mb'] - previous['peak_mb']:>+10.2f}"
+    print(line)
+
+def print_header(comparing=False):
+    header = f"{'kind':<9}{'stage':<9}{'MB':>8}{'MB/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak MB':>10}"
+    if comparing:
+        header += f"{'MB/s':>10}{'peak MB':>10}"
+    print(header)
+
+#print the results of this run next to the change from an earlier one
+def compare(results, old_file):
+    with open(old_file) as file:
+        previous = {(result["kind"], result["stage"]): result for result in json.load(file)["results"]}
+    print(f"\nCompared with {old_file}:")
+    print_header(comparing=True)
+    for result in results:
+        print_result(result, previous.get((result["kind"], result["stage"])))
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the lexer, parser and full compile flow.")
+    arg_parser.add_argument("--size", type=int, default=256 * 1024, help="approximate characters per document")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="timed runs per kind and stage")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--kinds", nargs="+", default=corpus.KINDS, choices=corpus.KINDS)
+    arg_parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    arg_parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<time>.json)")
+    arg_parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = arg_parser.parse_args(argv)
+
+    print_header()
+    results = run_suite(args.kinds, args.stages, args.size, args.repeat, args.seed)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    meta = {"python": sys.version.split()[0], "platform": platform.platform(), "time": time.time(),
+            "size": args.size, "repeat": args.repeat, "seed": args.seed}
+    with open(output, "w") as file:
+        json.dump({"meta": meta, "results": results}, file, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+'''
+Compares the text and binary token stream formats: file size, writing, and reloading into a Parser
+(building the token list from the text format, memory-mapping the binary one) followed by a full parse.
+Run from the repository root with: python -m benchmarks.token_stream_formats
+'''
+import os
+import tempfile
+import time
+from parser import Parser
+from scanner import Lexer
+from tokenstream import load_binary, write_binary, write_text
+from benchmarks import corpus
+
+def best_of(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    directory = tempfile.mkdtemp()
+    text_name = os.path.join(directory, "tokens")
+    binary_name = os.path.join(directory, "tokens.bin")
+
+    def write_text_file():
+        with open(text_name, "w") as file:
+            write_text(tokens, file)
+
+    def write_binary_file():
+        with open(binary_name, "wb") as file:
+            write_binary(tokens, file)
+
+    def load_text():
+        with open(text_name) as file:
+            return Parser(file.read())
+
+    print(f"{'input':<10}{'text MB':>9}{'bin MB':>8}{'write txt':>11}{'write bin':>11}"
+          f"{'load txt':>10}{'load bin':>10}{'parse txt':>11}{'parse bin':>11}")
+    for kind in ["wide", "keys", "strings", "numbers"]:
+        tokens = Lexer(corpus.generate(kind, 1 << 20)).tokenize_buffer()
+        write_text_time = best_of(write_text_file)
+        write_binary_time = best_of(write_binary_file)
+        load_text_time = best_of(load_text)
+        load_binary_time = best_of(lambda: Parser(load_binary(binary_name)))
+        parse_text_time = best_of(lambda: load_text().parse())
+        parse_binary_time = best_of(lambda: Parser(load_binary(binary_name)).parse())
+        print(f"{kind:<10}{os.path.getsize(text_name) / 1e6:>9.2f}{os.path.getsize(binary_name) / 1e6:>8.2f}"
+              f"{write_text_time:>11.3f}{write_binary_time:>11.3f}{load_text_time:>10.3f}{load_binary_time:>10.4f}"
+              f"{parse_text_time:>11.3f}{parse_binary_time:>11.3f}")
+    os.remove(text_name)
+    os.remove(binary_name)
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
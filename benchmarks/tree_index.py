@@ -0,0 +1,70 @@
+'''
+Compares looking up single keys in an indexed tree (treeindex.py) with getting them from the whole document
+(parser.loads) and with reading the text _parse_tree. Each lookup is a fresh open of its file, as a tool
+querying an archived tree would do.
+Run from the repository root with: python -m benchmarks.tree_index
+'''
+import os
+import random
+import tempfile
+import time
+from parser import Parser, loads
+from scanner import Lexer
+from treeindex import load_index, write_index
+from benchmarks import corpus
+
+LOOKUPS = 20
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def main():
+    directory = tempfile.mkdtemp()
+    index_name = os.path.join(directory, "tree_index")
+    tree_name = os.path.join(directory, "parse_tree")
+    print(f"{'input':<10}{'MB':>7}{'index MB':>10}{'tree MB':>9}{'write index':>13}"
+          f"{'index lookup':>14}{'loads lookup':>14}{'tree scan':>11}")
+    for kind in ["keys", "wide", "numbers"]:
+        text = corpus.generate(kind, 1 << 22)
+        tokens = Lexer(text).tokenize_buffer()
+        with open(tree_name, "w") as file:
+            Parser(tokens, tree_writer=file).parse()
+        with open(index_name, "wb") as file:
+            write_index_time = timed(lambda: write_index(tokens, file))
+        tree = load_index(index_name)
+        rng = random.Random(0)
+        children = tree.children(0)
+        picks = [rng.choice(children) for _ in range(LOOKUPS)]
+        #paths are the keys of top-level pairs, or the indexes of top-level elements
+        paths = [f'"{tree.key(node)}"' if tree.kind(0) == "dict" else str(node - children.start) for node in picks]
+
+        def index_lookups():
+            for path in paths:
+                lookup_tree = load_index(index_name)
+                lookup_tree.value(lookup_tree.lookup(path))
+
+        def loads_lookups():
+            for path in paths[:2]: #whole-document parses, only two of them
+                value = loads(text)
+                value[path.strip('"')] if isinstance(value, dict) else value[int(path)]
+
+        def tree_scans():
+            for _ in paths[:2]: #the parse tree has to be read through to the key
+                with open(tree_name) as file:
+                    for line in file:
+                        pass
+
+        index_time = timed(index_lookups) / LOOKUPS
+        loads_time = timed(loads_lookups) / 2
+        scan_time = timed(tree_scans) / 2
+        print(f"{kind:<10}{len(text) / 1e6:>7.2f}{os.path.getsize(index_name) / 1e6:>10.2f}"
+              f"{os.path.getsize(tree_name) / 1e6:>9.2f}{write_index_time:>13.3f}{index_time * 1000:>12.3f}ms"
+              f"{loads_time * 1000:>12.1f}ms{scan_time * 1000:>9.1f}ms")
+    os.remove(index_name)
+    os.remove(tree_name)
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
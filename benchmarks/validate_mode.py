@@ -0,0 +1,45 @@
+'''
+Compares Parser.validate over a token stream straight from the lexer with a full Parser.parse over a
+TokenBuffer, both including lexing, on valid and error-heavy inputs. Peak memory is measured with
+tracemalloc, which slows both down, so times are taken in a separate run.
+Run from the repository root with: python -m benchmarks.validate_mode
+'''
+import contextlib
+import io
+import time
+import tracemalloc
+from parser import Parser, StreamedTokens
+from scanner import Lexer
+from benchmarks import corpus
+
+def full_parse(text):
+    return Parser(Lexer(text).tokenize_buffer()).parse()
+
+def validate(text):
+    return Parser(StreamedTokens(Lexer(text))).validate()
+
+def measure(function, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    function(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+def main():
+    size = 1 << 20
+    print(f"{'input':<10}{'parse (s)':>12}{'validate (s)':>14}{'parse peak (MB)':>17}{'validate peak (MB)':>20}")
+    for kind in ["wide", "keys", "strings", "deep", "errors"]:
+        text = corpus.generate(kind, size)
+        with contextlib.redirect_stdout(io.StringIO()): #lexical errors are printed
+            parse_time, parse_peak = measure(full_parse, text)
+            validate_time, validate_peak = measure(validate, text)
+        print(f"{kind:<10}{parse_time:>12.3f}{validate_time:>14.3f}{parse_peak / 1e6:>17.1f}{validate_peak / 1e6:>20.2f}")
+
+if __name__ == "__main__":
+    main()
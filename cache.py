@@ -0,0 +1,110 @@
+'''
+On-disk cache of compile outputs, so unchanged inputs are not lexed and parsed again.
+
+Entries are keyed by a hash of the input's bytes, the lexing mode and FRONTEND_VERSION, a hash of the
+frontend's own source files, so any change to a module the outputs go through starts a fresh set of keys.
+Each entry is a directory holding copies of the _token_stream, _parse_tree and _tree_index outputs (the
+token stream and tree index only if they were written) plus a small meta.json with the error messages. The
+least recently used entries are removed by evict() once the cache is over its size bound, after every put or
+once at the end of a batch.
+'''
+import hashlib
+import json
+import os
+import shutil
+
+#hash of the modules whose code decides what the outputs look like
+def frontend_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in ["scanner.py", "parser.py", "compiler.py", "tokenstream.py", "parallel.py", "treeindex.py",
+                 "profiling.py", "docstream.py", "cache.py"]:
+        with open(os.path.join(directory, name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+FRONTEND_VERSION = frontend_version()
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024 #bytes
+READ_SIZE = 1 << 20 #bytes hashed at a time
+
+class ArtifactCache:
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE, evict_on_put=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_on_put = evict_on_put #False when the caller evicts once for a whole batch instead
+        self.hits = 0
+        os.makedirs(directory, exist_ok=True)
+
+    #content hash of an input file for one lexing mode and token stream format
+    def key(self, file_name, use_mmap=False, binary_tokens=False):
+        digest = hashlib.sha256(f"{FRONTEND_VERSION} mmap={use_mmap} binary={binary_tokens}\n".encode())
+        with open(file_name, "rb") as file:
+            for block in iter(lambda: file.read(READ_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, key, need_token_stream=True, need_tree_index=False):
+        '''
+        Return [entry directory, meta] for a cached compile, or None on a miss (or if the entry has no
+        token stream and one is needed, or was compiled without a tree index and one is needed).
+        A hit marks the entry as recently used.
+        '''
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, "meta.json")) as file:
+                meta = json.load(file)
+            if need_token_stream and not meta["token_stream"]:
+                return None
+            if need_tree_index and not meta.get("tree_index"):
+                return None
+            os.utime(entry)
+            self.hits += 1
+        except (OSError, ValueError): #missing, evicted by another process meanwhile, or half written
+            return None
+        return [entry, meta]
+
+    def put(self, key, token_stream_file, parse_tree_file, meta, tree_index_file=None):
+        '''
+        Store copies of a compile's output files (token_stream_file and tree_index_file may be None) and its meta.
+        meta["tree_index"] tells whether the compile made a tree index, even if the input had none for its errors.
+        The entry is written under a temporary name and renamed, so readers never see half of it.
+        '''
+        entry = os.path.join(self.directory, key)
+        temporary = os.path.join(self.directory, f".tmp-{os.getpid()}-{key}")
+        os.makedirs(temporary, exist_ok=True)
+        meta = dict(meta, token_stream=token_stream_file is not None)
+        if token_stream_file is not None:
+            shutil.copyfile(token_stream_file, os.path.join(temporary, "token_stream"))
+        shutil.copyfile(parse_tree_file, os.path.join(temporary, "parse_tree"))
+        if tree_index_file is not None:
+            shutil.copyfile(tree_index_file, os.path.join(temporary, "tree_index"))
+        with open(os.path.join(temporary, "meta.json"), "w") as file:
+            json.dump(meta, file)
+        shutil.rmtree(entry, ignore_errors=True) #an older entry without a token stream or tree index
+        try:
+            os.rename(temporary, entry)
+        except OSError: #another process stored the same input first
+            shutil.rmtree(temporary, ignore_errors=True)
+        if self.evict_on_put:
+            self.evict()
+
+    def evict(self):
+        '''
+        Remove least recently used entries until the cache fits in max_bytes.
+        Without evict_on_put it is called once per batch rather than after every put, so a batch can overshoot
+        by what it stores.
+        '''
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            try:
+                size = sum(item.stat().st_size for item in os.scandir(entry.path))
+                entries.append([entry.stat().st_mtime, size, entry.path])
+            except OSError:
+                continue
+            total += size
+        for used, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
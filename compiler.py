@@ -1,40 +1,419 @@
+import argparse
+import glob
+import io
+import json
 import os
-from parser import Parser
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cache import DEFAULT_CACHE_SIZE, ArtifactCache
+from contextlib import nullcontext
+from docstream import MODES, iter_documents
+from parallel import lex_split, parse_split
+from parser import Parser, StreamedTokens
+from profiling import NO_PROFILE, Profile
 from scanner import Lexer
+from tokenstream import load_binary, write_binary, write_text
+from treeindex import write_index
+
+class EchoWriter:
+    #writes to a file and echoes the same text to stdout
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, text):
+        sys.stdout.write(text)
+        self.file.write(text)
+
+STREAM_SIZE = 1 << 26 #inputs larger than this many bytes are streamed by compile_file when they can be
+
+#a chunked Lexer over an open input file, with its reads timed by the profile
+def open_lexer(file, use_mmap, profile):
+    lexer = Lexer.from_mmap(file) if use_mmap else Lexer.from_file(file)
+    lexer.source = profile.reader(lexer.source, "read")
+    return lexer
+
+def compile_file(file_name, write_token_stream=True, output_dir=None, echo=True, use_mmap=False, cache=None,
+                 executor=None, workers=1, profile=NO_PROFILE, binary_tokens=False, tree_index=False):
+    '''
+    Lex and parse a file in memory, the token stream file is only written as a side output.
+    Outputs go next to the input, or into output_dir. With echo the token stream and tree are also printed.
+    With use_mmap the file is lexed from a memory map of its bytes instead of being read in as text.
+    With an ArtifactCache, the outputs of an unchanged input are copied from the cache instead.
+    With a process pool executor of workers processes, and no echo, the file itself is split between
+    the processes (see parallel.py), with the same outputs.
+    With a profiling.Profile, phase times and counts are added to it.
+    With binary_tokens the token stream is written in the binary format of tokenstream.py, to _token_stream.bin.
+    With tree_index an input without errors also gets a _tree_index (see treeindex.py), and an older one is removed
+    from an input with errors.
+    An input larger than STREAM_SIZE is streamed from the lexer into the parser, with the token stream written as
+    it is read, unless it is echoed, split, written as binary tokens or indexed: those need the whole TokenBuffer.
+    Its tokens are not counted in the profile then.
+    Returns the list of lexical and parsing error messages.
+    '''
+    output_name = file_name if output_dir is None else os.path.join(output_dir, os.path.basename(file_name))
+    token_stream_name = f"{output_name}_token_stream" + (".bin" if binary_tokens else "")
+    tree_index_name = f"{output_name}_tree_index" if tree_index else None
+    if cache is not None:
+        profile.start("cache")
+        key = cache.key(file_name, use_mmap, binary_tokens)
+        hit = cache.get(key, write_token_stream, tree_index)
+        profile.stop()
+        if hit is not None:
+            return replay_cached(hit[0], hit[1], file_name, output_name, token_stream_name if write_token_stream else None,
+                                 echo, tree_index_name)
+    split = None
+    if executor is not None and not echo:
+        profile.start("lex") #reading and writing the token stream happen in the workers too
+        with open(token_stream_name, "w") if write_token_stream and not binary_tokens else nullcontext() as output_file:
+            split = lex_split(file_name, executor, use_mmap, output_file)
+        profile.stop()
+    #a large input goes straight from the lexer into the parser when nothing needs all of its tokens at once
+    stream = (split is None and not echo and not binary_tokens and not tree_index
+              and os.path.getsize(file_name) > STREAM_SIZE)
+    if split is not None:
+        tokens, lexical_error = split.tokens, split.error
+    elif not stream:
+        profile.start("lex")
+        with open(file_name, 'rb' if use_mmap else 'r') as file:
+            lexer = open_lexer(file, use_mmap, profile)
+            tokens = lexer.tokenize_buffer()
+        lexical_error = lexer.error
+        profile.stop()
+    if not stream:
+        profile.count_tokens(tokens)
+    if write_token_stream and binary_tokens:
+        profile.start("token stream write")
+        with open(token_stream_name, "wb") as output_file:
+            write_binary(tokens, output_file)
+        profile.stop()
+    if write_token_stream and not stream and (echo or split is None and not binary_tokens):
+        profile.start("token stream write")
+        with open(token_stream_name, "w") if not binary_tokens else nullcontext() as output_file:
+            if echo:
+                print(f"Printing token stream to: {token_stream_name}")
+            for token in tokens:
+                if echo:
+                    print(token)
+                if not binary_tokens:
+                    output_file.write(str(token))
+                    if not token.type == "EOF":
+                        output_file.write("\n")
+        if echo:
+            print("Token stream printed. Initializing Parser")
+        profile.stop()
+    profile.start("parse")
+    with open(f"{output_name}_parse_tree", "w") as output_file:
+        tree_writer = profile.writer(EchoWriter(output_file) if echo else output_file, "tree write")
+        if echo:
+            print(f"Printing parse tree for {file_name}")
+        if split is not None and parse_split(split, executor, workers, tree_writer):
+            outputs = [[], []]
+            error_list = []
+        else:
+            if split is not None: #parse_split gave up part way, start the tree over
+                output_file.seek(0)
+                output_file.truncate()
+            #the tree is written line by line as it is parsed, it is never held in memory
+            if stream:
+                with open(file_name, 'rb' if use_mmap else 'r') as file, \
+                     open(token_stream_name, "w") if write_token_stream else nullcontext() as token_file:
+                    lexer = open_lexer(file, use_mmap, profile)
+                    token_writer = None if token_file is None else profile.writer(token_file, "token stream write")
+                    parser = Parser(StreamedTokens(lexer, token_writer), tree_writer=tree_writer)
+                    outputs = parser.parse() #returns [parse tree (already written), error_report]
+                lexical_error = lexer.error
+            else:
+                parser = Parser(tokens, tree_writer=tree_writer)
+                outputs = parser.parse()
+            error_list = parser.error_list
+            profile.count_parser(parser)
+        profile.start("tree write")
+        if len(outputs[1]) > 0:
+            if echo:
+                print("\n")
+            for error in outputs[1]:
+                if echo:
+                    print(error)
+                output_file.write(error + "\n")
+        profile.stop()
+    profile.stop()
+
+    errors = [] if lexical_error is None else [f"Lexical Error: {lexical_error}"]
+    indexed = False
+    if tree_index:
+        profile.start("tree index write")
+        if not errors and not error_list:
+            try:
+                with open(tree_index_name, "wb") as output_file:
+                    write_index(tokens, output_file)
+                indexed = True
+            except ValueError: #a leftover token after the document, which the parser lets through
+                pass
+        if not indexed: #an index left from an earlier version of the input
+            remove_output(tree_index_name)
+        profile.stop()
+    (lexer if split is None else split).close() #the memory map the tokens were read from, with use_mmap
+    if cache is not None:
+        profile.start("cache")
+        cache.put(key, token_stream_name if write_token_stream else None, f"{output_name}_parse_tree",
+                  {"lexical_error": None if lexical_error is None else str(lexical_error),
+                   "report": outputs[1], "errors": errors + error_list, "tree_index": tree_index},
+                  tree_index_name if indexed else None)
+        profile.stop()
+    return errors + error_list
+
+def validate_file(file_name, use_mmap=False, first_only=False, profile=NO_PROFILE):
+    '''
+    Check a file without writing any outputs: tokens are streamed from the lexer into Parser.validate,
+    so neither the token stream nor a parse tree is held in memory.
+    Returns the list of lexical and parsing error messages, only the first one with first_only.
+    '''
+    profile.start("validate") #lexing and parsing are interleaved
+    with open(file_name, 'rb' if use_mmap else 'r') as file, open_lexer(file, use_mmap, profile) as lexer:
+        parser = Parser(StreamedTokens(lexer))
+        errors = parser.validate(first_only)
+    profile.stop()
+    profile.count_parser(parser)
+    #a lexical error ends the token stream, so it comes before the parsing errors it causes
+    #(with first_only the lexer only gets to it if the parser does, give or take a token of lookahead)
+    errors = ([] if lexer.error is None else [f"Lexical Error: {lexer.error}"]) + errors
+    return errors[:1] if first_only else errors
+
+def compile_stream(file_name, mode, output_dir=None, validate=False, profile=NO_PROFILE):
+    '''
+    Check each document of a file of many documents (mode is "lines" or "concatenated", see docstream.py), one at
+    a time. Unless validate, writes _documents, with one line of JSON per document: its number, line, offset,
+    value (null if it has errors) and error messages. Returns the error messages, each with its document's number.
+    '''
+    output_name = file_name if output_dir is None else os.path.join(output_dir, os.path.basename(file_name))
+    errors = []
+    profile.start("stream")
+    with open(file_name) as file, open(f"{output_name}_documents", "w") if not validate else nullcontext() as output_file:
+        for document in iter_documents(file, mode, "errors" if validate else "values"):
+            errors.extend(f"Document {document.index} (line {document.line}): {error}" for error in document.errors)
+            if not validate:
+                output_file.write(json.dumps({"document": document.index, "line": document.line,
+                                              "offset": document.offset, "value": document.value,
+                                              "errors": document.errors}) + "\n")
+    profile.stop()
+    return errors
+
+#remove an output file if it is there
+def remove_output(name):
+    try:
+        os.remove(name)
+    except FileNotFoundError:
+        pass
+
+def replay_cached(entry, meta, file_name, output_name, token_stream_name, echo, tree_index_name=None):
+    '''
+    Copy a cache entry's files to the outputs of file_name and print what compile_file would have printed.
+    token_stream_name (tree_index_name) is None if no token stream (tree index) is written.
+    Returns the cached error messages.
+    '''
+    if meta["lexical_error"] is not None:
+        print(f"Lexical Error: {meta['lexical_error']}")
+    if token_stream_name is not None:
+        shutil.copyfile(os.path.join(entry, "token_stream"), token_stream_name)
+        if echo:
+            print(f"Printing token stream to: {token_stream_name}")
+            if token_stream_name.endswith(".bin"):
+                text = io.StringIO()
+                with load_binary(token_stream_name) as tokens:
+                    write_text(tokens, text)
+                token_stream = text.getvalue()
+            else:
+                with open(token_stream_name) as file:
+                    token_stream = file.read()
+            sys.stdout.write(token_stream if token_stream.endswith("\n") else token_stream + "\n")
+            print("Token stream printed. Initializing Parser")
+    shutil.copyfile(os.path.join(entry, "parse_tree"), f"{output_name}_parse_tree")
+    if tree_index_name is not None:
+        if os.path.exists(os.path.join(entry, "tree_index")):
+            shutil.copyfile(os.path.join(entry, "tree_index"), tree_index_name)
+        else:
+            remove_output(tree_index_name)
+    if echo:
+        print(f"Printing parse tree for {file_name}")
+        with open(f"{output_name}_parse_tree") as file:
+            parse_tree = file.read()
+        report_length = sum(len(error) + 1 for error in meta["report"])
+        sys.stdout.write(parse_tree[:len(parse_tree) - report_length])
+        if meta["report"]:
+            print("\n")
+            for error in meta["report"]:
+                print(error)
+    return meta["errors"]
+
+#runs in a worker process, returns [file name, input size in bytes, error messages, failure message or None,
+#whether the outputs came from the cache, Profile.to_dict() or None]. With an executor it runs in this process
+#instead, and splits the file between the pool's workers
+def compile_worker(job, executor=None, workers=1):
+    file_name, write_token_stream, output_dir, use_mmap, cache_dir, validate, profiled, binary_tokens, tree_index, \
+        stream = job
+    profile = Profile() if profiled else NO_PROFILE
+    size = 0
+    try:
+        size = os.path.getsize(file_name)
+        if profiled:
+            profile.begin_memory()
+        if stream is not None:
+            errors = compile_stream(file_name, stream, output_dir, validate is not None, profile)
+            cache = None
+        elif validate is not None:
+            errors = validate_file(file_name, use_mmap, validate == "first", profile)
+            cache = None
+        else:
+            #run_batch evicts once at the end, with the --cache-size bound
+            cache = ArtifactCache(cache_dir, evict_on_put=False) if cache_dir is not None else None
+            errors = compile_file(file_name, write_token_stream, output_dir, echo=False, use_mmap=use_mmap,
+                                  cache=cache, executor=executor, workers=workers, profile=profile,
+                                  binary_tokens=binary_tokens, tree_index=tree_index)
+        if profiled:
+            profile.end_memory()
+        return [file_name, size, errors, None, cache is not None and cache.hits > 0,
+                profile.to_dict() if profiled else None]
+    except Exception as e:
+        return [file_name, size, [], f"{type(e).__name__}: {e}", False, None]
+
+#output directory for each input: below output_dir, inputs keep their paths from the directory they all share,
+#so inputs with the same name in different directories do not overwrite each other's outputs
+def output_dirs(files, output_dir):
+    if output_dir is None:
+        return [None] * len(files)
+    directories = [os.path.dirname(os.path.abspath(file_name)) for file_name in files]
+    base = os.path.commonpath(directories)
+    return [os.path.normpath(os.path.join(output_dir, os.path.relpath(directory, base))) for directory in directories]
+
+#expand glob patterns, keeping plain file names as given and dropping duplicates
+def expand_inputs(patterns):
+    files = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for match in matches:
+            if match not in seen and not os.path.isdir(match):
+                seen.add(match)
+                files.append(match)
+    return files
+
+def run_batch(args):
+    files = expand_inputs(args.files)
+    if not files:
+        print("No input files matched.")
+        return 2
+    directories = output_dirs(files, args.output_dir)
+    if args.output_dir is not None and args.validate is None:
+        for directory in set(directories):
+            os.makedirs(directory, exist_ok=True)
+    jobs = [(file_name, not args.no_token_stream, directory, args.mmap, args.cache_dir, args.validate,
+             args.profile is not None, args.binary_tokens, args.tree_index, args.stream)
+            for file_name, directory in zip(files, directories)]
+    workers = args.jobs or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    executor = None
+    if args.split and args.validate is None and args.stream is None:
+        #one file at a time, each split between the workers of a pool shared by all the files
+        workers = args.split
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = (compile_worker(job, executor, workers) for job in jobs)
+    elif workers == 1:
+        results = map(compile_worker, jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        #hand out files in batches so small files do not pay one round trip each
+        results = executor.map(compile_worker, jobs, chunksize=max(1, len(jobs) // (8 * workers)))
+
+    num_ok = num_errors = num_failed = num_cached = total_bytes = 0
+    total_profile = Profile()
+    file_profiles = []
+    for file_name, size, errors, failure, cached, profile in results:
+        total_bytes += size
+        num_cached += cached
+        if profile is not None:
+            total_profile.merge(profile)
+            file_profiles.append(dict(profile, file=file_name, bytes=size))
+        if failure is not None:
+            num_failed += 1
+            print(f"{file_name}: failed ({failure})")
+        elif errors:
+            num_errors += 1
+            print(f"{file_name}: {len(errors)} errors")
+            if args.verbose:
+                for error in errors:
+                    print(f"    {error}")
+        else:
+            num_ok += 1
+            if args.verbose:
+                print(f"{file_name}: ok")
+    if executor is not None:
+        executor.shutdown()
+    if args.cache_dir is not None:
+        ArtifactCache(args.cache_dir, args.cache_size * 1024 * 1024).evict()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{len(files)} files: {num_ok} ok, {num_errors} with errors, {num_failed} failed")
+    if args.cache_dir is not None:
+        print(f"{num_cached} served from the cache")
+    print(f"{elapsed:.2f}s, {len(files) / elapsed:.1f} files/s, {total_bytes / 1e6 / elapsed:.2f} MB/s")
+    if args.profile is not None:
+        with open(args.profile, "w") as file:
+            json.dump({"wall": elapsed, "bytes": total_bytes, "total": total_profile.to_dict(), "files": file_profiles},
+                      file, indent=2)
+        print(f"Profile written to {args.profile}")
+    return 0 if num_errors == 0 and num_failed == 0 else 1
+
+def build_arg_parser():
+    arg_parser = argparse.ArgumentParser(description="Tokenize and parse files written in the JSON-like language. "
+                                                     "With no files, asks for one interactively.")
+    arg_parser.add_argument("files", nargs="*", help="input files or glob patterns, e.g. 'configs/**/*.txt'")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None,
+                            help="number of worker processes (default: one per CPU, 1 runs in this process)")
+    arg_parser.add_argument("-o", "--output-dir", default=None,
+                            help="write _token_stream and _parse_tree files here instead of next to each input "
+                                 "(inputs from different directories keep their relative paths under it)")
+    arg_parser.add_argument("--no-token-stream", action="store_true", help="do not write _token_stream files")
+    arg_parser.add_argument("--binary-tokens", action="store_true",
+                            help="write token streams in the binary format of tokenstream.py, as _token_stream.bin")
+    arg_parser.add_argument("--tree-index", action="store_true",
+                            help="also write a _tree_index for each input without errors, for lookups by path "
+                                 "with treeindex.py")
+    arg_parser.add_argument("--mmap", action="store_true",
+                            help="lex inputs from a memory map of their UTF-8 bytes, error positions become byte offsets")
+    arg_parser.add_argument("--validate", nargs="?", const="all", choices=["all", "first"], default=None,
+                            help="only check the inputs, without building parse trees or writing any outputs "
+                                 "(--validate first stops each file at its first error)")
+    arg_parser.add_argument("--stream", nargs="?", const="lines", choices=MODES, default=None,
+                            help="inputs hold many documents, one per line (or with --stream concatenated, one after "
+                                 "the other): each one is checked on its own and written to _documents as a line of JSON")
+    arg_parser.add_argument("--split", type=int, default=None, metavar="N",
+                            help="compile one file at a time, lexing and parsing each one on N worker processes "
+                                 "(for a few huge files rather than many small ones)")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help="reuse the outputs of unchanged inputs from this cache directory")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                            help="cache size bound in MB, least recently used entries are removed past it")
+    arg_parser.add_argument("--profile", default=None, metavar="FILE",
+                            help="write phase times, token, DFA and error recovery counts and peak memory "
+                                 "(per file and in total) to FILE as JSON")
+    arg_parser.add_argument("-v", "--verbose", action="store_true", help="list every file and its error messages")
+    return arg_parser
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.files:
+        return run_batch(args)
 
-def main():
     print("Welcome! Please check the readme for details about the language/grammar and input requirements")
     file_name = input("Please enter the name of the file you'd like to tokenize:")
     if os.path.isfile(file_name):
-        with open(file_name, 'r') as file:
-            input_file = file.read()
-            lexer = Lexer(input_file)
-            tokens = lexer.tokenize()
-        with open(f"{file_name}_token_stream", "w") as output_file:
-            print(f"Printing token stream to: {file_name}_token_stream")
-            for token in tokens:
-                print(token)
-                output_file.write(str(token))
-                if not token.type == "EOF":
-                    output_file.write("\n")
-        print("Token stream printed. Initializing Parser")
-        with open(f"{file_name}_token_stream", 'r') as parse_file:
-            token_stream = parse_file.read()
-            parser = Parser(token_stream)
-            outputs = parser.parse() #returns [parse tree, error_report]
-            
-            with open(f"{file_name}_parse_tree", "w") as output_file:
-                print(f"Printing parse tree for {file_name}")
-                for token in outputs[0]:
-                    print(token)
-                    output_file.write(token + "\n")
-                if len(outputs[1]) > 0:
-                    print("\n")
-                    for error in outputs[1]:
-                        print(error)
-                        output_file.write(error + "\n")
+        compile_file(file_name)
     else:
         print(f"File: {file_name} not found. Please recheck the name or file path")
-        
+    return 0
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
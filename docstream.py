@@ -0,0 +1,175 @@
+'''
+Streams of many documents in one file, such as logs of one record per line.
+
+iter_documents reads a text file a chunk at a time and yields a Document per document in it, each one lexed and
+parsed on its own: a document's errors are its own, and a bad document does not change how the ones after it
+are read. Memory does not grow with the number of documents, only with the size of the biggest one.
+
+There are two ways of telling where documents end:
+    lines           every line that is not blank is one document (newline-delimited records). A document
+                    cannot span lines, and an error never affects more than its own line.
+    concatenated    documents follow each other, with or without whitespace in between, and one ends where
+                    its brackets are balanced again (strings are stepped over), or at the end of a scalar.
+                    A stray closing bracket, comma or colon is a bad document of its own, but an unclosed
+                    bracket or string takes in the rest of the stream.
+'''
+import re
+from parser import ParseError, Parser, build_value
+from scanner import CHUNK_SIZE, Lexer, LexerError, TokenBuffer, TokenType
+
+MODES = ["lines", "concatenated"]
+OUTPUTS = ["values", "tree", "errors"]
+
+SPACE = re.compile(r"\s*")
+STRUCTURE = re.compile(r'("[^"]*")|(")|([\[{])|([\]}])') #a string, an unterminated string, an opening or closing bracket
+SCALAR = re.compile(r'[^\s\[\]{}",:]*')
+
+class Document:
+    '''
+    One document of a stream: its number (from 0), the line it starts on (from 1) and its character offset in
+    the stream, the error messages for it (positions in them are within the document), and depending on
+    the output, its parse tree as a list of lines or its value (None if it has errors).
+    '''
+    __slots__ = ("index", "line", "offset", "errors", "tree", "value")
+
+    def __init__(self, index, line, offset, errors, tree=None, value=None):
+        self.index = index
+        self.line = line
+        self.offset = offset
+        self.errors = errors
+        self.tree = tree
+        self.value = value
+
+def split_concatenated(text, final):
+    '''
+    Spans (start, end) of the documents that text starts with, and where the rest of text starts: a document
+    that may go on past the end of text is left for the next call, unless final (text is the end of the stream).
+    '''
+    spans = []
+    pos = 0
+    while True:
+        pos = SPACE.match(text, pos).end()
+        if pos == len(text):
+            return spans, pos
+        char = text[pos]
+        end = None
+        if char in ["{", "["]:
+            depth = 0
+            for match in STRUCTURE.finditer(text, pos):
+                if match.lastindex == 2:
+                    break
+                if match.lastindex == 3:
+                    depth += 1
+                elif match.lastindex == 4:
+                    depth -= 1
+                    if depth == 0:
+                        end = match.end()
+                        break
+        elif char == '"':
+            close = text.find('"', pos + 1)
+            end = None if close < 0 else close + 1
+        elif char in ["]", "}", ",", ":"]:
+            end = pos + 1
+        else:
+            end = SCALAR.match(text, pos).end()
+            if end == len(text) and not final:
+                end = None
+        if end is None:
+            if not final:
+                return spans, pos
+            end = len(text)
+        spans.append((pos, end))
+        pos = end
+
+def read_lines(file):
+    #(line number, offset, text) of each line that is not blank
+    offset = 0
+    for number, line in enumerate(file, 1):
+        if not line.isspace():
+            yield number, offset, line
+        offset += len(line)
+
+def read_concatenated(file, chunk_size=CHUNK_SIZE):
+    #(line number, offset, text) of each document, read chunk_size characters at a time
+    text = ""
+    base = 0 #offset of text[0] in the stream
+    line = 1 #line number of text[0]
+    read_size = chunk_size
+    final = False
+    while not final:
+        chunk = file.read(read_size)
+        final = not chunk
+        text += chunk
+        spans, rest = split_concatenated(text, final)
+        position = 0
+        for start, end in spans:
+            line += text.count("\n", position, start)
+            position = start
+            yield line, base + start, text[start:end]
+        #a document longer than a chunk is read in bigger and bigger chunks, so it is not split again for every one
+        read_size = chunk_size if spans else 2 * read_size
+        line += text.count("\n", position, rest)
+        base += rest
+        text = text[rest:]
+
+def lex_document(text, strings=None):
+    #TokenBuffer of a document's text and the LexerError that cut it short, if any, without printing it
+    lexer = Lexer(text + " ") #a number right at the end of the input is not lexed
+    tokens = TokenBuffer(lexer.input_text, strings)
+    while True:
+        try:
+            token_type, start, end = lexer.next_span()
+        except LexerError as e:
+            return tokens, e
+        tokens.append(token_type, start, end)
+        if token_type == TokenType.EOF:
+            return tokens, None
+
+def check_document(text, output, strings=None):
+    '''
+    Returns (errors, tree, value) for the text of one document. Without a tree, values are built straight from
+    the lexer, and only a document that does not build is run through the Parser, for the same messages as
+    compile_file. A document the Parser accepts but that has no value gets the error that stopped the build.
+    '''
+    build_error = None
+    if output in ["values", "errors"]: #a document that builds has no errors, which is much quicker to find out
+        try:
+            value = build_value(Lexer(text + " ", strings=strings))
+            return [], None, value if output == "values" else None
+        except (LexerError, ParseError) as e:
+            build_error = e
+    tokens, lexical_error = lex_document(text, strings)
+    errors = [] if lexical_error is None else [f"Lexical Error: {lexical_error}"]
+    parser = Parser(tokens)
+    tree = None
+    try:
+        if output == "tree":
+            tree = parser.parse()[0]
+            errors += parser.error_list
+        else:
+            errors += parser.validate()
+    except Exception as e: #the parser's error recovery does not get through every input
+        return errors + parser.error_list + [f"Parsing failed: {type(e).__name__}: {e}"], None, None
+    #the parser lets a few tokens after a whole value through, here they would be another document's
+    unread = len(tokens) - 1 - parser.token_pointer
+    if not errors and unread > 0:
+        errors.append(f"Reached end of parsing with {unread} unparsed tokens remaining")
+    #the parser takes any numeric character in a number, which has no value (such as ²)
+    #values and errors give it the same verdict, so --validate agrees with the values written without it
+    if not errors and isinstance(build_error, ParseError):
+        errors.append(f"Parsing Error: {build_error}")
+    return errors, tree, None
+
+def iter_documents(file, mode="lines", output="values", strings=None):
+    '''
+    Generate a Document for each document of a text file object. mode is one of MODES, and output is
+    "values" (as parser.loads builds them), "tree" (the parse tree lines, as Parser.parse returns them)
+    or "errors" (only the error messages, like Parser.validate). With a scanner.StringTable, the keys and
+    strings of all the documents are interned in it, so records that are kept share them.
+    '''
+    if mode not in MODES or output not in OUTPUTS:
+        raise ValueError(f"unknown mode {mode} or output {output}")
+    documents = read_lines(file) if mode == "lines" else read_concatenated(file)
+    for index, (line, offset, text) in enumerate(documents):
+        errors, tree, value = check_document(text, output, strings)
+        yield Document(index, line, offset, errors, tree, value)
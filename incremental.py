@@ -0,0 +1,274 @@
+'''
+Incremental lexing and parsing for editors that re-validate a document on every keystroke.
+
+A Document keeps the text, its tokens, the parse tree lines and the error list. Document.edit replaces
+a range of the text and updates all three: tokens are re-lexed from just before the edit until they line up
+with the old tokens again, and when the document was free of errors only the innermost list element or dict
+pair around the edit is parsed again and spliced into the tree. Anything else (errors before or after the
+edit, an edit that turns a scalar into a list or dict) falls back to parsing the whole token stream, so the
+results are always the same as lexing and parsing the new text from scratch.
+
+Token offsets and tree line numbers past the last edit are kept relative to the end of the text and tree,
+like the second half of a gap buffer, so an edit does not have to shift every token after it. The new text
+and the spliced arrays are still copied, but that copying is done in C.
+'''
+from array import array
+from bisect import bisect_left
+from parser import Parser
+from scanner import CHUNK_SIZE, KIND_CODES, TOKEN_KINDS, Lexer, LexerError, Token, TokenBuffer, TokenType
+
+RELEX_CHUNK = 256 #characters read at a time while re-lexing, an edit usually resynchronizes within a few tokens
+
+#parse tree labels that are not tokens, every other line of an error-free tree is one token
+STRUCTURE_LABELS = ["value", "list", "dict", "pair"]
+
+LBRACE, RBRACE = KIND_CODES[TokenType.LBRACE], KIND_CODES[TokenType.RBRACE]
+LBRACK, RBRACK = KIND_CODES[TokenType.LBRACK], KIND_CODES[TokenType.RBRACK]
+COMMA, COLON = KIND_CODES[TokenType.COMMA], KIND_CODES[TokenType.COLON]
+STRING, EOF = KIND_CODES[TokenType.STRING], KIND_CODES[TokenType.EOF]
+OPENERS = (LBRACE, LBRACK)
+CLOSERS = (RBRACE, RBRACK)
+
+#a copy of an array of offsets, each moved by delta
+def shifted(offsets, delta):
+    return offsets if delta == 0 else array(offsets.typecode, map(delta.__add__, offsets))
+
+class TextReader:
+    #file-like reader over a str from a given position, so a Lexer can rescan part of a document
+    def __init__(self, text, position):
+        self.text = text
+        self.position = position
+
+    def read(self, size=-1):
+        end = len(self.text) if size < 0 else self.position + size
+        chunk = self.text[self.position:end]
+        self.position += len(chunk)
+        return chunk
+
+class EditableTokens(TokenBuffer):
+    '''
+    TokenBuffer of a Document. The offsets of tokens from index gap on are stored relative to the end of
+    the source (so they are negative) and stay valid when an edit before them changes the length of the text.
+    Use start(i) and end(i) instead of reading starts and ends directly.
+    '''
+    def __init__(self, source):
+        super().__init__(source)
+        self.gap = 0
+
+    def start(self, index):
+        return self.starts[index] + len(self.source) if index >= self.gap else self.starts[index]
+
+    def end(self, index):
+        return self.ends[index] + len(self.source) if index >= self.gap else self.ends[index]
+
+    def lexeme(self, index):
+        return self.source[self.start(index):self.end(index)]
+
+    def __getitem__(self, index):
+        return Token.from_span(self.source, TOKEN_KINDS[self.kinds[index]], self.start(index), self.end(index))
+
+    #index of the first token that ends at or after position
+    def first_ending_at(self, position):
+        index = bisect_left(self.ends, position, 0, self.gap)
+        if index == self.gap:
+            index = bisect_left(self.ends, position - len(self.source), self.gap)
+        return index
+
+class Document:
+    def __init__(self, text):
+        self.text = text
+        self.tokens = EditableTokens(text)
+        self.lex_error = None #the LexerError that cut the token stream short, positions are in self.text
+        self.token_lines = None
+        for token_type, start, end in self.lex(0, CHUNK_SIZE):
+            self.tokens.append(token_type, start, end)
+        self.tokens.gap = len(self.tokens)
+        self.parse()
+
+    def lex(self, position, chunk_size=RELEX_CHUNK):
+        '''
+        Generate (token type, start, end) for the tokens of self.text from position, which must be
+        the start of the input or the end of a token. A lexical error is saved in self.lex_error.
+        '''
+        lexer = Lexer("", TextReader(self.text, position), chunk_size)
+        while True:
+            try:
+                token_type, start, end = lexer.next_span()
+            except LexerError as e:
+                self.lex_error = LexerError(position + e.pos, e.char)
+                return
+            yield token_type, position + lexer.offset + start, position + lexer.offset + end
+            if token_type == TokenType.EOF:
+                return
+
+    def move_gap(self, index):
+        '''
+        Move the gap to index: offsets (and tree line numbers) of tokens before it are absolute,
+        from it on they are relative to the end of the text (and tree). Costs the distance moved.
+        '''
+        tokens = self.tokens
+        low, high = sorted([index, tokens.gap])
+        sign = -1 if index < tokens.gap else 1
+        tokens.starts[low:high] = shifted(tokens.starts[low:high], sign * len(self.text))
+        tokens.ends[low:high] = shifted(tokens.ends[low:high], sign * len(self.text))
+        if self.token_lines is not None:
+            self.token_lines[low:high] = shifted(self.token_lines[low:high], sign * len(self.tree))
+        tokens.gap = index
+
+    #parse the whole token stream and, if it has no errors, record the tree line of every token
+    def parse(self):
+        self.token_lines = None
+        self.move_gap(len(self.tokens))
+        parser = Parser(self.tokens)
+        self.tree = parser.parse()[0]
+        self.errors = [] if self.lex_error is None else [f"Lexical Error: {self.lex_error}"]
+        self.errors += parser.error_list
+        #a single leftover token is not reported, the tree then has no line for it
+        if not self.errors and parser.current_token.token_type == "EOF":
+            token_lines = array("q", (number for number, line in enumerate(self.tree)
+                                      if line.lstrip(" ") not in STRUCTURE_LABELS))
+            if len(token_lines) == len(self.tokens) - 1: #every token but the EOF
+                self.token_lines = token_lines
+
+    def edit(self, start, end, new_text):
+        '''
+        Replace self.text[start:end] with new_text and return [tokens, tree, errors] for the new text,
+        the same as Lexer(text).tokenize_buffer() and Parser(tokens).parse() would give.
+        '''
+        tokens = self.tokens
+        old_error = self.lex_error
+        #tokens that end before start, and did not look ahead into the edit, are kept as they are
+        first = tokens.first_ending_at(start)
+        self.move_gap(first)
+        position = tokens.end(first - 1) if first > 0 else 0
+
+        self.text = self.text[:start] + new_text + self.text[end:]
+        tokens.source = self.text
+        delta = len(new_text) - (end - start)
+        self.lex_error = None
+
+        #re-lex until a token past the edit starts and ends where an old token did,
+        #old tokens are after the gap so their offsets already hold for the new text
+        length = len(self.text)
+        relexed = TokenBuffer(self.text)
+        resync = len(tokens)
+        edit_end = start + len(new_text)
+        for token_type, token_start, token_end in self.lex(position):
+            if token_start >= edit_end:
+                old = bisect_left(tokens.starts, token_start - length, first)
+                if (old < len(tokens) and tokens.starts[old] == token_start - length
+                        and tokens.ends[old] == token_end - length and tokens.kinds[old] == KIND_CODES[token_type]):
+                    resync = old
+                    break
+            relexed.append(token_type, token_start, token_end)
+
+        #an old lexical error comes after every old token, it is kept with the tail of the old tokens
+        if resync < len(tokens) and old_error is not None:
+            self.lex_error = LexerError(old_error.pos + delta, old_error.char)
+
+        changed = tokens.kinds[first:resync]
+        tokens.kinds[first:resync] = relexed.kinds
+        tokens.starts[first:resync] = shifted(relexed.starts, -length)
+        tokens.ends[first:resync] = shifted(relexed.ends, -length)
+
+        if not (self.token_lines is not None and self.lex_error is None
+                and self.reparse_element(changed, first, resync, first + len(relexed))):
+            self.parse()
+        return [self.tokens, self.tree, self.errors]
+
+    #tree line of a token, the tree still has the lines it had before the edit
+    def line_of(self, index):
+        return self.token_lines[index] + len(self.tree) if index >= self.tokens.gap else self.token_lines[index]
+
+    def reparse_element(self, changed, first, old_stop, new_stop):
+        '''
+        Parse only the innermost list element or dict pair around the tokens that changed: old tokens
+        [first, old_stop), with kinds changed, became new tokens [first, new_stop). Splice its lines into the tree.
+        Returns False if that is not enough to get the tree a full parse would give.
+        '''
+        if old_stop == first and new_stop == first:
+            return True #only whitespace changed, the tokens are the same
+        kinds = self.tokens.kinds
+        shift = new_stop - old_stop
+
+        def old_kind(index):
+            if index < first:
+                return kinds[index]
+            return changed[index - first] if index < old_stop else kinds[index + shift]
+
+        #the old tokens that changed must sit inside one element
+        depth = 0
+        for kind in changed:
+            if kind in OPENERS:
+                depth += 1
+            elif kind in CLOSERS:
+                depth -= 1
+                if depth < 0:
+                    return False
+            elif kind == COMMA and depth == 0:
+                return False
+        if depth != 0:
+            return False
+
+        #walk out to the separators around the element, skipping over nested lists and dicts
+        left = first - 1
+        depth = 0
+        while left >= 0:
+            kind = kinds[left]
+            if kind in CLOSERS:
+                depth += 1
+            elif kind in OPENERS:
+                if depth == 0:
+                    break
+                depth -= 1
+            elif kind == COMMA and depth == 0:
+                break
+            left -= 1
+        if left < 0:
+            return False #the edit is in the top-level value itself
+        right = new_stop
+        depth = 0
+        while True:
+            kind = kinds[right]
+            if kind in OPENERS:
+                depth += 1
+            elif kind in CLOSERS:
+                if depth == 0:
+                    break
+                depth -= 1
+            elif (kind == COMMA and depth == 0) or kind == EOF:
+                break
+            right += 1
+        old_right = right - shift
+        if kinds[right] == EOF or old_right <= left + 1 or right <= left + 1:
+            return False
+
+        #a list or dict element leaves the indentation 2 deeper than a scalar one, it has to stay the same
+        is_pair = old_kind(left + 1) == STRING and old_kind(left + 2) == COLON
+        if (old_kind(old_right - 1) in CLOSERS) != (kinds[right - 1] in CLOSERS):
+            return False
+        if is_pair != (kinds[left + 1] == STRING and right > left + 2 and kinds[left + 2] == COLON):
+            return False
+
+        element = [self.tokens[index] for index in range(left + 1, right)]
+        if is_pair: #parse the pair inside a dict of its own, then drop the dict's lines
+            element = [Token(TokenType.LBRACE)] + element + [Token(TokenType.RBRACE)]
+        parser = Parser(element)
+        lines = parser.parse()[0]
+        if parser.error_list or parser.current_token.token_type != "EOF": #a single leftover token is not reported
+            return False
+
+        #an element's first line is the "value" or "pair" label before its first token
+        first_line = self.line_of(left + 1) - (2 if old_kind(left + 1) in OPENERS else 1)
+        last_line = self.line_of(old_right - 1)
+        indentation = len(self.tree[first_line]) - len(self.tree[first_line].lstrip(" "))
+        if is_pair:
+            lines = [line[4:] for line in lines[3:-1]]
+        lines = [" " * indentation + line for line in lines]
+
+        self.move_gap(left + 1)
+        self.tree[first_line:last_line + 1] = lines
+        self.token_lines[left + 1:old_right] = array("q", (first_line + number - len(self.tree)
+                                                           for number, line in enumerate(lines)
+                                                           if line.lstrip(" ") not in STRUCTURE_LABELS))
+        return True
@@ -0,0 +1,232 @@
+'''
+On-demand extraction of a few values from a document, without lexing or parsing the rest of it.
+
+extract walks the text from the root along the requested paths only. Keys on the way are read, but the
+values of other keys and list elements are skipped whole: strings with str.find for the closing quote,
+dicts and lists by counting brackets with a regex that steps over strings, so no tokens are produced for
+them. Runs of list elements or dict pairs with scalar values are stepped over BLOCK at a time by a single
+regex match (a block of pairs only when none of the wanted keys is in it). Only the values at the requested
+paths go through the Lexer and are built as Python values.
+Once every path has been found the rest of the document is not looked at.
+
+As a consequence, skipped values are only checked for balanced brackets and closed strings, and with
+duplicate keys the first one wins (parser.loads keeps the last).
+'''
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+from parser import ParseError, build_value
+from scanner import Lexer
+from treeindex import split_path
+
+PATHS = object() #trie entry holding the paths that end at a trie node
+
+BLOCK = 16 #list elements or dict pairs skipped at once
+
+#whitespace, the strings and brackets that skip_rest counts, a scalar other than a string, the key of a pair,
+#and BLOCK list elements or dict pairs with scalar values, each with its comma
+SPACE = r"\s*"
+STRUCTURE = r'("[^"]*"?)|([\[{])|([\]}])'
+SCALAR = r'[^\s,:\[\]{}"]+'
+PAIR = r'\s*"([^"]*)"\s*:'
+FLAT_ELEMENTS = r'(?:\s*(?:"[^"]*"|[^\s,:\[\]{}"]+)\s*,){%d}' % BLOCK
+FLAT_PAIRS = r'(?:\s*"[^"]*"\s*:\s*(?:"[^"]*"|[^\s,:\[\]{}"]+)\s*,){%d}' % BLOCK
+
+#the patterns for text, and for bytes (a memory-mapped source)
+PATTERNS = {
+    str: [re.compile(pattern) for pattern in [SPACE, STRUCTURE, SCALAR, PAIR, FLAT_ELEMENTS, FLAT_PAIRS]],
+    bytes: [re.compile(pattern.encode()) for pattern in [SPACE, STRUCTURE, SCALAR, PAIR, FLAT_ELEMENTS, FLAT_PAIRS]],
+}
+
+class ExtractionDone(Exception):
+    #raised once every path has been found, to stop the walk
+    pass
+
+class Extractor:
+    def __init__(self, source, paths):
+        self.source = source
+        text_mode = isinstance(source, str)
+        self.space, self.structure, self.scalar, self.pair, self.flat_elements, self.flat_pairs = \
+            PATTERNS[str if text_mode else bytes]
+        self.quote = '"' if text_mode else b'"'
+        self.blank = " " if text_mode else b" "
+        self.decode = str if text_mode else lambda key: str(key, "utf-8")
+        self.found = {}
+        self.remaining = len(set(paths))
+        #trie of the paths: ("key", str) and ("index", int) steps, PATHS for the paths ending at a node
+        self.trie = {}
+        for path in paths:
+            nodes = [self.trie]
+            for step in split_path(path):
+                next_nodes = []
+                for node in nodes:
+                    next_nodes.append(node.setdefault(("key", str(step)), {}))
+                    if step.isdigit(): #a step of digits is an index if the value turns out to be a list
+                        next_nodes.append(node.setdefault(("index", int(step)), {}))
+                nodes = next_nodes
+            for node in nodes:
+                node.setdefault(PATHS, set()).add(path)
+
+    #the character at pos as a str, "EOF" past the end
+    def char(self, pos):
+        char = self.source[pos:pos + 1]
+        if not char:
+            return "EOF"
+        return char if isinstance(char, str) else chr(char[0])
+
+    def skip_space(self, pos):
+        return self.space.match(self.source, pos).end()
+
+    def expect(self, pos, chars):
+        char = self.char(pos)
+        if char not in chars:
+            raise ParseError(pos, char, " or ".join(chars))
+        return char
+
+    def skip_value(self, pos):
+        #end of the value starting at pos, which is only read as far as telling where it ends
+        char = self.char(pos)
+        if char == '"':
+            end = self.source.find(self.quote, pos + 1)
+            if end < 0:
+                raise ParseError(len(self.source), "EOF", '"')
+            return end + 1
+        if char in ["{", "["]:
+            return self.skip_rest(pos + 1)
+        scalar = self.scalar.match(self.source, pos)
+        if scalar is None:
+            raise ParseError(pos, char, "value")
+        return scalar.end()
+
+    def skip_rest(self, pos, depth=1):
+        #end of the dict or list that is depth levels deep at pos, counting brackets outside of strings
+        for match in self.structure.finditer(self.source, pos):
+            if match.lastindex == 2:
+                depth += 1
+            elif match.lastindex == 3:
+                depth -= 1
+                if depth == 0:
+                    return match.end()
+        raise ParseError(len(self.source), "EOF", "] or }")
+
+    def visit(self, pos, node):
+        '''
+        Find the paths of a trie node in the value at pos (after any whitespace). Returns the end of the value.
+        '''
+        pos = self.skip_space(pos)
+        if PATHS in node:
+            end = self.skip_value(pos)
+            lexer = Lexer(self.source[pos:end] + self.blank) #a float right at the end of the input is not lexed
+            lexer.offset = pos
+            value = build_value(lexer)
+            for path in node.pop(PATHS):
+                if path not in self.found:
+                    self.found[path] = value
+                    self.remaining -= 1
+            if self.remaining == 0:
+                raise ExtractionDone()
+            if not node: #nothing wanted under it, which is the usual case
+                return end
+        char = self.char(pos)
+        if char not in ["{", "["] or not node:
+            return self.skip_value(pos)
+        if char == "{":
+            return self.visit_dict(pos + 1, node)
+        return self.visit_list(pos + 1, node)
+
+    def visit_dict(self, pos, node):
+        #pos is just past the {, returns the end of the dict
+        wanted = {step[1]: step for step in node if step is not PATHS and step[0] == "key"}
+        literals = [self.quoted(key) for key in wanted] #the wanted keys with their quotes, as they are in the source
+        while wanted:
+            #a block of pairs with scalar values is skipped at once when none of the wanted keys is in it
+            block = self.flat_pairs.match(self.source, pos)
+            if block is not None and all(self.source.find(literal, pos, block.end()) < 0 for literal in literals):
+                pos = block.end()
+                continue
+            pair = self.pair.match(self.source, pos)
+            if pair is None:
+                pos = self.skip_space(pos)
+                self.expect(pos, ['"'])
+                end = self.source.find(self.quote, pos + 1)
+                raise ParseError(len(self.source), "EOF", '"') if end < 0 else ParseError(end + 1, self.char(end + 1), ":")
+            key = self.decode(pair.group(1))
+            if key in wanted: #popped, so a duplicate key is skipped
+                del wanted[key]
+                literals = [self.quoted(key) for key in wanted]
+                pos = self.visit(pair.end(), node.pop(("key", key)))
+            else:
+                pos = self.skip_value(self.skip_space(pair.end()))
+            pos = self.skip_space(pos)
+            if self.expect(pos, [",", "}"]) == "}":
+                return pos + 1
+            pos += 1
+        return self.skip_rest(pos) #nothing else wanted in this dict
+
+    def visit_list(self, pos, node):
+        #pos is just past the [, returns the end of the list
+        wanted = sorted(step[1] for step in node if step is not PATHS and step[0] == "index")
+        index = 0
+        while wanted:
+            if wanted[0] - index >= BLOCK:
+                block = self.flat_elements.match(self.source, pos)
+                if block is not None:
+                    pos = block.end()
+                    index += BLOCK
+                    continue
+            pos = self.skip_space(pos)
+            if index == wanted[0]:
+                del wanted[0]
+                pos = self.visit(pos, node.pop(("index", index)))
+            else:
+                pos = self.skip_value(pos)
+            index += 1
+            pos = self.skip_space(pos)
+            if self.expect(pos, [",", "]"]) == "]":
+                return pos + 1
+            pos += 1
+        return self.skip_rest(pos) #nothing else wanted in this list
+
+    #a key with its quotes, as str or bytes like the source
+    def quoted(self, key):
+        literal = f'"{key}"'
+        return literal if isinstance(self.quote, str) else literal.encode("utf-8")
+
+def extract(source, paths):
+    '''
+    Values at paths in a document, as a dict from path to value. Paths are written as for treeindex lookups
+    (e.g. grades."2134" or courses.0), and paths that are not in the document are left out of the dict.
+    The source is the document's text, or its UTF-8 bytes (such as a memory map of the file), positions in
+    errors are then byte offsets. Raises ParseError (or LexerError) for errors on the way to the values.
+    '''
+    extractor = Extractor(source, paths)
+    if extractor.remaining:
+        try:
+            extractor.visit(0, extractor.trie)
+        except ExtractionDone:
+            pass
+    return extractor.found
+
+#same as extract, for a file name, the file is read from a memory map
+def extract_file(file_name, paths):
+    with open(file_name, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0: #an empty file cannot be mapped
+            return extract(b"", paths)
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return extract(mapped, paths)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Print the values at a few paths of a document, without parsing the rest.")
+    arg_parser.add_argument("file", help="input file")
+    arg_parser.add_argument("paths", nargs="+", help='paths to print, e.g. grades."2134" or courses.0')
+    args = arg_parser.parse_args(argv)
+    found = extract_file(args.file, args.paths)
+    for path in args.paths:
+        print(f"{path}: {json.dumps(found[path])}" if path in found else f"{path}: not found")
+    return 0 if len(found) == len(set(args.paths)) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
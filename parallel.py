@@ -0,0 +1,283 @@
+'''
+Lexing and parsing of a single large document on a process pool, with the same outputs as the sequential path.
+
+Lexing: the file is cut into chunks, and a first pass counts the quotes in each chunk. There are no escapes,
+so a chunk starts inside a string exactly when an odd number of quotes come before it. From there each chunk
+has a sync point, the first place a token must start: after the closing quote if it starts inside a string,
+else the first { } [ ] : , or quote. Every region between two sync points is then lexed on its own, with the
+character after it as lookahead, and the token runs are joined in order up to the first lexical error.
+
+Parsing: a document that is a list or dict is split at its top-level commas into groups of elements. Each
+group is parsed as a list (or dict) of its own, and the lines of its tree are shifted to the indentation the
+group has in the whole tree. If any group has an error the whole token stream is parsed again sequentially,
+since error recovery is not local, so errors always come from the sequential parser.
+'''
+import codecs
+import io
+import locale
+import mmap
+import os
+import re
+from array import array
+from parser import Parser
+from scanner import KIND_CODES, WHITESPACE, Lexer, LexerError, Token, TokenBuffer, TokenType
+
+SPLIT_CHUNK = 1 << 22 #bytes per lexing chunk
+SYNC = re.compile(rb'[{}\[\]:,"]') #characters that always start a token outside of strings
+GROUPS_PER_WORKER = 4 #parse groups handed to each worker, so uneven groups still balance
+
+LBRACE, RBRACE = KIND_CODES[TokenType.LBRACE], KIND_CODES[TokenType.RBRACE]
+LBRACK, RBRACK = KIND_CODES[TokenType.LBRACK], KIND_CODES[TokenType.RBRACK]
+COMMA, EOF = KIND_CODES[TokenType.COMMA], KIND_CODES[TokenType.EOF]
+OPENERS = (LBRACE, LBRACK)
+CLOSERS = (RBRACE, RBRACK)
+
+#decode bytes the way open(file, "r") reads them: UTF-8 with universal newlines
+def decode_text(data, errors="strict"):
+    return data.decode("utf-8", errors).replace("\r\n", "\n").replace("\r", "\n")
+
+#number of characters data decodes to, in text mode or as bytes
+def count_chars(data, text_mode):
+    if not text_mode or (data.isascii() and b"\r" not in data):
+        return len(data)
+    return len(decode_text(data))
+
+def read_range(file_name, start, stop):
+    with open(file_name, "rb") as file:
+        file.seek(start)
+        return file.read(stop - start)
+
+#chunk boundaries, moved forward so no UTF-8 character or \r\n pair is cut in two
+def chunk_bounds(file_name, size, chunk_size):
+    bounds = [0]
+    with open(file_name, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        bound = chunk_size
+        while bound < size:
+            while bound < size and (0x80 <= mapped[bound] < 0xC0 or mapped[bound - 1:bound + 1] == b"\r\n"):
+                bound += 1
+            if bound < size:
+                bounds.append(bound)
+            bound += chunk_size
+        if size:
+            mapped.close()
+    bounds.append(size)
+    return bounds
+
+def scan_chunk(job):
+    '''
+    First pass over one chunk, runs in a worker. Returns [quotes, characters, sync if the chunk starts outside
+    a string, characters before it, sync if it starts inside a string, characters before it]. A sync is
+    None when the chunk has none, then its region carries on from the chunk before.
+    '''
+    file_name, start, stop, text_mode = job
+    data = read_range(file_name, start, stop)
+    outside = SYNC.search(data)
+    outside = outside.start() if outside is not None else None
+    inside = data.find(b'"') + 1
+    inside = inside if 0 < inside < len(data) else None
+    return [data.count(b'"'), count_chars(data, text_mode),
+            None if outside is None else start + outside,
+            None if outside is None else count_chars(data[:outside], text_mode),
+            None if inside is None else start + inside,
+            None if inside is None else count_chars(data[:inside], text_mode)]
+
+def lex_region(job):
+    '''
+    Lex the region of the file between two sync points, runs in a worker. The character at the next sync point
+    is read too, as lookahead for the region's last token. Returns [kinds, starts, ends, lexical error as
+    (position, character) or None, token stream text, depth change over the region, and the commas at depth 1
+    or less with their depths], with depths relative to the start of the region.
+    '''
+    file_name, start, stop, char_base, text_mode, is_last, write_tokens = job
+    #4 bytes always hold the whole first character after the region
+    data = read_range(file_name, start, stop + 4)
+    region = data[:stop - start]
+    if text_mode:
+        region = decode_text(region)
+        text = region if is_last else region + decode_text(data[stop - start:], "replace")[:1]
+    else:
+        text = data
+    length = len(region)
+    lexer = Lexer(text)
+    kinds, starts, ends = array("B"), array("q"), array("q")
+    commas, comma_depths = array("q"), array("q")
+    token_stream = []
+    error = None
+    depth = 0
+    while True:
+        token_end = ends[-1] - char_base if ends else 0
+        try:
+            token_type, token_start, token_end = lexer.scan()
+        except LexerError as e:
+            #an error in a token that starts past the region is left to the next region
+            if is_last or lexer.char_classes.count(WHITESPACE, token_end, length) < length - token_end:
+                error = (char_base + e.pos, e.char)
+            break
+        if token_start >= length and not is_last:
+            break
+        kind = KIND_CODES[token_type]
+        kinds.append(kind)
+        starts.append(char_base + token_start)
+        ends.append(char_base + token_end)
+        if write_tokens:
+            token_stream.append(str(Token.from_span(text, token_type, token_start, token_end)))
+        if kind in OPENERS:
+            depth += 1
+        elif kind in CLOSERS:
+            depth -= 1
+        elif kind == COMMA and depth <= 1:
+            commas.append(len(kinds) - 1)
+            comma_depths.append(depth)
+        elif kind == EOF:
+            break
+    #every token is followed by a newline in the token stream file, except EOF
+    token_stream = "\n".join(token_stream) + ("\n" if token_stream and kinds[-1] != EOF else "")
+    return [kinds, starts, ends, error, token_stream, depth, commas, comma_depths]
+
+class SplitTokens:
+    #result of lex_split: the tokens of the whole file, the lexical error that ended them, and the top-level commas
+    def __init__(self, tokens, error, commas):
+        self.tokens = tokens
+        self.error = error
+        self.commas = commas
+
+    #release the memory map the tokens' source is, with use_mmap
+    def close(self):
+        if isinstance(self.tokens.source, mmap.mmap):
+            self.tokens.source.close()
+
+def lex_split(file_name, executor, use_mmap=False, token_stream_file=None, chunk_size=SPLIT_CHUNK):
+    '''
+    Lex file_name on the executor's processes, writing the token stream to token_stream_file if given.
+    Returns a SplitTokens the same as Lexer.from_file (or from_mmap) and tokenize_buffer would give,
+    or None in text mode when the default encoding is not UTF-8 and the chunks could not be decoded alone.
+    '''
+    text_mode = not use_mmap
+    if text_mode and codecs.lookup(locale.getpreferredencoding(False)).name != "utf-8":
+        return None
+    size = os.path.getsize(file_name)
+    bounds = chunk_bounds(file_name, size, chunk_size)
+    chunks = list(executor.map(scan_chunk, [(file_name, bounds[i], bounds[i + 1], text_mode)
+                                            for i in range(len(bounds) - 1)]))
+
+    #pick each chunk's sync point from the quote parity before it
+    regions = [[0, 0]] #[sync point, characters before it]
+    inside = False
+    chars = 0
+    for index, (quotes, count, outside_sync, outside_chars, inside_sync, inside_chars) in enumerate(chunks):
+        sync, before = (inside_sync, inside_chars) if inside else (outside_sync, outside_chars)
+        if index > 0 and sync is not None:
+            regions.append([sync, chars + before])
+        inside = inside != (quotes % 2 == 1)
+        chars += count
+    jobs = [(file_name, regions[i][0], regions[i + 1][0] if i + 1 < len(regions) else size, regions[i][1], text_mode,
+             i + 1 == len(regions), token_stream_file is not None) for i in range(len(regions))]
+
+    if use_mmap:
+        with open(file_name, "rb") as file:
+            source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+    else:
+        with open(file_name, "r") as file:
+            source = file.read()
+    tokens = TokenBuffer(source)
+    error = None
+    commas = array("q")
+    depth = 0
+    for kinds, starts, ends, region_error, token_stream, change, region_commas, comma_depths in executor.map(lex_region, jobs):
+        #top-level commas are at depth 1, inside the document's outer list or dict
+        for comma, comma_depth in zip(region_commas, comma_depths):
+            if depth + comma_depth == 1:
+                commas.append(len(tokens) + comma)
+        tokens.kinds.extend(kinds)
+        tokens.starts.extend(starts)
+        tokens.ends.extend(ends)
+        depth += change
+        if token_stream_file is not None:
+            token_stream_file.write(token_stream)
+        if region_error is not None:
+            error = LexerError(*region_error)
+            print(f"Lexical Error: {error}")
+            break
+    return SplitTokens(tokens, error, commas)
+
+def parse_group(job):
+    '''
+    Parse a group of top-level elements as a list (or dict) of their own, runs in a worker.
+    Returns the group's tree lines, indented for their place in the whole tree, or None if it has an error
+    (or the parser fails on it).
+    '''
+    source, kinds, starts, ends, opener, indentation = job
+    closer = RBRACK if opener == LBRACK else RBRACE
+    brackets = "[]" if opener == LBRACK else "{}"
+    if not isinstance(source, str):
+        brackets = brackets.encode()
+    wrapped = brackets[:1] + source + brackets[1:]
+    base = starts[0] - 1
+    tokens = TokenBuffer(wrapped)
+    tokens.kinds = array("B", [opener]) + kinds + array("B", [closer, EOF])
+    tokens.starts = array("q", [0]) + array("q", map((-base).__add__, starts)) + array("q", [len(wrapped) - 1, len(wrapped)])
+    tokens.ends = array("q", [1]) + array("q", map((-base).__add__, ends)) + array("q", [len(wrapped), len(wrapped)])
+
+    writer = io.StringIO()
+    parser = Parser(tokens, tree_writer=writer)
+    #the wrapper's first element is at indentation 4, shift the whole group to where it sits in the document
+    parser.tokens_eaten.renderer.indentation = indentation - 4
+    try:
+        parser.parse()
+    except Exception: #error recovery does not get through every group, the sequential parse decides what happens
+        return None
+    if parser.error_list or parser.current_token.token_type != "EOF": #a single leftover token is not reported
+        return None
+    tree = writer.getvalue()
+    #drop the wrapper's value, list/dict and opening lines, and its closing line
+    start = 0
+    for _ in range(3):
+        start = tree.index("\n", start) + 1
+    return tree[start:tree.rindex("\n", 0, len(tree) - 1) + 1]
+
+def parse_split(split, executor, workers, writer):
+    '''
+    Write the parse tree of an error-free list or dict document to writer, parsing groups of its top-level
+    elements on the executor's processes. Returns False, after writing only part of the tree, if the
+    document has a lexical error, is not a list or dict with a few top-level elements, or any group has
+    an error; the caller then parses it sequentially.
+    '''
+    tokens = split.tokens
+    kinds = tokens.kinds
+    if split.error is not None or len(kinds) < 3 or kinds[0] not in OPENERS or len(split.commas) < 2 * workers:
+        return False
+    last = len(kinds) - 2 #the closer of the outer list or dict
+    if kinds[-1] != EOF or kinds[last] != (RBRACK if kinds[0] == LBRACK else RBRACE):
+        return False
+
+    #elements end at the top-level commas, group them by token count
+    target = max(1, len(kinds) // (workers * GROUPS_PER_WORKER))
+    jobs = []
+    indentation = 4
+    group_start = element_start = 1
+    containers = 0
+    for separator in list(split.commas) + [last]:
+        if separator == element_start:
+            return False #an empty element, which is a syntax error
+        element_start = separator + 1
+        containers += kinds[separator - 1] in CLOSERS #a list or dict element moves the indentation 2 deeper
+        if separator - group_start >= target or separator == last:
+            source = tokens.source[tokens.starts[group_start]:tokens.ends[separator - 1]]
+            jobs.append((source, kinds[group_start:separator], tokens.starts[group_start:separator],
+                         tokens.ends[group_start:separator], kinds[0], indentation))
+            indentation += 2 * containers
+            containers = 0
+            jobs[-1] += (indentation,)
+            group_start = element_start
+
+    name = "list" if kinds[0] == LBRACK else "dict"
+    writer.write(f"value\n  {name}\n    {'[' if kinds[0] == LBRACK else '{'}\n")
+    for job, tree in zip(jobs, executor.map(parse_group, [job[:6] for job in jobs])):
+        if tree is None:
+            return False
+        writer.write(tree)
+        if job is not jobs[-1]:
+            writer.write(" " * job[6] + ",\n") #the comma after a group is at the indentation its last element left
+    writer.write(f"    {']' if kinds[0] == LBRACK else '}'}\n")
+    return True
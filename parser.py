@@ -1,8 +1,58 @@
+import io
+import re
+from array import array
+from collections import deque
+from scanner import TOKEN_KINDS, Lexer, LexerError, Token as ScannerToken, TokenBuffer, TokenType
+
+try:
+    import numpy
+except ImportError: #numeric arrays are array.array without it
+    numpy = None
+
+#grammar symbol the parser uses for each scanner.TokenType
+GRAMMAR_SYMBOLS = {
+    TokenType.LBRACE: "{",
+    TokenType.RBRACE: "}",
+    TokenType.LBRACK: "[",
+    TokenType.RBRACK: "]",
+    TokenType.COLON: ":",
+    TokenType.COMMA: ",",
+    TokenType.INTEGER: "NUMBER",
+    TokenType.FLOAT: "NUMBER",
+    TokenType.STRING: "STRING",
+    TokenType.TRUE: "true",
+    TokenType.FALSE: "false",
+    TokenType.NULL: "null",
+    TokenType.EOF: "EOF",
+}
+
+#grammar symbol for each TokenBuffer kind code
+KIND_SYMBOLS = [GRAMMAR_SYMBOLS[token_type] for token_type in TOKEN_KINDS]
+#and a kind code for each grammar symbol (one of the two for NUMBER), for token lists
+SYMBOL_CODES = {symbol: code for code, symbol in enumerate(KIND_SYMBOLS)}
+
 class Token:
+    __slots__ = ("token_type", "token_value")
+
     def __init__(self, token_string):
         self.token_type = self.get_token_type(token_string)
         self.token_value = self.get_token_value(token_string)
     
+    #build a parser token straight from a scanner.Token, without going through its string representation
+    @classmethod
+    def from_lexer_token(cls, lexer_token):
+        token = cls.__new__(cls)
+        token.token_type = GRAMMAR_SYMBOLS[lexer_token.type]
+        token.token_value = None if lexer_token.value is None else str(lexer_token.value)
+        return token
+    
+    @classmethod
+    def from_buffer(cls, buffer, index):
+        token = cls.__new__(cls)
+        token.token_type = KIND_SYMBOLS[buffer.kinds[index]]
+        token.token_value = buffer.lexeme(index) if token.token_type in ("NUMBER", "STRING") else None
+        return token
+    
     def __repr__(self):
         return self.token_type + " " + self.token_value if self.token_value else self.token_type
         
@@ -39,25 +89,504 @@ class Token:
         if token == "<EOF>":
             return "EOF"
 
+class BufferedTokens:
+    '''
+    Read-only view of a scanner.TokenBuffer as parser Tokens, each one is built when the parser reaches it.
+    A buffer cut short by a lexical error gets an EOF at the end, same as a token list.
+    '''
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.length = len(buffer)
+        if self.length == 0 or buffer.kind(self.length - 1) != TokenType.EOF:
+            self.length += 1
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index >= len(self.buffer):
+            return Token("<EOF>")
+        return Token.from_buffer(self.buffer, index)
+
+    #kind code of every token as bytes, the EOF added at the end included
+    def kind_codes(self):
+        codes = self.buffer.kinds.tobytes()
+        return codes if self.length == len(codes) else codes + bytes([SYMBOL_CODES["EOF"]])
+
+class TreeRenderer:
+    '''
+    Turns tokens_eaten labels into indented parse tree lines, one label at a time.
+        Indentation pseudocode:
+        if value | list | dict | pair -> increase indentation after printing
+        if  , or : -> print without changing indentation
+        if String/Number/true/false/null ->  print then reduce indentation
+        for nested brackets and braces:
+          everytime you see a { or [, save the indentation for it to a stack
+          then when you see a } or ], pop from the stack to get the corresponding indentation
+    '''
+    def __init__(self):
+        self.indentation = 0
+        self.indentation_stack = [] #when we see a { or [, push the current indentation level to the stack
+                                    #when we see a } or ], pop the current indentation level
+
+    #return the line for a label, or None for labels that are not printed (EOF)
+    def render(self, token):
+        if token in ["value", "list", "dict", "pair"]:
+            line = " " * self.indentation + token
+            self.indentation += 2
+            return line
+        if token in ["{", "["]:
+            self.indentation_stack.append(self.indentation)
+            return " " * self.indentation + token
+        if token in [":", ","]:
+            return " " * self.indentation + token
+        if token[0:6] == "STRING" or token[0:6] == "NUMBER" or token == "true" or token == "null" or token == "false":
+            line = " " * self.indentation + token
+            self.indentation -= 2
+            return line
+        if token in ["}","]"]:
+            self.indentation = self.indentation_stack.pop()
+            line = " " * self.indentation + token
+            self.indentation -= 2
+            return line
+        return None
+
+NO_NODE = -1
+
+class LabelTail:
+    '''
+    Stands in for the tokens_eaten list when no parse tree is kept (Parser.validate): labels are only counted.
+    The last two labels and a few counts are kept, which is all the parser reads back from tokens_eaten.
+    The parser opens a node for each grammar rule it starts and adds one for each token it eats, every one
+    of them is a label here, and the labels of eaten tokens are only their grammar symbols.
+    '''
+    def __init__(self):
+        self.last_label = None #the two most recent labels, None before there are any
+        self.label_before = None
+        self.count = 0
+        self.eof_count = 0
+
+    def append(self, token):
+        self.label_before = self.last_label
+        self.last_label = token
+        self.count += 1
+        if token == "EOF":
+            self.eof_count += 1
+
+    #a grammar rule starts: value, list, dict or pair
+    def open(self, symbol):
+        self.append(symbol)
+
+    #a token's grammar symbol, with its value for STRING and NUMBER, and its index in the token stream
+    #(NO_NODE for the labels error recovery inserts)
+    def add(self, symbol, value=None, index=NO_NODE):
+        self.append(symbol)
+
+    #rules opened and not closed yet, to close the ones opened after it with close(mark)
+    def mark(self):
+        return 0
+
+    def close(self, mark):
+        pass
+
+    #only ever used to drop a trailing EOF, which was never written
+    def pop(self):
+        token = self.last_label
+        if token is None:
+            raise IndexError("pop from empty list")
+        self.last_label = self.label_before
+        self.label_before = None
+        self.count -= 1
+        if token == "EOF":
+            self.eof_count -= 1
+        return token
+
+    def __getitem__(self, index):
+        if index != -1:
+            raise IndexError("only the last label is kept")
+        if self.last_label is None:
+            raise IndexError("list index out of range")
+        return self.last_label
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, token):
+        if token == "EOF":
+            return self.eof_count > 0
+        return token is not None and token in [self.last_label, self.label_before]
+
+class TreeEmitter(LabelTail):
+    '''
+    Stands in for the tokens_eaten list when the parse tree is streamed: every appended label is rendered
+    and written to the writer straight away, so memory does not grow with the tree.
+    '''
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+        self.renderer = TreeRenderer()
+
+    def append(self, token):
+        line = self.renderer.render(token)
+        if line is not None:
+            self.writer.write(line + "\n")
+        #same as LabelTail.append, inlined since this runs once per label
+        self.label_before = self.last_label
+        self.last_label = token
+        self.count += 1
+        if token == "EOF":
+            self.eof_count += 1
+
+    def add(self, symbol, value=None, index=NO_NODE):
+        self.append(symbol if value is None else symbol + ": " + value)
+
+#node kinds of a ParseTree, the labels other than STRING and NUMBER ones are their own text
+NODE_LABELS = ["value", "list", "dict", "pair", "{", "[", ":", ",", "}", "]", "true", "false", "null", "STRING", "NUMBER"]
+NODE_CODES = {label: kind for kind, label in enumerate(NODE_LABELS)}
+TEXT_KINDS = NODE_CODES["STRING"] #kinds from here on are labelled with their token's value
+CLOSER_RULES = {"}": NODE_CODES["dict"], "]": NODE_CODES["list"]}
+
+class Indent:
+    #how a label moves TreeRenderer's indentation
+    OPEN = 0 #value, list, dict, pair: indented one more level after it
+    BRACKET = 1 #{ and [: its indentation is kept for the closing label
+    SAME = 2 #: and ,
+    CLOSE = 3 #} and ]: printed at the indentation of the last { or [ still open, and one level less after it
+    TERMINAL = 4 #indented one level less after it
+
+#Indent step of each node kind
+NODE_STEPS = [Indent.OPEN] * 4 + [Indent.BRACKET] * 2 + [Indent.SAME] * 2 + [Indent.CLOSE] * 2 + [Indent.TERMINAL] * 5
+
+class ParseTree(LabelTail):
+    '''
+    Stands in for the tokens_eaten list when Parser.parse keeps the parse tree: a table of nodes in typed arrays,
+    numbered in document order, one per line of the printed tree. The parser opens a node for each rule it
+    starts and adds one for each token it eats, under the innermost rule still open, so a value's child is its
+    list, dict or literal, a list's are its brackets, values and commas, a dict's its braces, pairs and commas,
+    and a pair's its key, colon and value. A closing bracket goes under its list or dict even when error
+    recovery has left the rules in it open, and the labels recovery inserts go under the rule they fill in.
+    Each node has its kind (a NODE_LABELS code), the index in the token stream of the token it was eaten from
+    (NO_NODE for labels the parser inserts) and its parent, which the parser records as it goes, and its first
+    child and next sibling (NO_NODE for none), which link() fills in from the parents in one pass the first time
+    the tree is navigated: 17 bytes a node in all.
+    STRING and NUMBER labels are read back from the token stream, so no label strings are kept, except with a
+    StreamedTokens, which is only read forward, and for the empty strings inserted by error recovery.
+    lines() renders the nodes in order with TreeRenderer's indentation rules, the same lines as ever.
+    '''
+    def __init__(self, token_stream=None):
+        super().__init__()
+        self.token_stream = token_stream #random-access token stream the labels are read back from, if any
+        self.buffer = token_stream.buffer if isinstance(token_stream, BufferedTokens) else None
+        self.kinds = array("B")
+        self.tokens = array("i")
+        self.parents = array("i")
+        self.first_children = array("i") #these two are filled in by link
+        self.next_siblings = array("i")
+        self.first_root = NO_NODE #the nodes without a parent are siblings of each other, after errors there can be more
+        self.texts = {} #node -> token value, for the labels that cannot be read back from the token stream
+        self.open_nodes = [] #nodes of the rules the parser is in, innermost last
+        self.open_brackets = [] #list and dict nodes without their closing bracket yet, innermost last
+
+    def open(self, symbol):
+        #same as LabelTail.append, inlined since this runs once per rule
+        self.label_before = self.last_label
+        self.last_label = symbol
+        self.count += 1
+        if self.label_before == "[" or self.label_before == "{": #the first value or pair, or the one recovery fills in
+            parent = self.parents[-1]
+        else:
+            parent = self.open_nodes[-1] if self.open_nodes else NO_NODE
+        node = len(self.kinds)
+        self.kinds.append(NODE_CODES[symbol])
+        self.tokens.append(NO_NODE)
+        self.parents.append(parent)
+        self.open_nodes.append(node)
+        if symbol == "list" or symbol == "dict":
+            self.open_brackets.append(node)
+
+    def add(self, symbol, value=None, index=NO_NODE):
+        self.label_before = self.last_label
+        self.last_label = symbol
+        self.count += 1
+        kind = NODE_CODES.get(symbol)
+        if kind is None: #EOF, not printed
+            self.eof_count += 1
+            return
+        if symbol in CLOSER_RULES:
+            parent = self.closed_rule(CLOSER_RULES[symbol])
+        else:
+            parent = self.open_nodes[-1] if self.open_nodes else NO_NODE
+        if value is not None and (index == NO_NODE or self.token_stream is None):
+            self.texts[len(self.kinds)] = value
+        self.kinds.append(kind)
+        self.tokens.append(index)
+        self.parents.append(parent)
+
+    #the innermost list or dict of kind without its closing bracket, the ones in it were cut short by error recovery
+    def closed_rule(self, kind):
+        brackets = self.open_brackets
+        for position in range(len(brackets) - 1, -1, -1):
+            if self.kinds[brackets[position]] == kind:
+                return brackets.pop(position)
+        return self.open_nodes[-1] if self.open_nodes else NO_NODE
+
+    def mark(self):
+        return len(self.open_nodes)
+
+    def close(self, mark):
+        del self.open_nodes[mark:]
+
+    #fill in the first children and next siblings from the parents, if nodes were added since the last time
+    def link(self):
+        nodes = len(self.kinds)
+        if len(self.first_children) == nodes:
+            return
+        parents = self.parents
+        self.first_children = first_children = array("i", [NO_NODE]) * nodes
+        self.next_siblings = next_siblings = array("i", [NO_NODE]) * nodes
+        first_root = NO_NODE
+        for node in range(nodes - 1, -1, -1): #each node goes in front of the siblings after it
+            parent = parents[node]
+            if parent == NO_NODE:
+                next_siblings[node] = first_root
+                first_root = node
+            else:
+                next_siblings[node] = first_children[parent]
+                first_children[parent] = node
+        self.first_root = first_root
+
+    def kind(self, node):
+        return NODE_LABELS[self.kinds[node]]
+
+    #the node's line without its indentation, as the parser labelled it
+    def label(self, node):
+        kind = self.kinds[node]
+        if kind < TEXT_KINDS:
+            return NODE_LABELS[kind]
+        if node in self.texts:
+            return NODE_LABELS[kind] + ": " + self.texts[node]
+        index = self.tokens[node]
+        if self.buffer is not None: #same as BufferedTokens, without building a Token
+            return NODE_LABELS[kind] + ": " + self.buffer.lexeme(index)
+        return NODE_LABELS[kind] + ": " + self.token_stream[index].token_value
+
+    #index in the token stream of the token the node was eaten from, None for a rule or a label error recovery inserted
+    def token(self, node):
+        index = self.tokens[node]
+        return None if index == NO_NODE else index
+
+    def parent(self, node):
+        parent = self.parents[node]
+        return None if parent == NO_NODE else parent
+
+    def first_child(self, node):
+        self.link()
+        child = self.first_children[node]
+        return None if child == NO_NODE else child
+
+    def next_sibling(self, node):
+        self.link()
+        sibling = self.next_siblings[node]
+        return None if sibling == NO_NODE else sibling
+
+    #the node's children in order, or without a node the top-level nodes (there is more than one after some errors)
+    def children(self, node=None):
+        self.link()
+        children = []
+        child = self.first_root if node is None else self.first_children[node]
+        while child != NO_NODE:
+            children.append(child)
+            child = self.next_siblings[child]
+        return children
+
+    def depth(self, node):
+        depth = 0
+        while self.parents[node] != NO_NODE:
+            node = self.parents[node]
+            depth += 1
+        return depth
+
+    def walk(self, node=None):
+        '''
+        Generate (depth, node) for a node and everything under it in document order, depth 0 being node's.
+        Without a node, for every top-level node and everything under them.
+        '''
+        if node is None:
+            for root in self.children():
+                yield from self.walk(root)
+            return
+        self.link()
+        first_children = self.first_children
+        next_siblings = self.next_siblings
+        depth = 0
+        while True:
+            yield depth, node
+            child = first_children[node]
+            if child != NO_NODE:
+                node = child
+                depth += 1
+                continue
+            #no children, go on to the next sibling of the node or of its closest ancestor that has one
+            while depth > 0 and next_siblings[node] == NO_NODE:
+                node = self.parents[node]
+                depth -= 1
+            if depth == 0:
+                return
+            node = next_siblings[node]
+
+    #the parse tree lines, the same as TreeRenderer gives for the labels (this runs once per node)
+    def lines(self):
+        label = self.label
+        lexeme = None if self.buffer is None or self.texts else self.buffer.lexeme
+        tokens = self.tokens
+        steps = NODE_STEPS
+        indentation = 0
+        stack = []
+        for node, kind in enumerate(self.kinds):
+            step = steps[kind]
+            if step == Indent.CLOSE:
+                placed = stack.pop()
+                yield " " * placed + NODE_LABELS[kind]
+                indentation = placed - 2
+                continue
+            if kind < TEXT_KINDS:
+                yield " " * indentation + NODE_LABELS[kind]
+            elif lexeme is not None: #same as label, without the lookups
+                yield " " * indentation + NODE_LABELS[kind] + ": " + lexeme(tokens[node])
+            else:
+                yield " " * indentation + label(node)
+            if step == Indent.OPEN:
+                indentation += 2
+            elif step == Indent.TERMINAL:
+                indentation -= 2
+            elif step == Indent.BRACKET:
+                stack.append(indentation)
+
+class StreamedTokens:
+    '''
+    Forward-only view of the tokens of a Lexer as parser Tokens, read from it as the parser reaches them.
+    Only the last few tokens are kept, so with Parser.validate memory does not grow with the input.
+    One token past the last one asked for is read ahead, so len() always covers the parser's lookahead.
+    A lexical error is printed and ends the stream with an EOF, the same as Lexer.iter_tokens into a token list.
+    With a token_writer, each token is also written to it as it is read, as a text _token_stream.
+    '''
+    def __init__(self, lexer, token_writer=None):
+        self.lexer = lexer
+        self.token_writer = token_writer
+        self.recent = deque(maxlen=3)
+        self.length = 0 #tokens read so far
+        self.ended = False
+        self.read_through(1)
+
+    #next (token type, start, end) from the lexer, or None after printing a lexical error
+    def read_span(self):
+        try:
+            span = self.lexer.next_span()
+        except LexerError as e:
+            self.lexer.error = e
+            print(f"Lexical Error: {e}")
+            return None
+        if self.token_writer is not None:
+            token = ScannerToken.from_span(self.lexer.input_text, *span)
+            self.token_writer.write(str(token) if token.type == TokenType.EOF else str(token) + "\n")
+        return span
+
+    def read_through(self, index):
+        while self.length <= index and not self.ended:
+            span = self.read_span()
+            token = Token.__new__(Token)
+            token.token_type = "EOF" if span is None else GRAMMAR_SYMBOLS[span[0]]
+            token.token_value = self.lexer.lexeme(span[1], span[2]) if token.token_type in ("NUMBER", "STRING") else None
+            self.recent.append(token)
+            self.length += 1
+            self.ended = token.token_type == "EOF"
+
+    #count the rest of the stream, for the number of unparsed tokens at the end, without building tokens
+    def read_all(self):
+        while not self.ended:
+            span = self.read_span()
+            self.length += 1
+            self.ended = span is None or span[0] == TokenType.EOF
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        self.read_through(index + 1)
+        return self.recent[index - self.length + len(self.recent)]
+
+class FirstError(Exception):
+    #raised by FirstErrorList to stop Parser.validate at the first error
+    pass
+
+class FirstErrorList(list):
+    def append(self, error):
+        super().append(error)
+        raise FirstError()
+
+class Rule:
+    #steps of the grammar rules on Parser.parse_iterative's stack
+    VALUE = 0
+    DICT = 1
+    DICT_FIRST_PAIR = 2
+    DICT_PAIRS = 3
+    LIST = 4
+    LIST_VALUES = 5
+    PAIR = 6
+
 class Parser:
-    def __init__(self, token_stream):
+    '''
+    token_stream is either the text of a _token_stream file, a scanner.TokenBuffer, an iterable of
+    scanner.Token objects such as Lexer.iter_tokens(), or a StreamedTokens over a Lexer.
+    The last three skip writing and re-reading the token stream.
+    With a tree_writer the parse tree is written to it line by line while parsing, instead of being
+    returned from parse() as a list. Without one, tokens_eaten is the tree as a ParseTree node table, which
+    parse() returns the lines of, and which can be walked and navigated afterwards.
+    With a scanner.StringTable as strings (by default the table of a TokenBuffer or StreamedTokens' lexer, if
+    it has one), token values are interned in it.
+    '''
+    def __init__(self, token_stream, tree_writer=None, strings=None):
         self.token_pointer = -1 #first call to get_next_token will set pointer to start of token stream 
         self.lookahead = 0 #point to token after current
         self.current_token = None
         self.next_token = None
-        self.token_stream = token_stream.split('\n')
-        self.tokens_eaten = [] #stores consumed tokens to be outputted as a parse tree
+        self.tree_writer = tree_writer
         self.error_list = [] #gather and report errors to user after giving parse tree
         self.tokens_discarded = [] #list of tokens removed during error recovery
+        self.num_discarded = 0 #tokens removed by panic_mode, counted for profiling
+        self.num_closures = 0 #closing tokens inserted by finish_parsing, counted for profiling
         self.parse_tree = [] #list containing parse tree representation to output
-        #convert the string tokens into Token objects
-        for i in range(len(self.token_stream)):
-            #remove trailing whitespaces if any between token inputs and instantiate Token objects 
-            self.token_stream[i] = Token(self.token_stream[i].strip())
+        if isinstance(token_stream, str):
+            #convert the string tokens into Token objects
+            #remove trailing whitespaces if any between token inputs and instantiate Token objects
+            self.token_stream = [Token(token.strip()) for token in token_stream.split('\n')]
+        elif isinstance(token_stream, TokenBuffer):
+            self.token_stream = BufferedTokens(token_stream)
+            strings = strings or token_stream.strings
+        elif isinstance(token_stream, StreamedTokens):
+            self.token_stream = token_stream
+            strings = strings or token_stream.lexer.strings
+        else:
+            self.token_stream = [Token.from_lexer_token(token) for token in token_stream]
+            #a stream cut short by a lexical error has no EOF, close it off so the parser can finish
+            if not self.token_stream or self.token_stream[-1].token_type != "EOF":
+                self.token_stream.append(Token("<EOF>"))
+        #stores consumed tokens to be outputted as a parse tree
+        if tree_writer is not None:
+            self.tokens_eaten = TreeEmitter(tree_writer)
+        else:
+            self.tokens_eaten = ParseTree(None if isinstance(self.token_stream, StreamedTokens) else self.token_stream)
+        self.strings = strings
+        if strings is not None and isinstance(self.token_stream, list):
+            for token in self.token_stream:
+                if token.token_value is not None:
+                    token.token_value = strings.intern(token.token_value)
         #use this stack to determine which dict/list closing tokens are needed for error recovery
         self.recovery_stack = []
         self.is_recovered = False #true after error recovery, tells parser to resume parsing from a safe point
         self.is_finished = False #set to true after creating parse tree, tells parser to stop calling parse methods
+        self.kind_codes = None #kind code of every token as bytes, for panic_mode to find synchronizing tokens
+        self.next_of_kind = {} #kind code -> index of the next token of that kind found in kind_codes
         
     def get_next_token(self):
         self.token_pointer += 1
@@ -65,55 +594,165 @@ class Parser:
         if self.token_pointer >= len(self.token_stream):
             self.current_token = None
             return
+        #the previous lookahead token is the new current token
+        current_token = self.next_token if self.next_token is not None else self.token_stream[self.token_pointer]
         if self.lookahead >= len(self.token_stream):
             self.next_token = None
         else:
             self.next_token = self.token_stream[self.lookahead]
-        self.current_token = self.token_stream[self.token_pointer]
+        self.current_token = current_token
     
     #give parse tree representation of the non-terminals and terminals from parsed token stream
     def output(self):
-        indentation = 0
-        indentation_stack = [] #when we see a { or [, push the current indentation level to the stack
-                                #when we see a } or ], pop the current indentation level 
-        '''
-            Indentation pseudocode:
-            if value | list | dict | pair -> increase indentation after printing
-            if  , or : -> print without changing indentation
-            if String/Number/true/false/null ->  print then reduce indentation
-            for nested brackets and braces:
-              everytime you see a { or [, save the indentation for it to a stack
-              then when you see a } or ], pop from the stack to get the corresponding indentation
-        '''
-        for token in self.tokens_eaten:
-            
-            if token in ["value", "list", "dict", "pair"]:
-                self.parse_tree.append(" " * indentation + token)
-                indentation += 2
-            elif token in ["{", "["]:
-                self.parse_tree.append(" " * indentation + token)
-                indentation_stack.append(indentation)
-            elif token in [":", ","]:
-                self.parse_tree.append( " " * indentation + token)
-            
-            elif token[0:6] == "STRING" or token[0:6] == "NUMBER" or token == "true" or token == "null" or token == "false":
-                self.parse_tree.append(" " * indentation + token)
-                indentation -= 2
-            
-            elif token in ["}","]"]:
-                indentation = indentation_stack.pop()
-                self.parse_tree.append(" " * indentation + token)
-                indentation -= 2
+        #a tree_writer already got every line as its label was eaten, validate keeps no labels at all
+        if isinstance(self.tokens_eaten, ParseTree):
+            self.parse_tree.extend(self.tokens_eaten.lines())
         return self.parse_tree
               
     def parse(self):
+        self.get_next_token()
+        self.parse_iterative()
+        
+        if self.is_finished:
+            return [self.parse_tree, self.error_list]
+        
+        return self.finish_parsing()
+    
+    def validate(self, first_only=False):
+        '''
+        Run the grammar and panic mode error recovery like parse(), but build no parse tree. Only the
+        recovery stack is kept, so with a StreamedTokens token stream memory grows with nesting depth
+        rather than with the input. Returns the error list, empty for a valid document.
+        With first_only, stop at the first error.
+        '''
+        self.tokens_eaten = LabelTail()
+        self.tokens_discarded = None #not kept
+        if first_only:
+            self.error_list = FirstErrorList()
+        try:
+            self.get_next_token()
+            self.parse_iterative()
+            if not self.is_finished:
+                self.finish_parsing()
+        except FirstError:
+            pass
+        return self.error_list
+
+    #same as parse, but runs the productions through the recursive parse_X methods (one Python frame per rule)
+    def parse_recursive(self):
         self.get_next_token()
         self.parse_value()
+        self.tokens_eaten.close(0)
         
         if self.is_finished:
             return [self.parse_tree, self.error_list]
         
         return self.finish_parsing()
+    
+    def parse_iterative(self):
+        '''
+        Runs the same productions as parse_value, parse_dict, parse_list and parse_pair, but keeps the rules
+        still to finish on an explicit stack instead of the call stack, so nesting depth is only limited by memory.
+        Each Rule step is the part of a parse_X method between two of its calls to another parse_X method,
+        a step that ends in a call continues straight into the called rule, pushing its own next step if it has one.
+        The tree nodes opened by a called rule are closed when the step after the call is popped.
+        '''
+        stack = []
+        marks = [] #tokens_eaten.mark() when each step on the stack was pushed
+        rule = Rule.VALUE
+        while True: #rules are checked roughly in order of how often they run
+            
+            if rule == Rule.VALUE: # value --> dict | list | STRING | NUMBER | "true" | "false" | "null"
+                if not self.is_finished:
+                    token_type = self.current_token.token_type
+                    if token_type == "{":
+                        self.tokens_eaten.open("value")
+                        self.recovery_stack.append("}")
+                        rule = Rule.DICT
+                        continue
+                    if token_type == "[":
+                        self.tokens_eaten.open("value")
+                        self.recovery_stack.append("]")
+                        rule = Rule.LIST
+                        continue
+                    if token_type in ["STRING", "NUMBER", "true", "false", "null"]:
+                        self.tokens_eaten.open("value")
+                        self.eat(token_type)
+                    elif token_type == "EOF":
+                        self.finish_parsing()
+                        self.is_finished = True
+                    elif self.is_recovered or self.is_finished:
+                        self.is_recovered = False
+                    else:
+                        self.panic_mode("value")
+            
+            elif rule == Rule.LIST_VALUES: #for kleene-*, comma denotes another value
+                if self.current_token.token_type == ",":
+                    self.eat(",")
+                    stack.append(Rule.LIST_VALUES)
+                    marks.append(self.tokens_eaten.mark())
+                    rule = Rule.VALUE
+                    continue
+                if self.is_recovered or self.is_finished:
+                    self.is_recovered = False
+                else:
+                    self.eat("]")
+            
+            elif rule == Rule.DICT_PAIRS: #for kleene-*, comma denotes another pair
+                if self.current_token.token_type == ",":
+                    self.eat(",")
+                    stack.append(Rule.DICT_PAIRS)
+                    marks.append(self.tokens_eaten.mark())
+                    rule = Rule.PAIR
+                    continue
+                if self.is_recovered or self.is_finished:
+                    self.is_recovered = False
+                else:
+                    self.eat("}")
+            
+            elif rule == Rule.PAIR: # pair : STRING ”:” value
+                if self.is_finished or self.is_recovered:
+                    self.is_recovered = False
+                else:
+                    self.tokens_eaten.open("pair")
+                    self.eat("STRING")
+                    self.eat(":")
+                    rule = Rule.VALUE
+                    continue
+            
+            elif rule == Rule.DICT: # dict --> ”{” pair (”, ” pair)∗ ”}”
+                if not self.is_finished:
+                    self.tokens_eaten.open("dict")
+                    self.eat("{")
+                    stack.append(Rule.DICT_FIRST_PAIR)
+                    marks.append(self.tokens_eaten.mark())
+                    rule = Rule.PAIR
+                    continue
+            
+            elif rule == Rule.DICT_FIRST_PAIR: #first pair parsed, stop here if it needed error recovery
+                if self.is_recovered or self.is_finished:
+                    self.is_recovered = False
+                else:
+                    rule = Rule.DICT_PAIRS
+                    continue
+            
+            elif rule == Rule.LIST: # list --> ”[” value (”, ” value)∗ ”]”
+                if self.is_finished or self.is_recovered:
+                    self.is_recovered = False
+                else:
+                    self.tokens_eaten.open("list")
+                    self.eat("[")
+                    stack.append(Rule.LIST_VALUES)
+                    marks.append(self.tokens_eaten.mark())
+                    rule = Rule.VALUE
+                    continue
+            
+            #the current rule is done, resume the one that called it
+            if not stack:
+                self.tokens_eaten.close(0)
+                return
+            rule = stack.pop()
+            self.tokens_eaten.close(marks.pop())
         
     def parse_value(self): # value --> dict | list | STRING | NUMBER | "true" | "false" | "null"
         
@@ -123,18 +762,18 @@ class Parser:
         token_type = self.current_token.token_type
         #valid value can start with any of the following tokens: { [ string, number, true, false, null
         if token_type == "{":
-            self.tokens_eaten.append("value")
+            self.tokens_eaten.open("value")
             self.recovery_stack.append("}")
             self.parse_dict()
             return
         if token_type == "[":
-            self.tokens_eaten.append("value")
+            self.tokens_eaten.open("value")
             self.recovery_stack.append("]")
             self.parse_list()
             return
         #call eat on all other terminals
         if token_type in ["STRING", "NUMBER", "true", "false", "null"]:
-            self.tokens_eaten.append("value")
+            self.tokens_eaten.open("value")
             self.eat(self.current_token.token_type)
             return
         if token_type == "EOF":
@@ -149,9 +788,11 @@ class Parser:
     def parse_dict(self): # dict --> ”{” pair (”, ” pair)∗ ”}”
         if self.is_finished:
             return
-        self.tokens_eaten.append("dict")
+        self.tokens_eaten.open("dict")
         self.eat("{")
+        mark = self.tokens_eaten.mark() #the nodes of each pair are closed when it is parsed
         self.parse_pair()
+        self.tokens_eaten.close(mark)
         #if recovered from a parsing error, finish the production rule
         if self.is_recovered or self.is_finished:
             self.is_recovered = False
@@ -160,6 +801,7 @@ class Parser:
         while self.current_token.token_type == ",":
             self.eat(",")
             self.parse_pair()
+            self.tokens_eaten.close(mark)
         
         if self.is_recovered or self.is_finished:
             self.is_recovered = False
@@ -172,13 +814,16 @@ class Parser:
         if self.is_finished or self.is_recovered:
             self.is_recovered = False
             return
-        self.tokens_eaten.append("list")
+        self.tokens_eaten.open("list")
         self.eat("[")
+        mark = self.tokens_eaten.mark() #the nodes of each value are closed when it is parsed
         self.parse_value()
+        self.tokens_eaten.close(mark)
         #for kleene-*, comma denotes another value
         while self.current_token.token_type == ",":
             self.eat(",")
             self.parse_value()
+            self.tokens_eaten.close(mark)
         
         if self.is_recovered or self.is_finished:
             self.is_recovered = False
@@ -189,7 +834,7 @@ class Parser:
         if self.is_finished or self.is_recovered:
             self.is_recovered = False
             return
-        self.tokens_eaten.append("pair")
+        self.tokens_eaten.open("pair")
         self.eat("STRING")
         self.eat(":")
         self.parse_value()
@@ -201,8 +846,6 @@ class Parser:
             return
         
         if self.current_token.token_type == expected_token:
-            to_print = self.current_token.token_type #token type and token value if exists
-            
             #if current token is comma or colon, use lookahead to ensure next token is valid
             if self.current_token.token_type == "," or self.current_token.token_type == ":":
                 if self.next_token and self.next_token.token_type not in ["{", "[", "STRING", "NUMBER", "true", "false", "null"]:
@@ -215,9 +858,7 @@ class Parser:
                     return
                     
             
-            if self.current_token.token_value is not None:
-                to_print += ": " + self.current_token.token_value
-            self.tokens_eaten.append(to_print)
+            self.tokens_eaten.add(self.current_token.token_type, self.current_token.token_value, self.token_pointer)
             
             #if closing innermost dict or list, pop most recent emergency closure from stack
             if self.current_token.token_type in ["]", "}"] and len(self.recovery_stack) > 0:
@@ -246,7 +887,8 @@ class Parser:
             self.finish_parsing()
             self.is_finished = True
        
-        self.tokens_discarded.append(self.current_token)
+        if self.tokens_discarded is not None:
+            self.tokens_discarded.append(self.current_token)
         self.get_next_token()
         synchronizing_tokens = ["EOF"]
             #determine synchronizing token based on current parsing state
@@ -256,9 +898,21 @@ class Parser:
             elif self.recovery_stack[-1] == "]":
                 synchronizing_tokens.append("]")
         
+        #jump straight to the synchronizing token when the token stream can be looked ahead in
+        target = self.find_synchronizing(synchronizing_tokens)
+        if target is not None and target > self.token_pointer:
+            if self.tokens_discarded is not None:
+                self.tokens_discarded.extend(self.token_stream[index] for index in range(self.token_pointer, target))
+            num_discarded += target - self.token_pointer
+            self.token_pointer = target - 1
+            self.lookahead = target
+            self.next_token = None
+            self.get_next_token()
+        
         #get next token until curr token is synchronizing. Then resume parsing after that token (unless EOF)
         while not self.current_token.token_type in synchronizing_tokens:
-            self.tokens_discarded.append(self.current_token)
+            if self.tokens_discarded is not None:
+                self.tokens_discarded.append(self.current_token)
             num_discarded += 1
             self.get_next_token()
         
@@ -266,23 +920,57 @@ class Parser:
         #since empty lists are not allowed in the grammar, check if the most recently
         #consumed token is [, if so insert an empty string to make the list syntactically valid
         if self.current_token.token_type == "]" and self.tokens_eaten[-1] == "[":
-            error_msg = "Empty list detected, adding empty string"
-            self.tokens_eaten.append("value")
-            self.tokens_eaten.append('STRING: ""')
-            self.error_list.append(error_msg)
+            self.fill_empty("]")
         #same for empty dicts
         if self.current_token.token_type == "}" and self.tokens_eaten[-1] == "{":
-            error_msg = "empty dict detected, adding empty pair"
-            self.tokens_eaten.append("pair")
-            self.tokens_eaten.append('STRING: ""')
-            self.tokens_eaten.append(":")
-            self.tokens_eaten.append('STRING: ""')
-            self.error_list.append(error_msg)
+            self.fill_empty("}")
+        self.num_discarded += num_discarded
         error_msg = f"Parsing resumed with token: {self.current_token} at position {str(self.token_pointer)}, tokens lost: {str(num_discarded)}"
         self.is_recovered = True #tells current parse_X function to stop the production rule
         self.error_list.append(error_msg)
         self.eat(self.current_token.token_type) #consume the recovery token
         
+    #give an empty list an empty string, or an empty dict an empty pair, for the grammar (closure is its closing bracket)
+    def fill_empty(self, closure):
+        mark = self.tokens_eaten.mark()
+        if closure == "]":
+            self.tokens_eaten.open("value")
+            self.tokens_eaten.add("STRING", '""')
+            self.error_list.append("Empty list detected, adding empty string")
+        else:
+            self.tokens_eaten.open("pair")
+            self.tokens_eaten.add("STRING", '""')
+            self.tokens_eaten.add(":")
+            self.tokens_eaten.add("STRING", '""')
+            self.error_list.append("empty dict detected, adding empty pair")
+        self.tokens_eaten.close(mark)
+
+    def find_synchronizing(self, synchronizing_tokens):
+        '''
+        Index of the first token from the current one on whose type is one of synchronizing_tokens, or None if
+        there is none or the token stream is a StreamedTokens (which is only read forward), panic_mode then
+        reads tokens one at a time as before. The kinds of the whole stream are taken once as bytes, and
+        next_of_kind keeps the last token found of each kind: the parser only moves forward, so each kind is
+        searched through once however many times the parser recovers.
+        '''
+        if isinstance(self.token_stream, StreamedTokens) or self.current_token is None:
+            return None
+        if self.kind_codes is None:
+            if isinstance(self.token_stream, BufferedTokens):
+                self.kind_codes = self.token_stream.kind_codes()
+            else:
+                self.kind_codes = bytes(SYMBOL_CODES.get(token.token_type, len(KIND_SYMBOLS)) for token in self.token_stream)
+        target = len(self.kind_codes)
+        for token_type in synchronizing_tokens:
+            code = SYMBOL_CODES[token_type]
+            index = self.next_of_kind.get(code, -1)
+            if index < self.token_pointer:
+                index = self.kind_codes.find(code, self.token_pointer)
+                index = len(self.kind_codes) if index < 0 else index
+                self.next_of_kind[code] = index
+            target = min(target, index)
+        return target if target < len(self.kind_codes) else None
+
     #close unclosed lists/dicts, output parse tree, error report, and exit program
     def finish_parsing(self):
         self.is_finished = True #do not call any more production rules
@@ -296,23 +984,18 @@ class Parser:
             #check if prev. appended token is the closure's opening, if so add an empty element to preserve grammar rule
             prev_token = self.tokens_eaten[-1]
             if prev_token == "[" and closure == "]":
-                error_msg = "Empty list detected, adding empty string"
-                self.tokens_eaten.append("value")
-                self.tokens_eaten.append('STRING: ""')
-                self.error_list.append(error_msg)
+                self.fill_empty("]")
             if prev_token == "{" and closure == "}":
-                error_msg = "empty dict detected, adding empty pair"
-                self.tokens_eaten.append("pair")
-                self.tokens_eaten.append('STRING: ""')
-                self.tokens_eaten.append(":")
-                self.tokens_eaten.append('STRING: ""')
-                self.error_list.append(error_msg)
+                self.fill_empty("}")
                 
-            self.tokens_eaten.append(closure)
+            self.tokens_eaten.add(closure)
+            self.num_closures += 1
             error_msg = "Fixing unclosed " + closure_name + " inserting " + closure
             self.error_list.append(error_msg)
             
         #handle case where grammar finished but additional tokens remain
+        if isinstance(self.token_stream, StreamedTokens):
+            self.token_stream.read_all()
         unread = len(self.token_stream) - len(self.tokens_eaten)
         if unread > 1 and not "EOF" in self.tokens_eaten: #1 to not count EOF as an unread token
             error_msg = f"Reached end of parsing with {unread} unparsed tokens remaining"
@@ -325,4 +1008,157 @@ class Parser:
             error_report.append("Errors:\n")
             for error in self.error_list:
                 error_report.append(error)
-        return [tree, error_report]
\ No newline at end of file
+        return [tree, error_report]
+
+class ParseError(Exception):
+    def __init__(self, pos, received, expected):
+        super().__init__(f"Received token {received} expected token type: {expected} at index {pos} of input")
+
+def loads(input_text, strings=None, numeric_arrays=False):
+    '''
+    Parse a document straight into Python values: dict, list, int, float, str, True, False and None.
+    Unlike Parser there is no error recovery, the first syntax error raises ParseError (or LexerError).
+    With a scanner.StringTable, keys and string values are interned in it. With numeric_arrays, lists of
+    numbers only are read in one step into arrays (see read_number_array).
+    '''
+    return build_value(Lexer(input_text, strings=strings), numeric_arrays)
+
+#same as loads, for a text file object read in chunks, or a binary file lexed from a memory map
+#(a binary file object without a file descriptor, such as io.BytesIO, is read in chunks of bytes)
+def load(file, strings=None, numeric_arrays=False):
+    if not isinstance(file.read(0), bytes):
+        return build_value(Lexer.from_file(file, strings=strings), numeric_arrays)
+    try:
+        file.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return build_value(Lexer(b"", file, strings=strings), numeric_arrays)
+    with Lexer.from_mmap(file, strings=strings) as lexer:
+        return build_value(lexer, numeric_arrays)
+
+def build_value(lexer, numeric_arrays=False):
+    '''
+    Builds values in one pass over the lexer's token spans, keeping open dicts and lists on a stack.
+    Each stack entry is [container, key], key being the pending dict key (None for lists).
+    '''
+    stack = []
+    while True:
+        #parse a value
+        token_type, start, end = lexer.next_span()
+        if token_type == TokenType.LBRACE:
+            stack.append([{}, read_key(lexer)])
+            continue
+        if token_type == TokenType.LBRACK:
+            value = read_number_array(lexer) if numeric_arrays else None
+            if value is None:
+                stack.append([[], None])
+                continue
+        elif token_type == TokenType.STRING:
+            value = lexer.lexeme(start + 1, end - 1)
+        elif token_type == TokenType.INTEGER:
+            try:
+                value = int(lexer.input_text[start:end])
+            except ValueError:
+                raise bad_number(lexer, start, end) from None
+        elif token_type == TokenType.FLOAT:
+            try:
+                value = float(lexer.input_text[start:end])
+            except ValueError:
+                raise bad_number(lexer, start, end) from None
+        elif token_type == TokenType.TRUE:
+            value = True
+        elif token_type == TokenType.FALSE:
+            value = False
+        elif token_type == TokenType.NULL:
+            value = None
+        else:
+            raise ParseError(lexer.offset + start, GRAMMAR_SYMBOLS[token_type], "value")
+        
+        #store the value in the innermost container, closing containers until a comma asks for another value
+        while True:
+            if not stack:
+                token_type, start, end = lexer.next_span()
+                if token_type != TokenType.EOF:
+                    raise ParseError(lexer.offset + start, GRAMMAR_SYMBOLS[token_type], "EOF")
+                return value
+            entry = stack[-1]
+            container, key = entry
+            if key is None:
+                container.append(value)
+            else:
+                container[key] = value
+            token_type, start, end = lexer.next_span()
+            if token_type == TokenType.COMMA:
+                if key is not None:
+                    entry[1] = read_key(lexer)
+                break
+            closing = TokenType.RBRACK if key is None else TokenType.RBRACE
+            if token_type != closing:
+                raise ParseError(lexer.offset + start, GRAMMAR_SYMBOLS[token_type], GRAMMAR_SYMBOLS[closing])
+            stack.pop()
+            value = container
+
+#the lexer takes any numeric character as a digit (such as ²), int and float only take the decimal digits
+def bad_number(lexer, start, end):
+    return ParseError(lexer.offset + start, "NUMBER: " + lexer.lexeme(start, end), "NUMBER")
+
+#read the STRING ":" that starts a pair and return the key
+def read_key(lexer):
+    token_type, start, end = lexer.next_span()
+    if token_type != TokenType.STRING:
+        raise ParseError(lexer.offset + start, GRAMMAR_SYMBOLS[token_type], "STRING")
+    key = lexer.lexeme(start + 1, end - 1)
+    token_type, start, end = lexer.next_span()
+    if token_type != TokenType.COLON:
+        raise ParseError(lexer.offset + start, GRAMMAR_SYMBOLS[token_type], ":")
+    return key
+
+#read_number_array takes a list in one step if it is only these characters up to the ], and if the lexer would
+#read each number like float and int do: once the digits 1-9 are 1 and whitespace is a space, none of
+#MISPLACED is in it (leading zeros, a decimal point without digits on both sides). float and int reject the rest.
+NUMBER_CHARS = r"[-0-9., \t\n\r]*"
+NUMBER_START = r"[ \t\n\r]*(?:[-0-9]|\Z)" #a list that starts with anything else is not looked at further
+NUMBER_CLASSES = bytes.maketrans(b"123456789\t\n\r", b"111111111   ")
+MISPLACED = [b",00", b",01", b"-00", b"-01", b" 00", b" 01", b".,", b". ", b",.", b" .", b"-."]
+#the pattern and separators for text, and for bytes (a memory-mapped input)
+NUMBER_PATTERNS = {
+    str: [re.compile(NUMBER_CHARS), re.compile(NUMBER_START), "]", ",", "."],
+    bytes: [re.compile(NUMBER_CHARS.encode()), re.compile(NUMBER_START.encode()), b"]", b",", b"."],
+}
+
+def read_number_array(lexer):
+    '''
+    Called just after a "[", reads the rest of the list in one step if it holds only numbers, and returns them
+    as a NumPy array, or an array.array without NumPy: int64 ("q") if they are all integers, float64 ("d")
+    if any of them has a decimal point (the integers then become floats too). Returns None, with the lexer
+    where it was, for a list with anything else in it (or an empty one), and for integers that do not fit in
+    int64, which build_value then reads as usual.
+    '''
+    number_chars, number_start, bracket, comma, dot = NUMBER_PATTERNS[type(lexer.input_text)]
+    while True:
+        text = lexer.input_text
+        start = lexer.position
+        if number_start.match(text, start) is None:
+            return None
+        close = text.find(bracket, start)
+        if close >= 0 or lexer.at_end:
+            break
+        if number_chars.fullmatch(text, start) is None: #not a list of numbers, whatever the rest of it is
+            return None
+        lexer.read_chunk() #keeps everything from the position, so the list is read whole
+    if close < 0 or number_chars.fullmatch(text, start, close) is None:
+        return None
+    body = text[start:close]
+    classes = (b"," + (body if isinstance(body, bytes) else body.encode("ascii")) + b",").translate(NUMBER_CLASSES)
+    if any(misplaced in classes for misplaced in MISPLACED):
+        return None
+    parts = body.split(comma)
+    floats = dot in body
+    try:
+        if numpy is not None:
+            values = numpy.array(parts, dtype=numpy.float64 if floats else numpy.int64)
+        else:
+            values = array("d" if floats else "q", map(float if floats else int, parts))
+    except (ValueError, OverflowError): #an empty list, a missing comma or number, or an integer too big
+        return None
+    lexer.position = close + 1
+    return values
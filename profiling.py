@@ -0,0 +1,161 @@
+'''
+Optional instrumentation of compile runs, exported as JSON by compiler.py --profile.
+
+A Profile collects wall and CPU time per phase (read, lex, token stream write, parse, tree write), tokens per
+TokenType, DFA transitions per state, the tokens Parser.panic_mode discarded, the closures finish_parsing
+inserted, and the tracemalloc peak. Time spent in a phase nested inside another one (reads while lexing,
+tree writes while parsing) only counts for the inner phase.
+
+Nothing is counted in the scanner's or parser's inner loops: token and transition counts are worked out from
+the TokenBuffer after lexing, and the parser counts are read off the Parser once it is done. Code that is
+not profiled is handed NO_PROFILE, whose methods do nothing, so the cost is a few calls per file.
+'''
+import time
+import tracemalloc
+from collections import Counter
+from scanner import COMPILED_DFA, TOKEN_KINDS, Action
+
+#TokenType values are 1-tuples, except EOF
+KIND_NAMES = [token_type if isinstance(token_type, str) else token_type[0] for token_type in TOKEN_KINDS]
+
+class NullProfile:
+    #stands in for a Profile when profiling is off, every method does nothing
+    def start(self, name):
+        pass
+
+    def stop(self):
+        pass
+
+    def reader(self, source, name):
+        return source
+
+    def writer(self, writer, name):
+        return writer
+
+    def count_tokens(self, tokens):
+        pass
+
+    def count_parser(self, parser):
+        pass
+
+NO_PROFILE = NullProfile()
+
+class TimedReader:
+    #file-like wrapper that times every read as a phase of a Profile
+    def __init__(self, source, profile, name):
+        self.source = source
+        self.profile = profile
+        self.name = name
+
+    def read(self, size=-1):
+        self.profile.start(self.name)
+        chunk = self.source.read(size)
+        self.profile.stop()
+        return chunk
+
+class TimedWriter:
+    #file-like wrapper that times every write as a phase of a Profile
+    def __init__(self, writer, profile, name):
+        self.writer = writer
+        self.profile = profile
+        self.name = name
+
+    def write(self, text):
+        self.profile.start(self.name)
+        self.writer.write(text)
+        self.profile.stop()
+
+class Profile(NullProfile):
+    def __init__(self):
+        self.phases = {} #phase name -> [wall seconds, cpu seconds]
+        self.tokens = Counter() #TokenType name -> count
+        self.transitions = Counter() #DFA state name -> transitions out of it
+        self.discarded = 0
+        self.closures = 0
+        self.peak_memory = 0
+        self.running = [] #[name, wall start, cpu start, wall in nested phases, cpu in nested phases]
+        self.tracing = False #whether begin_memory started tracemalloc
+
+    def start(self, name):
+        self.running.append([name, time.perf_counter(), time.process_time(), 0.0, 0.0])
+
+    def stop(self):
+        name, wall_start, cpu_start, nested_wall, nested_cpu = self.running.pop()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        totals = self.phases.setdefault(name, [0.0, 0.0])
+        totals[0] += wall - nested_wall
+        totals[1] += cpu - nested_cpu
+        if self.running:
+            self.running[-1][3] += wall
+            self.running[-1][4] += cpu
+
+    def reader(self, source, name):
+        return None if source is None else TimedReader(source, self, name)
+
+    def writer(self, writer, name):
+        return TimedWriter(writer, self, name)
+
+    #start tracing memory allocations, the peak is taken by end_memory
+    def begin_memory(self):
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    def end_memory(self):
+        self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+        if self.tracing:
+            tracemalloc.stop()
+
+    def count_tokens(self, tokens):
+        '''
+        Count a TokenBuffer's tokens per type, and the DFA transitions that lexed them: one per character
+        of each lexeme, counted for the state the character was read in, as Lexer.scan's table would run
+        (strings included, which scan skips through with str.find).
+        '''
+        for code, count in Counter(tokens.kinds).items():
+            self.tokens[KIND_NAMES[code]] += count
+        table = COMPILED_DFA.table
+        states = COMPILED_DFA.states
+        start = COMPILED_DFA.start
+        per_state = [0] * len(states)
+        str0 = COMPILED_DFA.state_ids["str0"]
+        for index in range(len(tokens)):
+            lexeme = tokens.lexeme(index)
+            if lexeme[:1] == '"': #start -> str0 on the opening quote, then str0 until the closing one
+                per_state[start] += 1
+                per_state[str0] += len(lexeme) - 1
+                continue
+            state = start
+            for cls in COMPILED_DFA.classify(lexeme):
+                per_state[state] += 1
+                action, target = table[state][cls][:2]
+                if action == Action.REJECT:
+                    break
+                state = target
+        for state, count in enumerate(per_state):
+            if count:
+                self.transitions[states[state]] += count
+
+    def count_parser(self, parser):
+        self.discarded += parser.num_discarded
+        self.closures += parser.num_closures
+
+    def to_dict(self):
+        return {"phases": {name: {"wall": wall, "cpu": cpu} for name, (wall, cpu) in self.phases.items()},
+                "tokens": dict(self.tokens), "dfa_transitions": dict(self.transitions),
+                "panic_discarded": self.discarded, "closures_inserted": self.closures,
+                "peak_memory": self.peak_memory}
+
+    #add the counts of another Profile's to_dict(), such as one sent back by a worker process
+    def merge(self, profile):
+        for name, times in profile["phases"].items():
+            totals = self.phases.setdefault(name, [0.0, 0.0])
+            totals[0] += times["wall"]
+            totals[1] += times["cpu"]
+        self.tokens.update(profile["tokens"])
+        self.transitions.update(profile["dfa_transitions"])
+        self.discarded += profile["panic_discarded"]
+        self.closures += profile["closures_inserted"]
+        self.peak_memory = max(self.peak_memory, profile["peak_memory"])
@@ -1,5 +1,7 @@
+import mmap
 import os
-from parser import Parser
+import re
+from array import array
 
 class TokenType:
     LBRACE = "LBRACE", # {
@@ -17,9 +19,25 @@ class TokenType:
     EOF = "EOF"  # end of input
     
 class Token:
+    __slots__ = ("type", "value")
+
     def __init__(self, type, value=None):
         self.type = type
         self.value = value
+    
+    #build the token for input_text[start:end], numbers and strings keep their lexeme as the value
+    #(from strings, a StringTable, if there is one)
+    @classmethod
+    def from_span(cls, input_text, type, start, end, strings=None):
+        if type == TokenType.STRING or type == TokenType.FLOAT:
+            value = decode(input_text[start:end])
+            return cls(type, value if strings is None else strings.intern(value))
+        if type == TokenType.INTEGER:
+            value = decode(input_text[start:end])
+            value = value if strings is None else strings.intern(value)
+            #DFA.transition emits a lone 0 with the int 0 as its value
+            return cls(type, 0 if value == "0" else value)
+        return cls(type)
         
     def __repr__(self):
         if self.type == TokenType.LBRACE:
@@ -47,6 +65,76 @@ class Token:
         #only other option currently is eof
         return f"<{self.type}>"
 
+#one byte code per token type, in the order TokenBuffer stores them
+TOKEN_KINDS = [TokenType.LBRACE, TokenType.RBRACE, TokenType.LBRACK, TokenType.RBRACK, TokenType.COLON,
+               TokenType.COMMA, TokenType.INTEGER, TokenType.FLOAT, TokenType.STRING, TokenType.TRUE,
+               TokenType.FALSE, TokenType.NULL, TokenType.EOF]
+KIND_CODES = {token_type: code for code, token_type in enumerate(TOKEN_KINDS)}
+
+#lexemes sliced out of a memory-mapped input are bytes, they are decoded one at a time when asked for
+def decode(lexeme):
+    return lexeme if isinstance(lexeme, str) else lexeme.decode("utf-8")
+
+class StringTable:
+    '''
+    Interning table for lexemes: documents of many records repeat the same keys and values, and with a table
+    every occurrence is the same str object, kept once, instead of a fresh copy.
+    One table can be shared by a Lexer, the TokenBuffer it fills, a Parser and parser.build_value (and by
+    the documents of a stream). With max_size the table stops growing once it holds that many strings, new
+    strings are then returned as they are, while the ones already in it are still shared.
+    '''
+    def __init__(self, max_size=None):
+        self.strings = {}
+        self.max_size = max_size
+
+    def intern(self, string):
+        interned = self.strings.get(string)
+        if interned is not None:
+            return interned
+        if self.max_size is None or len(self.strings) < self.max_size:
+            self.strings[string] = string
+        return string
+
+    def __len__(self):
+        return len(self.strings)
+
+class TokenBuffer:
+    '''
+    Compact token stream: parallel arrays of kind codes and start/end offsets into the source text.
+    Lexemes are only sliced out of the source, and Token objects only built, when they are asked for.
+    The source can also be the bytes of a memory-mapped file, then the offsets are byte offsets.
+    With a StringTable as strings, lexemes and token values are interned in it.
+    '''
+    def __init__(self, source, strings=None):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.strings = strings
+
+    def append(self, token_type, start, end):
+        self.kinds.append(KIND_CODES[token_type])
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def kind(self, index):
+        return TOKEN_KINDS[self.kinds[index]]
+
+    def lexeme(self, index):
+        lexeme = decode(self.source[self.starts[index]:self.ends[index]])
+        return lexeme if self.strings is None else self.strings.intern(lexeme)
+
+    def __getitem__(self, index):
+        return Token.from_span(self.source, TOKEN_KINDS[self.kinds[index]], self.starts[index], self.ends[index],
+                               self.strings)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield self[index]
+
 class DFA:
     def __init__(self):
         #state labels stored in array for reference
@@ -315,8 +403,172 @@ class DFA:
             self.state = "reject"
             return
         
+class CharClass:
+    #character classes used to index the compiled transition table
+    OTHER = 0
+    LBRACE = 1
+    RBRACE = 2
+    LBRACK = 3
+    RBRACK = 4
+    COLON = 5
+    COMMA = 6
+    QUOTE = 7
+    MINUS = 8
+    ZERO = 9
+    DIGIT = 10 #any other numeric character, same test as str.isnumeric()
+    DOT = 11
+    WHITESPACE = 12
+    T = 13
+    F = 14
+    N = 15
+    R = 16
+    U = 17
+    E = 18
+    A = 19
+    L = 20
+    S = 21
+    COUNT = 22 #number of classes a real character can have
+    END = 22 #no next character, only used for lookahead
+
+    SINGLE = {"{": LBRACE, "}": RBRACE, "[": LBRACK, "]": RBRACK, ":": COLON, ",": COMMA,
+              '"': QUOTE, "-": MINUS, "0": ZERO, ".": DOT, "t": T, "f": F, "n": N,
+              "r": R, "u": U, "e": E, "a": A, "l": L, "s": S}
+
+    @staticmethod
+    def classify(char):
+        if char in CharClass.SINGLE:
+            return CharClass.SINGLE[char]
+        if char.isnumeric():
+            return CharClass.DIGIT
+        if char.isspace():
+            return CharClass.WHITESPACE
+        return CharClass.OTHER
+
+class CharClassMap(dict):
+    '''
+    str.translate table mapping every character to chr(class).
+    ASCII is filled in up front, anything else is classified the first time it is seen.
+    '''
+    def __init__(self):
+        super().__init__((code, chr(CharClass.classify(chr(code)))) for code in range(128))
+
+    def __missing__(self, code):
+        self[code] = chr(CharClass.classify(chr(code)))
+        return self[code]
+
+class Action:
+    REJECT = 0 #raise a LexerError at the current character
+    MOVE = 1 #consume the character and go to the target state
+    EMIT = 2 #consume the character and return a token that includes it
+    EMIT_BEFORE = 3 #consume the character (whitespace) and return a token that excludes it
+    LOOKAHEAD = 4 #consume the character, return a token if the next character ends it, else go to target
+
+class CompiledDFA:
+    '''
+    Table-driven version of DFA.transition. States are integer ids (their index in DFA.states),
+    each input is mapped to CharClass codes once, and every (state, class) pair has a
+    precomputed (action, target state, token type, lookahead set) entry.
+    '''
+    def __init__(self, dfa=None):
+        self.states = (dfa or DFA()).states
+        self.state_ids = {name: i for i, name in enumerate(self.states)}
+        self.start = self.state_ids["start"]
+        self.reject = self.state_ids["reject"]
+        self.class_map = CharClassMap()
+        #bytes.translate table for UTF-8 input, non-ASCII bytes are only valid inside strings
+        self.byte_classes = bytes(CharClass.classify(chr(code)) if code < 128 else CharClass.OTHER for code in range(256))
+
+        #lookahead sets, indexed by the class of the next character (or END)
+        delims = [CharClass.LBRACE, CharClass.RBRACE, CharClass.LBRACK, CharClass.RBRACK, CharClass.COLON,
+                  CharClass.COMMA, CharClass.T, CharClass.F, CharClass.N, CharClass.QUOTE]
+        self.delim = self.lookahead_set(delims)
+        self.separator = self.lookahead_set(delims + [CharClass.WHITESPACE])
+        self.separator_or_end = self.lookahead_set(delims + [CharClass.WHITESPACE, CharClass.END])
+
+        self.digit_states = {self.state_ids["num0"], self.state_ids["flt"]} #states that loop on digits
+
+        rejected = (Action.REJECT, self.reject, None, None)
+        self.table = [[rejected] * CharClass.COUNT for _ in self.states]
+        self.build()
+
+    def lookahead_set(self, classes):
+        return bytes(1 if cls in classes else 0 for cls in range(CharClass.END + 1))
+
+    def on(self, state, classes, action, target=None, token_type=None, lookahead=None):
+        state_id = self.state_ids[state]
+        target_id = self.state_ids[target] if target is not None else state_id
+        for cls in classes:
+            self.table[state_id][cls] = (action, target_id, token_type, lookahead)
+
+    #fill in the table one state at a time, following the branches of DFA.transition
+    def build(self):
+        digits = [CharClass.ZERO, CharClass.DIGIT]
+
+        self.on("start", [CharClass.LBRACE], Action.EMIT, "start", TokenType.LBRACE)
+        self.on("start", [CharClass.RBRACE], Action.EMIT, "start", TokenType.RBRACE)
+        self.on("start", [CharClass.LBRACK], Action.EMIT, "start", TokenType.LBRACK)
+        self.on("start", [CharClass.RBRACK], Action.EMIT, "start", TokenType.RBRACK)
+        self.on("start", [CharClass.COLON], Action.EMIT, "start", TokenType.COLON)
+        self.on("start", [CharClass.COMMA], Action.EMIT, "start", TokenType.COMMA)
+        self.on("start", [CharClass.T], Action.MOVE, "t0")
+        self.on("start", [CharClass.F], Action.MOVE, "f0")
+        self.on("start", [CharClass.N], Action.MOVE, "n0")
+        self.on("start", [CharClass.QUOTE], Action.MOVE, "str0")
+        self.on("start", [CharClass.MINUS], Action.MOVE, "m")
+        #a single digit as the very last character is tokenized too, DFA.transition has no next char to check there
+        self.on("start", [CharClass.ZERO], Action.LOOKAHEAD, "z", TokenType.INTEGER, self.separator_or_end)
+        self.on("start", [CharClass.DIGIT], Action.LOOKAHEAD, "num0", TokenType.INTEGER, self.separator_or_end)
+
+        self.on("str0", range(CharClass.COUNT), Action.MOVE)
+        self.on("str0", [CharClass.QUOTE], Action.EMIT, "start", TokenType.STRING)
+
+        self.on("t0", [CharClass.R], Action.MOVE, "t1")
+        self.on("t1", [CharClass.U], Action.MOVE, "t2")
+        self.on("t2", [CharClass.E], Action.EMIT, "start", TokenType.TRUE)
+        self.on("f0", [CharClass.A], Action.MOVE, "f1")
+        self.on("f1", [CharClass.L], Action.MOVE, "f2")
+        self.on("f2", [CharClass.S], Action.MOVE, "f3")
+        self.on("f3", [CharClass.E], Action.EMIT, "start", TokenType.FALSE)
+        self.on("n0", [CharClass.U], Action.MOVE, "n1")
+        self.on("n1", [CharClass.L], Action.MOVE, "n2")
+        self.on("n2", [CharClass.L], Action.EMIT, "start", TokenType.NULL)
+
+        self.on("m", [CharClass.ZERO], Action.LOOKAHEAD, "z", TokenType.INTEGER, self.separator)
+        self.on("m", [CharClass.DIGIT], Action.LOOKAHEAD, "num0", TokenType.INTEGER, self.separator)
+
+        self.on("z", [CharClass.WHITESPACE], Action.EMIT_BEFORE, "start", TokenType.INTEGER)
+        self.on("z", [CharClass.DOT], Action.MOVE, "dec")
+
+        self.on("dec", digits, Action.LOOKAHEAD, "flt", TokenType.FLOAT, self.delim)
+
+        self.on("flt", digits, Action.LOOKAHEAD, "flt", TokenType.FLOAT, self.delim)
+        self.on("flt", [CharClass.WHITESPACE], Action.EMIT_BEFORE, "start", TokenType.FLOAT)
+
+        self.on("num0", [CharClass.DOT], Action.MOVE, "dec")
+        self.on("num0", digits, Action.LOOKAHEAD, "num0", TokenType.INTEGER, self.delim)
+        self.on("num0", [CharClass.WHITESPACE], Action.EMIT_BEFORE, "start", TokenType.INTEGER)
+
+    #map an input string (or UTF-8 bytes) to a bytes object holding one class code per character (or byte)
+    def classify(self, text):
+        if isinstance(text, str):
+            return text.translate(self.class_map).encode("latin-1")
+        return text.translate(self.byte_classes)
+
+#the table only depends on DFA.states, so every Lexer shares one copy
+COMPILED_DFA = CompiledDFA()
+
+CHUNK_SIZE = 1 << 16 #characters (or bytes) read at a time by Lexer.from_file and Lexer.from_mmap
+
+#module level aliases, Lexer.scan compares against these once per character
+MOVE, EMIT, EMIT_BEFORE, LOOKAHEAD = Action.MOVE, Action.EMIT, Action.EMIT_BEFORE, Action.LOOKAHEAD
+WHITESPACE, QUOTE, END = CharClass.WHITESPACE, CharClass.QUOTE, CharClass.END
+DIGITS = (CharClass.ZERO, CharClass.DIGIT)
+DIGIT_RUN = re.compile(b"[%c%c]*" % DIGITS) #matches a run of digits in the output of CompiledDFA.classify
+
 class LexerError(Exception):
     def __init__(self, pos, char):
+        self.pos = pos
+        self.char = char
         if char is not None and char != " ":
             super().__init__(f"Invalid character '{char}' at index {pos} of input")
         elif char is not None:
@@ -325,79 +577,231 @@ class LexerError(Exception):
             super().__init__(f"Unexpected end of input.")
 
 class Lexer:
-    def __init__(self, input_text):
-        self.input_text = input_text
+    def __init__(self, input_text, source=None, chunk_size=CHUNK_SIZE, strings=None):
+        self.input_text = input_text #with a source, this only holds the part of the input read so far
         self.position = 0
-        self.current_char = self.input_text[self.position] if self.input_text else None
-        #create forward pointer
-        self.next_char = self.input_text[self.position + 1] if len(self.input_text) > 1 else None
-        self.dfa = DFA()
-        
+        self.dfa = COMPILED_DFA
+        self.char_classes = self.dfa.classify(self.input_text) #one CharClass code per input character
+        self.source = source #file object the rest of the input is read from, chunk_size characters at a time
+        self.chunk_size = chunk_size
+        self.offset = 0 #index of input_text[0] in the whole input, used for error positions
+        self.at_end = source is None #true once input_text reaches the end of the input
+        self.error = None #the LexerError that stopped tokenize, if any
+        self.quote = '"' if isinstance(input_text, str) else b'"'
+        self.mapped = None #the whole memory-mapped input, set by from_mmap
+        self.strings = strings #StringTable the lexemes are interned in, if any
+        self.chunks = None #with a list, read_chunk also keeps every chunk it reads in it
+
+    #lex a text file in fixed-size chunks instead of reading it into memory first
+    @classmethod
+    def from_file(cls, file, chunk_size=CHUNK_SIZE, strings=None):
+        return cls("", file, chunk_size, strings)
+
+    @classmethod
+    def from_mmap(cls, file, chunk_size=CHUNK_SIZE, strings=None):
+        '''
+        Lex a file opened in binary mode straight from a read-only memory map of its UTF-8 bytes.
+        Only one chunk of bytes is copied at a time and nothing is decoded up front: lexemes are decoded
+        when a token is built or TokenBuffer.lexeme is called. Positions (errors, TokenBuffer offsets)
+        are byte offsets, and non-ASCII characters are only accepted inside strings.
+        '''
+        if os.fstat(file.fileno()).st_size == 0: #an empty file cannot be mapped
+            lexer = cls(b"", strings=strings)
+            lexer.mapped = b""
+            return lexer
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        lexer = cls(b"", mapped, chunk_size, strings)
+        lexer.mapped = mapped
+        return lexer
+
+    #release the memory map of from_mmap, after which neither the lexer nor a TokenBuffer over the map can be read
+    def close(self):
+        if isinstance(self.mapped, mmap.mmap):
+            self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    #current_char and the forward pointer next_char are read off self.position, so scan() only has to move that
+    @property
+    def current_char(self):
+        return self.char_at(self.position) if self.position < len(self.input_text) else None
+
+    @property
+    def next_char(self):
+        return self.char_at(self.position + 1) if self.position + 1 < len(self.input_text) else None
+
+    #the character at pos of input_text, for bytes the whole UTF-8 character starting there
+    def char_at(self, pos):
+        char = self.input_text[pos]
+        if isinstance(char, int):
+            #read from the map when there is one, the chunk may end in the middle of the character
+            text = self.input_text if self.mapped is None else self.mapped
+            pos = pos if self.mapped is None else self.offset + pos
+            char = text[pos:pos + 4].decode("utf-8", "replace")[0]
+        return char
+
+    #the decoded lexeme input_text[start:end]
+    def lexeme(self, start, end):
+        lexeme = decode(self.input_text[start:end])
+        return lexeme if self.strings is None else self.strings.intern(lexeme)
+
     def advance(self):
         self.position += 1
-        if self.position >= len(self.input_text):
-            self.current_char = None
-            self.next_char = None
-        elif self.position + 1 < len(self.input_text):
-            self.current_char = self.input_text[self.position]
-            self.next_char = self.input_text[self.position + 1]
-        else: #if at last char, set forward pointer to None
-            self.current_char = self.input_text[self.position]
-            self.next_char = None
-            
+
     def skip_whitespace(self):
         while self.current_char is not None and self.current_char.isspace():
             self.advance()
-            
-    def get_next_token(self):
-        token_value = ""
-        while self.current_char is not None:
-            curr_value = self.current_char
-            if self.current_char.isspace() and len(token_value) == 0: #dont skip whitespace if token is in progress
-                self.skip_whitespace()
-                continue
-            
-            token = self.dfa.transition(self.current_char, self.next_char, token_value) #final states return Token objects
-            if self.dfa.state == "reject":
-                raise LexerError(self.position, self.current_char)
-            
-            self.advance()
-            token_value += curr_value            
-            
-            #if state is final, return token 
-            if token is not None:
-                return token
-        
-        #if last character in file was a number, return the number as a token before returning EOF token
+
+    def read_chunk(self):
+        '''
+        Drop everything before self.position and append the next chunk from the source.
+        The unfinished token is kept, and the read grows with it so a huge token is rescanned only a few times.
+        '''
+        chunk = self.source.read(max(self.chunk_size, len(self.input_text) - self.position))
+        if not chunk:
+            self.at_end = True
+        if self.chunks is not None:
+            self.chunks.append(chunk)
+        self.offset += self.position
+        self.input_text = self.input_text[self.position:] + chunk
+        self.char_classes = self.char_classes[self.position:] + self.dfa.classify(chunk)
+        self.position = 0
+
+    def scan(self):
+        '''
+        Run the compiled DFA from self.position and return (token type, start, end) of the next token,
+        where input_text[start:end] is its lexeme. Raises LexerError where DFA.transition would reject.
+        Returns None, with self.position at the start of the token, if the token runs past the end of
+        input_text and more input can still be read.
+        '''
+        classes = self.char_classes
+        length = len(classes)
+        pos = self.position
+        while pos < length and classes[pos] == WHITESPACE:
+            pos += 1
+        start = self.position = pos
+        #fast path for strings: jump straight to the closing quote, there are no escapes in the grammar
+        if pos < length and classes[pos] == QUOTE:
+            end = self.input_text.find(self.quote, pos + 1) + 1
+            if end == 0:
+                if not self.at_end:
+                    return None
+                self.position = length
+                raise LexerError(self.offset + length, None)
+            self.position = end
+            return TokenType.STRING, start, end
+        table = self.dfa.table
+        state = self.dfa.start
+        digit_states = self.dfa.digit_states
+
+        while pos < length:
+            action, target, token_type, lookahead = table[state][classes[pos]]
+            if action == MOVE:
+                state = target
+                pos += 1
+            elif action == EMIT:
+                self.position = pos + 1
+                return token_type, start, pos + 1
+            elif action == LOOKAHEAD:
+                pos += 1
+                if pos == length and not self.at_end: #the lookahead character has not been read yet
+                    self.position = start
+                    return None
+                if lookahead[classes[pos] if pos < length else END]:
+                    self.position = pos
+                    return token_type, start, pos
+                state = target
+                #inside a digit run every lookahead is another digit, so skip to the last digit of the run
+                if state in digit_states and pos + 1 < length and classes[pos] in DIGITS and classes[pos + 1] in DIGITS:
+                    pos = DIGIT_RUN.match(classes, pos).end() - 1
+            elif action == EMIT_BEFORE:
+                self.position = pos + 1
+                return token_type, start, pos
+            else:
+                self.position = pos
+                raise LexerError(self.offset + pos, self.char_at(pos))
+
+        if not self.at_end:
+            return None
+        self.position = pos
+        if pos == start:
+            return TokenType.EOF, pos, pos
+        return self.finish_token(start, pos), start, pos
+
+    #ran out of input in the middle of a token, decide if what was read is still a valid number
+    def finish_token(self, start, end):
+        token_value = self.lexeme(start, end)
         if token_value.isnumeric():
-            return Token(TokenType.INTEGER, token_value)
-        
-        #check for negative integer in progress: 
-        elif ( len(token_value) > 1 and token_value[0] == "m" and token_value[1:].isnumeric() ):
-            return Token(TokenType.INTEGER, token_value)
-        
+            return TokenType.INTEGER
+        #check for negative integer in progress:
+        if len(token_value) > 1 and token_value[0] == "m" and token_value[1:].isnumeric():
+            return TokenType.INTEGER
         #check for float in progress:
-        elif "." in token_value and token_value.replace(".", "").isnumeric():
-            return Token(TokenType.FLOAT, token_value)
-        
-        #check if non-finalized token in progress:
-        elif len(token_value) > 0:
-            raise LexerError(self.position, self.current_char)
-    
-        return Token(TokenType.EOF)
-       
-    def tokenize(self):
-        tokens = []
+        if "." in token_value and token_value.replace(".", "").isnumeric():
+            return TokenType.FLOAT
+        raise LexerError(self.offset + end, None)
+
+    #scan the next token, reading more of the source until it fits in input_text
+    def next_span(self):
+        span = self.scan()
+        while span is None:
+            self.read_chunk()
+            span = self.scan()
+        return span
+
+    def get_next_token(self):
+        token_type, start, end = self.next_span()
+        return Token.from_span(self.input_text, token_type, start, end, self.strings)
+
+    #generator version of tokenize, only holds the current chunk of the input in memory
+    def iter_tokens(self):
         while True:
             try:
                 token = self.get_next_token()
             except LexerError as e:
+                self.error = e
                 print(f"Lexical Error: {e}")
-                break
-            
-            tokens.append(token)
-            
+                return
+
+            yield token
+
             if token.type == TokenType.EOF:
+                return
+
+    def tokenize(self):
+        return list(self.iter_tokens())
+
+    def tokenize_buffer(self):
+        '''
+        Tokenize into a TokenBuffer instead of a list of Token objects. The whole input is kept as its source:
+        the memory map for from_mmap, otherwise the text, joined from its chunks once they are lexed (up to the
+        chunk a lexical error is in). Either way the input is still lexed one chunk at a time.
+        '''
+        if self.mapped is None:
+            self.chunks = [self.input_text[self.position:]]
+            buffer = TokenBuffer(None, self.strings)
+            origin = self.offset + self.position
+        else:
+            buffer = TokenBuffer(self.mapped, self.strings)
+            origin = 0
+        while True:
+            try:
+                token_type, start, end = self.next_span()
+            except LexerError as e:
+                self.error = e
+                print(f"Lexical Error: {e}")
                 break
-            
-        return tokens
\ No newline at end of file
+
+            buffer.append(token_type, self.offset - origin + start, self.offset - origin + end)
+
+            if token_type == TokenType.EOF:
+                break
+
+        if self.mapped is None:
+            buffer.source = self.input_text[:0].join(self.chunks)
+            self.chunks = None
+        return buffer
\ No newline at end of file
@@ -0,0 +1,290 @@
+'''
+Long-running local compile service, for tools that check many small documents and cannot pay for starting
+an interpreter each time.
+
+The server listens on a Unix socket (or a localhost TCP port) and speaks JSON lines: each request is one line
+holding an object, and each gets one line back, in the order the requests came in on that connection, so a
+client can send many requests before reading the responses. A request is
+    {"id": any, "text": document, "tokens": false, "tree": true, "validate": false}
+where everything but "text" is optional: "tokens" asks for the token stream, "tree" (on by default) for the
+parse tree, and "validate" only checks the document (no tree, see Parser.validate). The response is
+    {"id": ..., "tokens": [...], "tree": [...], "errors": [...], "report": [...]}
+with the token stream and parse tree lines as compile_file writes them, the lexical and parsing error
+messages, and the error report that ends a _parse_tree; or {"id": ..., "failure": message} if the document
+could not be compiled. {"metrics": true} gets the service's counters and latency percentiles instead.
+
+Documents are compiled on a pool of worker processes that is started, and warmed up, with the server.
+Requests from all connections go through one bounded queue, and are handed to the workers in batches of
+whatever is queued at the time (up to batch_size), so a busy service makes one round trip to a worker per
+batch rather than per request, while a quiet one sends each request on at once. When the queue is full, or a
+client has too many responses it has not read yet, connections are not read from until there is room again.
+'''
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from docstream import lex_document
+from parser import Parser
+
+QUEUE_SIZE = 1024 #requests waiting for a worker, and responses waiting for their client, per connection
+BATCH_SIZE = 32
+LATENCY_WINDOW = 10000 #latencies kept for the percentiles
+MAX_REQUEST = 64 * 1024 * 1024 #bytes in one request line
+WINDOW = QUEUE_SIZE // 2 #requests a Client sends ahead of the responses it has read
+
+def compile_text(request):
+    #response to one request, without its id
+    tokens, lexical_error = lex_document(request["text"])
+    errors = [] if lexical_error is None else [f"Lexical Error: {lexical_error}"]
+    response = {}
+    if request.get("tokens", False):
+        response["tokens"] = [str(token) for token in tokens]
+    parser = Parser(tokens)
+    if request.get("validate", False):
+        response["errors"] = errors + parser.validate()
+        return response
+    tree, report = parser.parse()
+    if request.get("tree", True):
+        response["tree"] = tree
+    response["errors"] = errors + parser.error_list
+    response["report"] = report
+    return response
+
+#runs in a worker process: the responses to a batch of requests, with how long the batch took to compile
+def compile_batch(requests):
+    start = time.perf_counter()
+    responses = []
+    for request in requests:
+        try:
+            response = compile_text(request)
+        except Exception as e: #the parser's error recovery does not get through every input
+            response = {"failure": f"{type(e).__name__}: {e}"}
+        responses.append(response)
+    return responses, time.perf_counter() - start
+
+#run once in each worker process, so the first requests do not pay for imports and first-call setup
+def warm_up():
+    compile_text({"text": '{"warm": [1, 2.5, "up", true, false, null]}', "tokens": True})
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {}
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99), "max_ms": ordered[-1] * 1000}
+
+class CompileService:
+    def __init__(self, workers=None, batch_size=BATCH_SIZE, queue_size=QUEUE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.pool = None
+        self.queue = None #(request, future, time queued), created in start to belong to the running loop
+        self.slots = None #batches that may be running at once, two per worker
+        self.started = time.time()
+        self.requests = 0
+        self.with_errors = 0
+        self.failures = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW) #from reading a request to its response being ready
+        self.compile_times = deque(maxlen=LATENCY_WINDOW) #time spent in the worker, per batch
+        self.running = set() #batch tasks, referenced until they are done
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        #start every worker now rather than on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, warm_up) for _ in range(self.workers)])
+        self.batcher = asyncio.create_task(self.dispatch())
+
+    def close(self):
+        self.batcher.cancel()
+        self.pool.shutdown(cancel_futures=True)
+
+    async def dispatch(self):
+        #take what is queued in batches and hand them to the pool
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await self.slots.acquire()
+            task = asyncio.create_task(self.run_batch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            responses, elapsed = await loop.run_in_executor(self.pool, compile_batch, [request for request, _, _ in batch])
+        except Exception as e: #a worker process died
+            responses, elapsed = [{"failure": f"{type(e).__name__}: {e}"}] * len(batch), 0.0
+        finally:
+            self.slots.release()
+        self.batches += 1
+        self.compile_times.append(elapsed)
+        now = time.perf_counter()
+        for (request, future, queued), response in zip(batch, responses):
+            self.requests += 1
+            self.with_errors += bool(response.get("errors"))
+            self.failures += "failure" in response
+            self.latencies.append(now - queued)
+            if not future.done():
+                future.set_result(dict(response, id=request.get("id")))
+
+    def metrics(self):
+        return {"uptime_s": time.time() - self.started, "workers": self.workers, "requests": self.requests,
+                "with_errors": self.with_errors, "failures": self.failures, "batches": self.batches,
+                "mean_batch": self.requests / self.batches if self.batches else 0.0, "queued": self.queue.qsize(),
+                "latency": percentiles(self.latencies), "batch_compile": percentiles(self.compile_times)}
+
+    async def handle(self, reader, writer):
+        #read requests from one connection, its responses are written by write_responses in the same order
+        loop = asyncio.get_running_loop()
+        pending = asyncio.Queue(self.queue_size)
+        responder = asyncio.create_task(self.write_responses(pending, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError: #longer than MAX_REQUEST
+                    await pending.put(self.answer(loop, {"failure": "request too long"}))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict) or not (request.get("metrics") or isinstance(request.get("text"), str)):
+                        raise ValueError("a request needs a text")
+                except ValueError as e:
+                    await pending.put(self.answer(loop, {"failure": f"bad request: {e}"}))
+                    continue
+                if request.get("metrics"):
+                    await pending.put(self.answer(loop, dict(self.metrics(), id=request.get("id"))))
+                    continue
+                future = loop.create_future()
+                await pending.put(future)
+                await self.queue.put((request, future, time.perf_counter()))
+        finally:
+            await pending.put(None)
+            await responder
+
+    @staticmethod
+    def answer(loop, response):
+        future = loop.create_future()
+        future.set_result(response)
+        return future
+
+    async def write_responses(self, pending, writer):
+        try:
+            while True:
+                future = await pending.get()
+                if future is None:
+                    break
+                writer.write(json.dumps(await future).encode() + b"\n")
+                if pending.empty():
+                    await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+async def serve(socket_path=None, port=None, workers=None, batch_size=BATCH_SIZE, ready=None):
+    '''
+    Run the service until cancelled, on a Unix socket at socket_path or on localhost:port.
+    ready is an optional callable, called once the pool is warm and the server is listening.
+    '''
+    service = CompileService(workers, batch_size)
+    await service.start()
+    try: #on SIGTERM, shut down the pool and remove the socket as on Ctrl-C
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, RuntimeError): #no signal handlers on Windows, or outside the main thread
+        pass
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(service.handle, socket_path, limit=MAX_REQUEST)
+    else:
+        server = await asyncio.start_server(service.handle, "127.0.0.1", port, limit=MAX_REQUEST)
+    try:
+        async with server:
+            if ready is not None:
+                ready()
+            await server.serve_forever()
+    finally:
+        service.close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+class Client:
+    '''
+    Blocking client for the service: Client(socket_path) or Client(port=...). compile_many keeps up to
+    WINDOW requests ahead of the responses it has read, so a batch of documents costs about one round trip
+    (and never more requests than the service takes before it stops reading).
+    Requests are numbered in order over the client's life, and each response has its request's number as its id.
+    '''
+    def __init__(self, socket_path=None, port=None):
+        if socket_path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+        else:
+            self.socket = socket.create_connection(("127.0.0.1", port))
+        self.file = self.socket.makefile("rwb")
+        self.next_id = 0 #id of the next request, counted over all calls so responses can be told apart
+
+    def compile_many(self, texts, **options):
+        #options are the request fields other than text: tokens, tree, validate
+        responses = []
+        sent = 0
+        while len(responses) < len(texts):
+            if sent - len(responses) <= WINDOW // 2 and sent < len(texts):
+                for index in range(sent, min(len(texts), len(responses) + WINDOW)):
+                    request = dict(options, id=self.next_id + index, text=texts[index])
+                    self.file.write(json.dumps(request).encode() + b"\n")
+                    sent += 1
+                self.file.flush()
+            responses.append(json.loads(self.file.readline()))
+        self.next_id += len(texts)
+        return responses
+
+    def compile(self, text, **options):
+        return self.compile_many([text], **options)[0]
+
+    def metrics(self):
+        self.file.write(b'{"metrics": true}\n')
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Serve compile requests (JSON lines) from a pool of warm worker processes.")
+    address = arg_parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", default=None, help="Unix socket path to listen on")
+    address.add_argument("--port", type=int, default=None, help="localhost TCP port to listen on")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="most requests sent to a worker at once")
+    args = arg_parser.parse_args(argv)
+    where = args.socket if args.socket is not None else f"127.0.0.1:{args.port}"
+    try:
+        asyncio.run(serve(args.socket, args.port, args.jobs, args.batch_size,
+                          ready=lambda: print(f"Listening on {where}", flush=True)))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+'''
+compile_file must give the same outputs for an input streamed from the lexer into the parser as from a TokenBuffer,
+and its _tree_index must follow the input, through the cache too. A cache used outside of a batch stays in its bound.
+Run from the repository root with: python -m unittest discover tests
+'''
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import compiler
+from cache import ArtifactCache
+
+DOCUMENTS = [
+    "[" + ", ".join(f'{{"k": [{index}, 1.5, "v"]}}' for index in range(40)) + "]",
+    '{"a": [1, 2, }, "b": null, "c": {"d" 3}}', #parsing errors, with panic mode
+    '{"a": [1, 2], "b": nul}', #a lexical error
+    '[true, false',
+]
+
+class StreamTest(unittest.TestCase):
+    def compile_both(self, text, use_mmap):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "doc.txt")
+            with open(file_name, "w") as file:
+                file.write(text)
+            results = []
+            for stream_size in [compiler.STREAM_SIZE, 0]:
+                with mock.patch.object(compiler, "STREAM_SIZE", stream_size), \
+                     contextlib.redirect_stdout(io.StringIO()) as printed:
+                    errors = compiler.compile_file(file_name, echo=False, use_mmap=use_mmap)
+                outputs = []
+                for suffix in ["_token_stream", "_parse_tree"]:
+                    with open(file_name + suffix) as file:
+                        outputs.append(file.read())
+                results.append((errors, printed.getvalue(), outputs))
+            return results
+
+    def test_streamed_outputs(self):
+        for text in DOCUMENTS:
+            for use_mmap in [False, True]:
+                with self.subTest(text=text, use_mmap=use_mmap):
+                    buffered, streamed = self.compile_both(text, use_mmap)
+                    self.assertEqual(buffered, streamed)
+
+class TreeIndexTest(unittest.TestCase):
+    def test_index_follows_the_input(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "doc.txt")
+            index_name = f"{file_name}_tree_index"
+            cache = ArtifactCache(os.path.join(directory, "cache"))
+            indexes = []
+            #compiled, served from the cache, then the same for a version with errors and back to the first one
+            for text in [DOCUMENTS[0], DOCUMENTS[0], DOCUMENTS[1], DOCUMENTS[1], DOCUMENTS[0]]:
+                with open(file_name, "w") as file:
+                    file.write(text)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    errors = compiler.compile_file(file_name, echo=False, cache=cache, tree_index=True)
+                self.assertEqual(os.path.exists(index_name), not errors)
+                if not errors:
+                    with open(index_name, "rb") as file:
+                        indexes.append(file.read())
+            self.assertEqual(cache.hits, 3)
+            self.assertEqual(indexes, [indexes[0]] * 3)
+
+class CacheTest(unittest.TestCase):
+    def test_bounded_without_a_batch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ArtifactCache(os.path.join(directory, "cache"))
+            entries = []
+            for index in range(3):
+                text = DOCUMENTS[0].replace("1.5", f"{index}.5") #entries of the same size
+                file_name = os.path.join(directory, f"doc{index}.txt")
+                with open(file_name, "w") as file:
+                    file.write(text)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    compiler.compile_file(file_name, echo=False, cache=cache)
+                entries.append(os.path.join(cache.directory, cache.key(file_name)))
+                if index == 0: #room for about one entry
+                    cache.max_bytes = sum(item.stat().st_size for item in os.scandir(entries[0])) + 64
+            self.assertEqual([os.path.isdir(entry) for entry in entries], [False, False, True])
+
+if __name__ == "__main__":
+    unittest.main()
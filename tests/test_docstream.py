@@ -0,0 +1,20 @@
+'''
+Each document of a stream must get the same verdict with values as with errors only (--stream with --validate).
+Run from the repository root with: python -m unittest discover tests
+'''
+import io
+import unittest
+from docstream import iter_documents
+
+#a number the lexer takes but int() does not, a valid document, an error and a document with an Arabic-Indic digit
+STREAM = '[²]\n[1, {"a": null}]\n[1, 2\n{"a": ٣}\n'
+
+class VerdictTest(unittest.TestCase):
+    def test_values_and_errors_agree(self):
+        values = [document.errors for document in iter_documents(io.StringIO(STREAM), output="values")]
+        errors = [document.errors for document in iter_documents(io.StringIO(STREAM), output="errors")]
+        self.assertEqual(values, errors)
+        self.assertEqual([bool(document_errors) for document_errors in values], [True, False, True, False])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+'''
+Document.edit must give the same tokens, tree and errors as lexing and parsing the new text from scratch.
+Run from the repository root with: python -m unittest discover tests
+'''
+import contextlib
+import io
+import random
+import unittest
+from incremental import Document
+from parser import Parser
+from scanner import Lexer
+
+#edits of documents with a leftover token after them, which the parser lets through without an error
+LEFTOVER_EDITS = [("[1], 2]", 5, 6, "3"), ("[true], true]", 12, 12, ""), ("[1, 2], 3]", 8, 9, "4")]
+
+START = '{"a": [1, 2, {"b": null}], "c": "d", "e": [true, false]}'
+PIECES = ["1", "2.5", "-3", '"s"', "true", "null", ", ", ": ", "[", "]", "{", "}", '{"k": 1}', "[1, 2]", " "]
+
+class EditTest(unittest.TestCase):
+    #returns False if the parser fails on the new text, from scratch and in edit() alike
+    def check(self, document, start, end, new_text):
+        text = document.text[:start] + new_text + document.text[end:]
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected_tokens = Lexer(text).tokenize_buffer()
+            parser = Parser(expected_tokens)
+            try:
+                expected_tree = parser.parse()[0]
+            except Exception as e:
+                self.assertRaises(type(e), document.edit, start, end, new_text)
+                return False
+            tokens, tree, errors = document.edit(start, end, new_text)
+        self.assertEqual([(tokens.kinds[index], tokens.start(index), tokens.end(index)) for index in range(len(tokens))],
+                         [(expected_tokens.kinds[index], expected_tokens.starts[index], expected_tokens.ends[index])
+                          for index in range(len(expected_tokens))])
+        self.assertEqual(tree, expected_tree)
+        self.assertEqual(errors, [f"Lexical Error: {error}" for error in [document.lex_error] if error] + parser.error_list)
+        return True
+
+    def test_leftover_token(self):
+        for text, start, end, new_text in LEFTOVER_EDITS:
+            with self.subTest(text=text):
+                document = Document(text)
+                self.assertTrue(self.check(document, start, end, new_text))
+                self.assertTrue(self.check(document, 1, 2, "7")) #and an edit after that
+
+    def test_random_edits(self):
+        generator = random.Random(12)
+        for _ in range(50):
+            document = Document(START)
+            for _ in range(20):
+                start = generator.randrange(len(document.text) + 1)
+                end = min(len(document.text), start + generator.randrange(4))
+                if not self.check(document, start, end, generator.choice(PIECES)):
+                    document = Document(START) #edit() stopped part way
+
+if __name__ == "__main__":
+    unittest.main()
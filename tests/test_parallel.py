@@ -0,0 +1,42 @@
+'''
+Split mode (compile_file with a process pool) must give the same outputs as the sequential path.
+Run from the repository root with: python -m unittest discover tests
+'''
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from compiler import compile_file
+
+#a group of this list has a stray } that the parser's error recovery fails on when the group is parsed alone,
+#while the whole document parses, with errors
+GROUP_FAILS = '[true, {"k": 1}, true, {"k": 1}, }, [1, 2], true, [1, 2], true, {"k": 1}, true, true]'
+
+class SplitTest(unittest.TestCase):
+    def compile_both(self, text):
+        with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(max_workers=2) as executor:
+            file_name = os.path.join(directory, "doc.txt")
+            with open(file_name, "w") as file:
+                file.write(text)
+            results = []
+            for pool in [None, executor]:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    errors = compile_file(file_name, write_token_stream=False, echo=False, executor=pool, workers=2)
+                with open(f"{file_name}_parse_tree") as file:
+                    results.append((errors, file.read()))
+            return results
+
+    def test_group_the_parser_fails_on(self):
+        sequential, split = self.compile_both(GROUP_FAILS)
+        self.assertTrue(sequential[0])
+        self.assertEqual(sequential, split)
+
+    def test_valid_document(self):
+        sequential, split = self.compile_both("[" + ", ".join(f'{{"k": [{index}, "v"]}}' for index in range(40)) + "]")
+        self.assertEqual(sequential[0], [])
+        self.assertEqual(sequential, split)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+'''
+load must read text files, binary files and binary file objects without a file descriptor alike,
+and release the memory map of a binary file. A token stream cut short by a lexical error must get the same
+error messages from a token list, a TokenBuffer and StreamedTokens as from the text of a _token_stream file.
+Run from the repository root with: python -m unittest discover tests
+'''
+import contextlib
+import io
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+from parser import Parser, StreamedTokens, load, loads
+from scanner import Lexer
+
+DOCUMENT = '{"a": [1, 2.5, "x"], "b": null, "c": [true, false], "d": {"e": "f"}}'
+
+class LoadTest(unittest.TestCase):
+    def test_file_objects(self):
+        self.assertEqual(load(io.StringIO(DOCUMENT)), loads(DOCUMENT))
+        self.assertEqual(load(io.BytesIO(DOCUMENT.encode())), loads(DOCUMENT))
+        self.assertEqual(load(io.BytesIO(DOCUMENT.encode()), numeric_arrays=True), loads(DOCUMENT, numeric_arrays=True))
+
+    def test_memory_map_released(self):
+        lexers = []
+        from_mmap = Lexer.from_mmap
+        def recorded(*args, **kwargs):
+            lexers.append(from_mmap(*args, **kwargs))
+            return lexers[-1]
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "doc.txt")
+            with open(file_name, "w") as file:
+                file.write(DOCUMENT)
+            with open(file_name, "rb") as file, mock.patch.object(Lexer, "from_mmap", recorded):
+                self.assertEqual(load(file), loads(DOCUMENT))
+        self.assertTrue(lexers[0].mapped.closed)
+
+#pieces of documents with lexical errors, joined at random
+PIECES = ['"a"', "}", "{", "[", "]", ":", ",", "false", "true", "null", "2.5", "12", " ", "x", "2.52.5", "-", '"b',
+          "[1]", '{"k": 1}']
+
+class TruncatedStreamTest(unittest.TestCase):
+    #the error messages of a parse, without the "Errors:" heading, which only some ends of parsing add
+    def messages(self, token_stream):
+        return [error for error in Parser(token_stream).parse()[1] if error != "Errors:\n"]
+
+    def test_same_messages(self):
+        generator = random.Random(5)
+        texts = ['"a"}false2.52.5  "a" ]'] + ["".join(generator.choice(PIECES) for _ in range(generator.randrange(1, 9)))
+                                              for _ in range(2000)]
+        for text in texts:
+            with contextlib.redirect_stdout(io.StringIO()):
+                tokens = Lexer(text).tokenize()
+                try:
+                    expected = self.messages(Lexer(text).tokenize_buffer())
+                except Exception as e: #at most one token before the error, the parser fails on every path alike
+                    self.assertRaises(type(e), self.messages, tokens)
+                    self.assertRaises(type(e), self.messages, StreamedTokens(Lexer(text)))
+                    continue
+                self.assertEqual(self.messages(tokens), expected, text)
+                self.assertEqual(self.messages(StreamedTokens(Lexer(text))), expected, text)
+                token_stream = "".join(str(token) + ("" if token.type == "EOF" else "\n") for token in tokens)
+                try:
+                    from_text = self.messages(token_stream)
+                except Exception: #the empty line after the last token of a text stream has no type, it can crash
+                    continue
+            self.assertEqual(from_text, expected, text)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.messages(Lexer(texts[0]).tokenize_buffer()),
+                             ["Reached end of parsing with 2 unparsed tokens remaining"])
+
+if __name__ == "__main__":
+    unittest.main()
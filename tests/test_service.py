@@ -0,0 +1,35 @@
+'''
+The service must run in an event loop outside the main thread, and a Client's responses must have distinct ids.
+Run from the repository root with: python -m unittest discover tests
+'''
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from service import Client, serve
+
+class ServiceTest(unittest.TestCase):
+    def test_off_the_main_thread(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "service.sock")
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            task = loop.create_task(serve(socket_path, workers=1, ready=ready.set))
+            thread = threading.Thread(target=lambda: loop.run_until_complete(asyncio.wait([task])))
+            thread.start()
+            try:
+                self.assertTrue(ready.wait(30))
+                client = Client(socket_path)
+                responses = [client.compile('{"a": [1, 2]}'), client.compile("[true"), *client.compile_many(["1", "2"])]
+                client.close()
+            finally:
+                loop.call_soon_threadsafe(task.cancel)
+                thread.join()
+                loop.close()
+            self.assertEqual([response["id"] for response in responses], [0, 1, 2, 3])
+            self.assertEqual(responses[0]["errors"], [])
+            self.assertTrue(responses[1]["errors"])
+
+if __name__ == "__main__":
+    unittest.main()
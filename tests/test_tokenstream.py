@@ -0,0 +1,43 @@
+'''
+A binary token stream must give the same tokens as the text it was written from, and closing it (or leaving its
+with block) must release the memory map, also when the file turns out not to be a binary token stream.
+Run from the repository root with: python -m unittest discover tests
+'''
+import os
+import tempfile
+import unittest
+from unittest import mock
+import tokenstream
+from scanner import Lexer
+from tokenstream import load_binary, write_binary
+
+DOCUMENT = '{"a": [1, 2.5, "x"], "b": null, "c": [true, false], "d": {"e": "f"}}'
+
+class CloseTest(unittest.TestCase):
+    def test_with_block(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "doc_token_stream.bin")
+            with open(file_name, "wb") as file:
+                write_binary(Lexer(DOCUMENT).tokenize_buffer(), file)
+            with load_binary(file_name) as tokens:
+                self.assertEqual([repr(token) for token in tokens],
+                                 [repr(token) for token in Lexer(DOCUMENT).tokenize()])
+            self.assertTrue(tokens.source.closed)
+            self.assertRaises(ValueError, len, tokens.kinds) #the views are released too
+
+    def test_not_a_token_stream(self):
+        maps = []
+        mmap_type = tokenstream.mmap.mmap
+        def recorded(*args, **kwargs):
+            maps.append(mmap_type(*args, **kwargs))
+            return maps[-1]
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "doc.txt")
+            with open(file_name, "w") as file:
+                file.write(DOCUMENT)
+            with mock.patch.object(tokenstream.mmap, "mmap", recorded):
+                self.assertRaises(ValueError, load_binary, file_name)
+        self.assertTrue(maps[0].closed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+'''
+IndexedTree.value must give what parser.loads gives, errors included.
+Run from the repository root with: python -m unittest discover tests
+'''
+import tempfile
+import unittest
+from parser import ParseError, loads
+from scanner import Lexer
+from treeindex import IndexedTree, write_index
+
+class ValueTest(unittest.TestCase):
+    def tree(self, text):
+        #IndexedTree maps a file, so the index goes through a temporary one
+        with tempfile.TemporaryFile() as file:
+            write_index(Lexer(text).tokenize_buffer(), file)
+            file.seek(0)
+            return IndexedTree(file)
+
+    def test_values(self):
+        text = '{"a": [1, -2, 3.5, "x"], "b": {"c": null, "d": true}}'
+        self.assertEqual(self.tree(text).value(), loads(text))
+
+    def test_number_without_a_value(self):
+        text = '{"a": [1, ²], "b": 2.5}'
+        tree = self.tree(text)
+        with self.assertRaises(ParseError) as raised:
+            loads(text)
+        with self.assertRaises(ParseError) as indexed:
+            tree.value()
+        self.assertEqual(str(indexed.exception), str(raised.exception))
+        self.assertEqual(tree.value(tree.lookup("b")), 2.5)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+'''
+Binary token stream format, and conversion from and to the text format of _token_stream files.
+
+Layout, all integers little-endian:
+    magic       8 bytes, b"TOKS" and the format version
+    count       8 bytes, number of tokens N
+    width       8 bytes, size of each offset: 4, or 8 for files of 4 GB and up
+    kinds       N bytes, the scanner.KIND_CODES code of each token, padded with zeros to a multiple of 8
+    offsets     N + 1 offsets into the file, token i's value is file[offsets[i]:offsets[i + 1]]
+    values      UTF-8 values of the number and string tokens, back to back (other tokens have empty values)
+
+A memory map of the file is read in place as a TokenBuffer (BinaryTokens): the map is the source, the kinds
+are a view of its bytes and the offsets a view of its offset array, so a Parser can read it without the
+stream being decoded or copied first. Values are only decoded when a token is built.
+'''
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from scanner import KIND_CODES, Token, TokenBuffer, TokenType
+
+MAGIC = b"TOKS\x00\x00\x00\x01"
+HEADER = struct.Struct("<8sQQ")
+OFFSET_TYPES = {4: "I", 8: "q"} #array and memoryview typecodes for each offset width
+VALUED_KINDS = {KIND_CODES[TokenType.INTEGER], KIND_CODES[TokenType.FLOAT], KIND_CODES[TokenType.STRING]}
+
+#one record of the text format: <{>, <number, 12>, <string, "a">, ...
+TEXT_RECORD = re.compile(r'\s*<(?:string, ("[^"]*")|number, ([^>]*)|([^>]+))>')
+
+#kind of each valueless record of the text format, by what is between the angle brackets
+TEXT_KINDS = {"{": TokenType.LBRACE, "}": TokenType.RBRACE, "[": TokenType.LBRACK, "]": TokenType.RBRACK,
+              ":": TokenType.COLON, ",": TokenType.COMMA, "true": TokenType.TRUE, "false": TokenType.FALSE,
+              "null": TokenType.NULL, "EOF": TokenType.EOF}
+
+def write_binary(tokens, file):
+    '''
+    Write an iterable of scanner.Token objects (such as a TokenBuffer) to a file opened in binary mode.
+    A stream cut short by a lexical error is written as it is, without an EOF, same as the text format.
+    '''
+    kinds = array("B")
+    offsets = array("q")
+    values = bytearray()
+    if isinstance(tokens, TokenBuffer): #values are the lexemes, copied without building tokens
+        kinds = tokens.kinds
+        source = tokens.source
+        for kind, start, end in zip(kinds, tokens.starts, tokens.ends):
+            offsets.append(len(values))
+            if kind in VALUED_KINDS:
+                lexeme = source[start:end]
+                values += lexeme if isinstance(lexeme, bytes) else lexeme.encode("utf-8")
+    else:
+        for token in tokens:
+            kinds.append(KIND_CODES[token.type])
+            offsets.append(len(values))
+            if token.value is not None:
+                values += str(token.value).encode("utf-8")
+    offsets.append(len(values))
+    count = len(kinds)
+    padding = -count % 8
+    width = 4 if HEADER.size + count + padding + 4 * (count + 1) + len(values) < 1 << 32 else 8
+    base = HEADER.size + count + padding + width * (count + 1)
+    offsets = array(OFFSET_TYPES[width], map(base.__add__, offsets))
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    file.write(HEADER.pack(MAGIC, count, width))
+    file.write(bytes(kinds) + bytes(padding))
+    file.write(offsets.tobytes())
+    file.write(values)
+
+class BinaryTokens(TokenBuffer):
+    '''
+    TokenBuffer over a memory map of a binary token stream file (opened in binary mode).
+    Raises ValueError if the file is not one. close() (or a with block) releases the map.
+    '''
+    def __init__(self, file):
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{file.name} is not a binary token stream")
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, width = HEADER.unpack_from(mapped)
+        offsets_start = HEADER.size + count + (-count % 8)
+        if magic != MAGIC or width not in OFFSET_TYPES or offsets_start + width * (count + 1) > size:
+            mapped.close()
+            raise ValueError(f"{file.name} is not a binary token stream")
+        super().__init__(mapped)
+        view = memoryview(mapped)
+        self.kinds = view[HEADER.size:HEADER.size + count]
+        offsets = view[offsets_start:offsets_start + width * (count + 1)]
+        if sys.byteorder == "little":
+            offsets = offsets.cast(OFFSET_TYPES[width])
+        else:
+            offsets = array(OFFSET_TYPES[width], offsets)
+            offsets.byteswap()
+        self.starts = offsets[:count]
+        self.ends = offsets[1:]
+
+    #release the views of the map and then the map, after which the tokens can no longer be read
+    def close(self):
+        for view in [self.kinds, self.starts, self.ends]:
+            if isinstance(view, memoryview):
+                view.release()
+        self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+#the BinaryTokens of a file, to be closed by the caller (or used in a with block)
+def load_binary(file_name):
+    with open(file_name, "rb") as file:
+        return BinaryTokens(file)
+
+def read_text(text):
+    '''
+    Generate the scanner.Token objects of a _token_stream file's text. Unlike Parser's reading of the
+    text format, string values may hold newlines and angle brackets. Numbers with a . are read as floats.
+    Raises ValueError at the first record that cannot be read.
+    '''
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        record = TEXT_RECORD.match(text, position)
+        if record is None or (record.group(3) is not None and record.group(3) not in TEXT_KINDS):
+            raise ValueError(f"unreadable token stream record at index {position}")
+        string, number, name = record.groups()
+        if string is not None:
+            yield Token(TokenType.STRING, string)
+        elif number is not None:
+            yield Token(TokenType.FLOAT if "." in number else TokenType.INTEGER, number)
+        else:
+            yield Token(TEXT_KINDS[name])
+        position = record.end()
+
+#write tokens in the text format, the same as compiler.compile_file does
+def write_text(tokens, file):
+    for token in tokens:
+        file.write(str(token))
+        if not token.type == TokenType.EOF:
+            file.write("\n")
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Convert _token_stream files between the text and binary formats.")
+    arg_parser.add_argument("files", nargs="+", help="token stream files to convert")
+    arg_parser.add_argument("--to-text", action="store_true",
+                            help="convert binary files (NAME.bin) back to text (NAME) instead")
+    args = arg_parser.parse_args(argv)
+    for file_name in args.files:
+        if args.to_text:
+            output_name = file_name[:-4] if file_name.endswith(".bin") else file_name + ".txt"
+            with open(output_name, "w") as output_file:
+                with load_binary(file_name) as tokens:
+                    write_text(tokens, output_file)
+        else:
+            output_name = file_name + ".bin"
+            with open(file_name) as file:
+                tokens = read_text(file.read())
+                with open(output_name, "wb") as output_file:
+                    write_binary(tokens, output_file)
+        print(f"{file_name} -> {output_name}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+'''
+Indexed parse tree format: the values of an error-free document as a table of nodes, for reading single
+keys or subtrees of a big tree without reading the rest of it.
+
+Every dict, list and scalar value is a node. Nodes are numbered breadth first, so the children of a node
+(its list elements or dict values, in document order) are the consecutive nodes
+first_child .. first_child + child_count - 1. The root is node 0.
+
+Layout, all integers little-endian:
+    magic           8 bytes, b"TREE" and the format version
+    count           8 bytes, number of nodes N
+    width           8 bytes, size of each offset: 4, or 8 for files or sources of 4 GB and up
+    kinds           N bytes, the scanner.KIND_CODES code of the token that starts each node
+                    (LBRACE for a dict, LBRACK for a list), padded with zeros to a multiple of 8
+    parents         N u32, the parent of each node (0xFFFFFFFF for the root)
+    first_children  N u32, the first child of each node (0 if it has none)
+    child_counts    N u32
+    by_key          N u32, the children of each dict again, sorted by key: by_key[first_child + i] is its
+                    i-th child in key order (duplicate keys in document order), other entries are unused
+    sources         N offsets, where each node starts in the source (byte offsets for a memory-mapped source)
+    key_offsets     N + 1 offsets into the file, node i's dict key is file[key_offsets[i]:key_offsets[i + 1]]
+    value_offsets   N + 1 offsets into the file, the same for the value of each string or number
+    texts           the UTF-8 keys and values, back to back (strings without their quotes)
+
+IndexedTree memory-maps a file and reads nodes in place: a lookup by path does a binary search of by_key
+for each dict on the way, so it reads a few pages of the file however big the tree is.
+'''
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from scanner import KIND_CODES, TOKEN_KINDS, TokenType
+from tokenstream import OFFSET_TYPES
+from parser import GRAMMAR_SYMBOLS, ParseError
+
+MAGIC = b"TREE\x00\x00\x00\x01"
+HEADER = struct.Struct("<8sQQ")
+NO_PARENT = 0xFFFFFFFF
+
+#node kind of each scanner kind code, as the parse tree labels them
+NODE_KINDS = [{TokenType.LBRACE: "dict", TokenType.LBRACK: "list"}.get(token_type, GRAMMAR_SYMBOLS[token_type])
+              for token_type in TOKEN_KINDS]
+
+LBRACE, RBRACE, LBRACK, RBRACK, COLON, COMMA, INTEGER, FLOAT, STRING, EOF = (KIND_CODES[token_type] for token_type in [
+    TokenType.LBRACE, TokenType.RBRACE, TokenType.LBRACK, TokenType.RBRACK, TokenType.COLON, TokenType.COMMA,
+    TokenType.INTEGER, TokenType.FLOAT, TokenType.STRING, TokenType.EOF])
+
+#one segment of a path: a quoted key, or anything up to the next dot (a key, or an index into a list)
+PATH_SEGMENT = re.compile(r'"([^"]*)"|([^."]+)')
+
+def little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+def write_index(tokens, file):
+    '''
+    Write the tree of a TokenBuffer to a file opened in binary mode.
+    The tokens must be a whole document without lexical or syntax errors (the parser's error recovery
+    has no place in the index). Raises ValueError for a stream cut short by a lexical error or with
+    unbalanced brackets.
+    '''
+    kinds = tokens.kinds
+    starts = tokens.starts
+    ends = tokens.ends
+    source = tokens.source
+    if len(kinds) == 0 or kinds[-1] != EOF:
+        raise ValueError("cannot index a token stream cut short by a lexical error")
+
+    #first pass, nodes in document order: kind, source start, parent, children, key span, value span
+    node_kinds = array("B")
+    node_starts = array("q")
+    parents = []
+    children = []
+    keys = []
+    values = []
+    stack = [] #open dicts and lists
+    key = None
+    in_dict = False #whether the innermost open container is a dict
+    for kind, start, end in zip(kinds[:-1], starts, ends):
+        if kind in [COMMA, COLON]:
+            continue
+        if kind in [RBRACE, RBRACK]:
+            if not stack:
+                raise ValueError("cannot index a document with syntax errors")
+            stack.pop()
+            in_dict = bool(stack) and node_kinds[stack[-1]] == LBRACE
+            continue
+        if in_dict and key is None:
+            if kind != STRING:
+                raise ValueError("cannot index a document with syntax errors")
+            key = (start + 1, end - 1)
+            continue
+        node = len(node_kinds)
+        if stack:
+            parent = stack[-1]
+            children[parent].append(node)
+        elif node:
+            raise ValueError("cannot index a document with syntax errors")
+        else:
+            parent = NO_PARENT
+        node_kinds.append(kind)
+        node_starts.append(start)
+        parents.append(parent)
+        children.append([])
+        keys.append(key)
+        key = None
+        if kind == STRING:
+            values.append((start + 1, end - 1))
+        elif kind in [INTEGER, FLOAT]:
+            values.append((start, end))
+        else:
+            values.append(None)
+            if kind in [LBRACE, LBRACK]:
+                stack.append(node)
+                in_dict = kind == LBRACE
+    if stack or not node_kinds:
+        raise ValueError("cannot index a document with syntax errors")
+
+    #number the nodes breadth first, so each node's children are consecutive
+    order = [0]
+    new_ids = [0] * len(node_kinds)
+    for node in order:
+        for child in children[node]:
+            new_ids[child] = len(order)
+            order.append(child)
+    count = len(order)
+    if count >= NO_PARENT:
+        raise ValueError("too many nodes to index")
+
+    first_children = array("I", bytes(4 * count))
+    child_counts = array("I", bytes(4 * count))
+    by_key = array("I", bytes(4 * count))
+    key_texts = []
+    value_texts = []
+    for new_id, node in enumerate(order):
+        node_children = children[node]
+        if node_children:
+            first = new_ids[node_children[0]]
+            first_children[new_id] = first
+            child_counts[new_id] = len(node_children)
+        key_texts.append(b"" if keys[node] is None else text_bytes(source, keys[node]))
+        value_texts.append(b"" if values[node] is None else text_bytes(source, values[node]))
+    for new_id, node in enumerate(order):
+        if node_kinds[node] == LBRACE and children[node]:
+            first = first_children[new_id]
+            ranked = sorted(range(first, first + child_counts[new_id]), key=key_texts.__getitem__)
+            by_key[first:first + len(ranked)] = array("I", ranked)
+
+    padding = -count % 8
+    text_size = sum(map(len, key_texts)) + sum(map(len, value_texts))
+    fixed_size = HEADER.size + count + padding + 16 * count
+    width = 4 if fixed_size + 4 * (3 * count + 2) + text_size < 1 << 32 and max(node_starts) < 1 << 32 else 8
+    text_start = fixed_size + width * (3 * count + 2)
+    key_offsets = array(OFFSET_TYPES[width], [text_start])
+    for text in key_texts:
+        key_offsets.append(key_offsets[-1] + len(text))
+    value_offsets = array(OFFSET_TYPES[width], [key_offsets[-1]])
+    for text in value_texts:
+        value_offsets.append(value_offsets[-1] + len(text))
+
+    file.write(HEADER.pack(MAGIC, count, width))
+    file.write(bytes(node_kinds[node] for node in order) + bytes(padding))
+    file.write(little_endian(array("I", (NO_PARENT if parents[node] == NO_PARENT else new_ids[parents[node]]
+                                         for node in order))))
+    file.write(little_endian(first_children))
+    file.write(little_endian(child_counts))
+    file.write(little_endian(by_key))
+    file.write(little_endian(array(OFFSET_TYPES[width], (node_starts[node] for node in order))))
+    file.write(little_endian(key_offsets))
+    file.write(little_endian(value_offsets))
+    file.write(b"".join(key_texts))
+    file.write(b"".join(value_texts))
+
+#UTF-8 bytes of a span of the source, which is text or the bytes of a memory map
+def text_bytes(source, span):
+    text = source[span[0]:span[1]]
+    return text if isinstance(text, bytes) else text.encode("utf-8")
+
+class IndexedTree:
+    '''
+    Reads a tree index file (opened in binary mode) in place from a memory map. Nodes are ints, 0 is the root.
+    Raises ValueError if the file is not a tree index.
+    '''
+    def __init__(self, file):
+        size = os.fstat(file.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError(f"{file.name} is not a tree index")
+        self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, width = HEADER.unpack_from(self.mapped)
+        position = HEADER.size + count + (-count % 8)
+        if magic != MAGIC or width not in OFFSET_TYPES or position + (16 + 3 * width) * count + 2 * width > size:
+            raise ValueError(f"{file.name} is not a tree index")
+        view = memoryview(self.mapped)
+        self.count = count
+        self.kinds = view[HEADER.size:HEADER.size + count]
+        arrays = []
+        for typecode, length in [("I", count)] * 4 + [(OFFSET_TYPES[width], count)] + [(OFFSET_TYPES[width], count + 1)] * 2:
+            item_size = struct.calcsize(typecode)
+            arrays.append(self.read_array(view[position:position + item_size * length], typecode))
+            position += item_size * length
+        self.parents, self.first_children, self.child_counts, self.by_key, self.sources, self.key_offsets, \
+            self.value_offsets = arrays
+
+    @staticmethod
+    def read_array(view, typecode):
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        values = array(typecode, view)
+        values.byteswap()
+        return values
+
+    def __len__(self):
+        return self.count
+
+    def kind(self, node):
+        return NODE_KINDS[self.kinds[node]]
+
+    def parent(self, node):
+        parent = self.parents[node]
+        return None if parent == NO_PARENT else parent
+
+    def children(self, node):
+        first = self.first_children[node]
+        return range(first, first + self.child_counts[node])
+
+    def source_offset(self, node):
+        return self.sources[node]
+
+    #dict key of a node, None unless its parent is a dict
+    def key(self, node):
+        parent = self.parent(node)
+        if parent is None or self.kinds[parent] != LBRACE:
+            return None
+        return self.mapped[self.key_offsets[node]:self.key_offsets[node + 1]].decode("utf-8")
+
+    #value of a scalar node as it is written in the source, strings without their quotes, None for dicts and lists
+    def text(self, node):
+        token_type = TOKEN_KINDS[self.kinds[node]]
+        if token_type in [TokenType.LBRACE, TokenType.LBRACK]:
+            return None
+        if token_type in [TokenType.TRUE, TokenType.FALSE, TokenType.NULL]:
+            return GRAMMAR_SYMBOLS[token_type]
+        return self.mapped[self.value_offsets[node]:self.value_offsets[node + 1]].decode("utf-8")
+
+    def child(self, node, step):
+        '''
+        Child of a dict by key, or of a list by index (an int, or a str of digits). Raises KeyError if there is none.
+        With duplicate keys the last one in the document is found, the one parser.loads keeps.
+        '''
+        kind = self.kinds[node]
+        first = self.first_children[node]
+        count = self.child_counts[node]
+        if kind == LBRACK:
+            if isinstance(step, str) and not step.isdigit() or not 0 <= int(step) < count:
+                raise KeyError(step)
+            return first + int(step)
+        if kind != LBRACE:
+            raise KeyError(step)
+        key = str(step).encode("utf-8")
+        #rightmost binary search of the dict's children in key order
+        low, high = first, first + count
+        key_offsets = self.key_offsets
+        mapped = self.mapped
+        by_key = self.by_key
+        while low < high:
+            middle = (low + high) // 2
+            candidate = by_key[middle]
+            if key < mapped[key_offsets[candidate]:key_offsets[candidate + 1]]:
+                high = middle
+            else:
+                low = middle + 1
+        if low > first:
+            candidate = by_key[low - 1]
+            if mapped[key_offsets[candidate]:key_offsets[candidate + 1]] == key:
+                return candidate
+        raise KeyError(step)
+
+    def lookup(self, path, node=0):
+        '''
+        Node at a path from node (the root by default): dot-separated keys and list indexes, keys with dots or
+        that are all digits in double quotes, e.g. grades."2134" or courses.0. Raises KeyError if there is none.
+        '''
+        for step in split_path(path):
+            node = self.child(node, step)
+        return node
+
+    def walk(self, node=0):
+        '''
+        Generate (depth, node) for a node and everything under it in document order, depth 0 being node's.
+        Only the nodes of the subtree are read.
+        '''
+        stack = [iter([node])]
+        while stack:
+            for child in stack[-1]:
+                yield len(stack) - 1, child
+                if self.child_counts[child]:
+                    stack.append(iter(self.children(child)))
+                break
+            else:
+                stack.pop()
+
+    def value(self, node=0):
+        '''
+        The subtree as Python values, the same as parser.loads gives for it. Like loads, raises ParseError for a
+        number that int() or float() do not take, such as ², which the lexer reads as a digit.
+        Built from walk, with the open dicts and lists on a stack indexed by depth.
+        '''
+        stack = []
+        for depth, child in self.walk(node):
+            kind = TOKEN_KINDS[self.kinds[child]]
+            if kind == TokenType.LBRACE:
+                value = {}
+            elif kind == TokenType.LBRACK:
+                value = []
+            elif kind == TokenType.INTEGER or kind == TokenType.FLOAT:
+                try:
+                    value = int(self.text(child)) if kind == TokenType.INTEGER else float(self.text(child))
+                except ValueError:
+                    raise ParseError(self.sources[child], "NUMBER: " + self.text(child), "NUMBER") from None
+            elif kind == TokenType.STRING:
+                value = self.text(child)
+            else:
+                value = {TokenType.TRUE: True, TokenType.FALSE: False, TokenType.NULL: None}[kind]
+            del stack[depth:]
+            if depth == 0:
+                result = value
+            elif isinstance(stack[-1], dict):
+                stack[-1][self.key(child)] = value
+            else:
+                stack[-1].append(value)
+            stack.append(value)
+        return result
+
+def split_path(path):
+    '''
+    Steps of a path: keys as str, list indexes as str of digits (quoted keys are str too, but lookup takes
+    them as keys even when they are all digits). Raises KeyError for a malformed path.
+    '''
+    steps = []
+    position = 0
+    while position < len(path):
+        segment = PATH_SEGMENT.match(path, position)
+        if segment is None:
+            raise KeyError(path)
+        steps.append(segment.group(1) if segment.group(1) is not None else segment.group(2))
+        if segment.group(1) is not None:
+            steps[-1] = QuotedKey(steps[-1])
+        position = segment.end()
+        if position < len(path):
+            if path[position] != ".":
+                raise KeyError(path)
+            position += 1
+            if position == len(path):
+                raise KeyError(path)
+    return steps
+
+class QuotedKey(str):
+    #a path step written in quotes, always a key: isdigit is False so child never takes it as a list index
+    def isdigit(self):
+        return False
+
+def load_index(file_name):
+    with open(file_name, "rb") as file:
+        return IndexedTree(file)
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Look up paths in a _tree_index file written by compiler.py --tree-index.")
+    arg_parser.add_argument("index", help="tree index file")
+    arg_parser.add_argument("paths", nargs="*", help='paths to print, e.g. grades."2134" (default: the whole tree)')
+    arg_parser.add_argument("--outline", action="store_true",
+                            help="print each node under the path with its kind and source offset instead of its value")
+    args = arg_parser.parse_args(argv)
+    tree = load_index(args.index)
+    status = 0
+    for path in args.paths or [""]:
+        try:
+            node = tree.lookup(path)
+        except KeyError:
+            print(f"{path}: not found")
+            status = 1
+            continue
+        if not args.outline:
+            try:
+                value = tree.value(node)
+            except ParseError as e:
+                print(f"{path}: {e}")
+                status = 1
+                continue
+            print(f"{path}: {json.dumps(value)}" if args.paths else json.dumps(value))
+            continue
+        for depth, child in tree.walk(node):
+            key = tree.key(child)
+            text = tree.text(child)
+            print("  " * depth + (f'"{key}": ' if key is not None else "") + tree.kind(child) +
+                  ("" if text is None else f" {text}") + f" @{tree.source_offset(child)}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())